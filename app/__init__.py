@@ -1,7 +1,15 @@
 from flask import Flask
 from app.routes import webhook_bp
+from app.config import AQUECER_NA_SUBIDA, JOBS_ATIVO
 
 def create_app():
     app = Flask(__name__)
     app.register_blueprint(webhook_bp)
+    if AQUECER_NA_SUBIDA:
+        from app.services import aquecer
+        aquecer()
+    if JOBS_ATIVO:
+        # Retoma já na subida as mensagens que ficaram na fila de envio (reinício, queda de worker)
+        from app.envio import obter_despachante
+        obter_despachante()
     return app
@@ -0,0 +1,215 @@
+"""
+Cliente assíncrono (asyncio + aiohttp) da Azure Read API: vision/v3.2/read/analyze + polling.
+
+A Read API devolve 202 + Operation-Location no envio; o resultado é obtido
+consultando essa URL até o status virar "succeeded"/"failed". Aqui:
+
+- muitos documentos são enviados e consultados concorrentemente em um único
+  event loop (nenhuma thread fica presa esperando a análise);
+- no máximo AZURE_READ_MAX_EM_VOO operações em andamento por chave do Azure
+  (várias chaves em AZURE_READ_CHAVES são usadas em rodízio);
+- intervalo de polling adaptativo: a primeira consulta acontece perto do tempo
+  médio de conclusão observado e as seguintes crescem 1,5x até
+  AZURE_READ_INTERVALO_MAX (ou seguem o Retry-After da resposta);
+- 429/5xx são repetidos com backoff exponencial, respeitando Retry-After
+  (limitado a HTTP_RETRY_AFTER_MAX), como no app/http_client.py.
+
+Código síncrono (workers com threads) usa executar(coro), que roda a corrotina
+em um event loop compartilhado em segundo plano.
+"""
+
+import asyncio
+import concurrent.futures
+import itertools
+import json
+import os
+import threading
+from collections import Counter
+
+import aiohttp
+
+from .config import AZURE_ENDPOINT, AZURE_READ_CHAVES, AZURE_READ_MAX_EM_VOO
+from .config import AZURE_READ_INTERVALO_INICIAL, AZURE_READ_INTERVALO_MAX, AZURE_READ_TIMEOUT
+from .config import HTTP_RETRIES, HTTP_BACKOFF, HTTP_RETRY_AFTER_MAX, HTTP_TIMEOUTS
+
+STATUS_RETRY = (429, 500, 502, 503, 504)
+
+
+class ErroRead(Exception):
+    """Falha no envio, no polling ou na análise de um documento pela Read API."""
+
+
+def _retry_after(headers) -> float | None:
+    """Retry-After em segundos (limitado a HTTP_RETRY_AFTER_MAX), ou None."""
+    try:
+        return min(float(headers.get("Retry-After")), HTTP_RETRY_AFTER_MAX)
+    except (TypeError, ValueError):
+        return None
+
+
+class ClienteRead:
+    def __init__(self, endpoint: str | None = AZURE_ENDPOINT, chaves: list | None = None,
+                 max_em_voo: int = AZURE_READ_MAX_EM_VOO, intervalo_inicial: float = AZURE_READ_INTERVALO_INICIAL,
+                 intervalo_max: float = AZURE_READ_INTERVALO_MAX, timeout: float = AZURE_READ_TIMEOUT,
+                 tentativas: int = HTTP_RETRIES):
+        self.endpoint = (endpoint or "").rstrip("/") + "/"
+        self.chaves = list(chaves or AZURE_READ_CHAVES)
+        if not self.chaves:
+            raise ValueError("ClienteRead precisa de pelo menos uma chave (AZURE_READ_CHAVES ou AZURE_KEY)")
+        self.max_em_voo = max(1, max_em_voo)
+        self.intervalo_inicial = intervalo_inicial
+        self.intervalo_max = intervalo_max
+        self.timeout = timeout
+        self.tentativas = tentativas
+        self.media_conclusao = None  # média móvel (s) do envio até "succeeded"
+        self._rodizio = itertools.cycle(self.chaves)
+        self._loop = None
+        self._pid = None
+        self._sessao = None
+        self._semaforos = {}
+        self._contagem = Counter()
+        self._em_voo = Counter()  # chave -> operações em andamento
+
+    def _preparar(self) -> None:
+        """Semáforos e sessão pertencem ao event loop em uso; são recriados se o loop mudar."""
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            self._soltar_sessao()
+            self._loop = loop
+            self._pid = os.getpid()
+            self._semaforos = {c: asyncio.Semaphore(self.max_em_voo) for c in self.chaves}
+            conexao, leitura = HTTP_TIMEOUTS["azure"]
+            self._sessao = aiohttp.ClientSession(
+                timeout=aiohttp.ClientTimeout(sock_connect=conexao, sock_read=leitura),
+                connector=aiohttp.TCPConnector(limit=self.max_em_voo * len(self.chaves) * 2),
+            )
+
+    def _soltar_sessao(self) -> None:
+        """Fecha a sessão do loop anterior no próprio loop, se ele ainda roda neste processo."""
+        sessao, self._sessao = self._sessao, None
+        if sessao is None or sessao.closed:
+            return
+        if self._pid == os.getpid() and self._loop.is_running():
+            asyncio.run_coroutine_threadsafe(sessao.close(), self._loop)
+        else:
+            # Loop encerrado ou herdado do fork: não há onde aguardar o close(), e fechar os
+            # transportes mexeria no seletor do processo pai. Só desliga o conector da sessão.
+            sessao.detach()
+
+    async def _requisicao(self, metodo: str, url: str, chave: str, **kwargs):
+        """(status, headers, corpo JSON ou None), repetindo 429/5xx com backoff e Retry-After."""
+        headers = {"Ocp-Apim-Subscription-Key": chave, **kwargs.pop("headers", {})}
+        for tentativa in range(self.tentativas + 1):
+            async with self._sessao.request(metodo, url, headers=headers, **kwargs) as resp:
+                texto = await resp.text()
+                try:
+                    corpo = json.loads(texto) if texto.strip() else None
+                except ValueError:
+                    corpo = None
+                if resp.status not in STATUS_RETRY or tentativa == self.tentativas:
+                    return resp.status, resp.headers, corpo
+                self._contagem[f"respostas_{resp.status}"] += 1
+                espera = _retry_after(resp.headers) or HTTP_BACKOFF * (2 ** tentativa)
+            await asyncio.sleep(espera)
+
+    async def analisar(self, image_data: bytes) -> dict:
+        """Envia uma imagem/PDF e devolve o analyzeResult ({"readResults": [...]})."""
+        self._preparar()
+        chave = next(self._rodizio)
+        async with self._semaforos[chave]:
+            self._em_voo[chave] += 1
+            try:
+                return await self._analisar(image_data, chave)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                self._contagem["falhas"] += 1
+                raise ErroRead(f"falha de rede: {e!r}") from e
+            finally:
+                self._em_voo[chave] -= 1
+
+    async def _analisar(self, image_data: bytes, chave: str) -> dict:
+        loop = asyncio.get_running_loop()
+        inicio = loop.time()
+        status, headers, corpo = await self._requisicao(
+            "POST", f"{self.endpoint}vision/v3.2/read/analyze?language=pt", chave,
+            data=image_data, headers={"Content-Type": "application/octet-stream"},
+        )
+        self._contagem["enviados"] += 1
+        operacao = headers.get("Operation-Location")
+        if status != 202 or not operacao:
+            self._contagem["falhas"] += 1
+            raise ErroRead(f"analyze: HTTP {status} {corpo}")
+
+        # Primeira consulta perto do tempo médio de conclusão; depois intervalos crescentes
+        espera = intervalo = self.intervalo_inicial
+        if self.media_conclusao is not None:
+            espera = min(self.intervalo_max, max(espera, 0.8 * self.media_conclusao))
+        while True:
+            if loop.time() - inicio + espera > self.timeout:
+                self._contagem["falhas"] += 1
+                raise ErroRead(f"análise não concluída em {self.timeout:g}s")
+            await asyncio.sleep(espera)
+            status, headers, corpo = await self._requisicao("GET", operacao, chave)
+            self._contagem["consultas"] += 1
+            if status != 200 or not isinstance(corpo, dict):
+                self._contagem["falhas"] += 1
+                raise ErroRead(f"consulta: HTTP {status}")
+            estado = corpo.get("status")
+            if estado == "succeeded":
+                duracao = loop.time() - inicio
+                self.media_conclusao = (duracao if self.media_conclusao is None
+                                        else 0.8 * self.media_conclusao + 0.2 * duracao)
+                self._contagem["concluidos"] += 1
+                return corpo.get("analyzeResult") or {}
+            if estado == "failed":
+                self._contagem["falhas"] += 1
+                raise ErroRead(f"análise falhou: {corpo}")
+            intervalo = min(self.intervalo_max, intervalo * 1.5)
+            espera = _retry_after(headers) or intervalo
+
+    async def analisar_varios(self, imagens) -> list:
+        """Analisa várias imagens concorrentemente; cada posição é o analyzeResult ou a exceção."""
+        return await asyncio.gather(*(self.analisar(i) for i in imagens), return_exceptions=True)
+
+    async def fechar(self) -> None:
+        if self._sessao is not None:
+            await self._sessao.close()
+            self._sessao = None
+            self._loop = None
+
+    def estatisticas(self) -> dict:
+        return {
+            **self._contagem,
+            "em_voo": {f"...{c[-4:]}": n for c, n in self._em_voo.items()},  # só o final da chave
+            "media_conclusao_s": round(self.media_conclusao, 3) if self.media_conclusao else None,
+        }
+
+
+_loop = None
+_loop_pid = None
+_loop_lock = threading.Lock()
+
+
+def _loop_compartilhado() -> asyncio.AbstractEventLoop:
+    """Event loop em uma thread daemon, um por processo (recriado após fork)."""
+    global _loop, _loop_pid
+    with _loop_lock:
+        if _loop is None or _loop_pid != os.getpid():
+            _loop = asyncio.new_event_loop()
+            _loop_pid = os.getpid()
+            threading.Thread(target=_loop.run_forever, name="azure-read-loop", daemon=True).start()
+        return _loop
+
+
+def executar(coro, timeout: float | None = None):
+    """
+    Roda a corrotina no loop compartilhado e espera o resultado (para código
+    síncrono). Estourado o timeout, a corrotina é cancelada no loop: não segue
+    ocupando o semáforo da chave nem fazendo polling de um resultado que
+    ninguém vai ler.
+    """
+    futuro = asyncio.run_coroutine_threadsafe(coro, _loop_compartilhado())
+    try:
+        return futuro.result(timeout)
+    except concurrent.futures.TimeoutError:
+        futuro.cancel()
+        raise
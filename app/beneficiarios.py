@@ -0,0 +1,143 @@
+"""
+Base local de beneficiários em SQLite, indexada pelo CPF normalizado.
+
+Substitui a leitura + varredura linear de beneficiarios.json a cada consulta:
+- consulta por chave primária (O(log N));
+- upserts em lote em uma única transação (atômica, com WAL e busy_timeout
+  para vários workers escrevendo ao mesmo tempo);
+- importação em massa a partir do JSON antigo ({"beneficiarios": [...]}).
+
+Importação manual:
+    python -m app.beneficiarios importar data/beneficiarios.json [--db caminho.sqlite3]
+"""
+
+import json
+import os
+import sqlite3
+import threading
+from pathlib import Path
+
+
+def normalizar_cpf(cpf: str) -> str:
+    return "".join([c for c in cpf if c.isdigit()])
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS beneficiarios (
+    cpf TEXT PRIMARY KEY,
+    dados TEXT NOT NULL
+) WITHOUT ROWID
+"""
+
+_UPSERT = """
+INSERT INTO beneficiarios (cpf, dados) VALUES (?, ?)
+ON CONFLICT(cpf) DO UPDATE SET dados = excluded.dados
+"""
+
+
+class BaseBeneficiarios:
+    """Acesso à base SQLite; uma conexão por thread/processo."""
+
+    def __init__(self, caminho: str | Path):
+        self.caminho = Path(caminho)
+        self._local = threading.local()
+        self.caminho.parent.mkdir(parents=True, exist_ok=True)
+        with self._conexao() as con:
+            con.execute(_SCHEMA)
+
+    def _conexao(self) -> sqlite3.Connection:
+        con = getattr(self._local, "con", None)
+        if con is None or getattr(self._local, "pid", None) != os.getpid():
+            con = sqlite3.connect(self.caminho, timeout=30)
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute("PRAGMA synchronous=NORMAL")
+            self._local.con = con
+            self._local.pid = os.getpid()
+        return con
+
+    def buscar(self, cpf: str) -> dict | None:
+        linha = self._conexao().execute(
+            "SELECT dados FROM beneficiarios WHERE cpf = ?", (normalizar_cpf(cpf),)
+        ).fetchone()
+        return json.loads(linha[0]) if linha else None
+
+    def upsert(self, registros) -> int:
+        """
+        Insere/atualiza registros (dicts com "cpf") em uma única transação.
+        Campos ausentes no registro novo são preservados do registro existente.
+        Retorna o número de registros gravados.
+        """
+        con = self._conexao()
+        total = 0
+        with con:  # commit atômico ou rollback
+            for lote in _lotes(registros, 900):  # abaixo do limite de variáveis do SQLite antigo
+                cpfs = [normalizar_cpf(r.get("cpf", "")) for r in lote]
+                existentes = dict(con.execute(
+                    f"SELECT cpf, dados FROM beneficiarios WHERE cpf IN ({','.join('?' * len(cpfs))})", cpfs
+                ).fetchall()) if cpfs else {}
+                linhas = {}
+                for cpf_n, registro in zip(cpfs, lote):
+                    if not cpf_n:
+                        continue
+                    base = linhas.get(cpf_n) or (json.loads(existentes[cpf_n]) if cpf_n in existentes else {})
+                    linhas[cpf_n] = {**base, **registro, "cpf": cpf_n}
+                con.executemany(_UPSERT, [(c, json.dumps(d, ensure_ascii=False)) for c, d in linhas.items()])
+                total += len(linhas)
+        return total
+
+    def substituir(self, registros) -> int:
+        """Troca a base inteira pelos registros (uma transação): CPFs ausentes são removidos."""
+        con = self._conexao()
+        linhas = {}
+        for r in registros:
+            cpf_n = normalizar_cpf(r.get("cpf", ""))
+            if cpf_n:
+                linhas[cpf_n] = {**linhas.get(cpf_n, {}), **r, "cpf": cpf_n}
+        with con:
+            con.execute("DELETE FROM beneficiarios")
+            con.executemany(_UPSERT, [(c, json.dumps(d, ensure_ascii=False)) for c, d in linhas.items()])
+        return len(linhas)
+
+    def listar(self) -> list:
+        return [json.loads(d) for (d,) in self._conexao().execute("SELECT dados FROM beneficiarios ORDER BY cpf")]
+
+    def importar_json(self, caminho_json: str | Path) -> int:
+        """Importa um arquivo no formato antigo {"beneficiarios": [...]}."""
+        base = json.loads(Path(caminho_json).read_text(encoding="utf-8"))
+        return self.upsert(base.get("beneficiarios", []))
+
+    def contar(self) -> int:
+        return self._conexao().execute("SELECT COUNT(*) FROM beneficiarios").fetchone()[0]
+
+    def fechar(self) -> None:
+        con = getattr(self._local, "con", None)
+        if con is not None:
+            con.close()
+            self._local.con = None
+
+
+def _lotes(registros, tamanho: int):
+    lote = []
+    for r in registros:
+        lote.append(r)
+        if len(lote) >= tamanho:
+            yield lote
+            lote = []
+    if lote:
+        yield lote
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Base local de beneficiários (SQLite)")
+    sub = parser.add_subparsers(dest="comando", required=True)
+    imp = sub.add_parser("importar", help="importa um beneficiarios.json")
+    imp.add_argument("arquivo")
+    imp.add_argument("--db", default=None, help="padrão: BENEF_DB")
+    args = parser.parse_args()
+
+    from .config import BENEF_DB
+    base = BaseBeneficiarios(args.db or BENEF_DB)
+    n = base.importar_json(args.arquivo)
+    print(f"✅ {n} beneficiários importados para {base.caminho} (total: {base.contar()})")
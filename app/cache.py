@@ -0,0 +1,206 @@
+"""
+Cache de resultados de OCR endereçado pelo conteúdo da mídia.
+
+Chave = sha256(bytes do arquivo recebido) + versão das regras de correção/parsing.
+Dois níveis:
+- memória: LRU limitado por número de itens;
+- disco: um JSON por chave, com TTL e limite de tamanho total (remove os mais antigos).
+
+O lock protege só o LRU e os contadores: leituras, escritas e a limpeza do
+disco rodam fora dele, para um OCR lento de gravar não segurar os acertos em memória.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+from . import log
+
+
+def chave_conteudo(dados: bytes, versao: str) -> str:
+    """Chave do cache para os bytes da mídia e a versão das regras."""
+    h = hashlib.sha256(dados)
+    h.update(b"\0" + versao.encode("utf-8"))
+    return h.hexdigest()
+
+
+class CacheOCR:
+    def __init__(self, diretorio: str | None, max_itens_memoria: int = 256,
+                 max_bytes_disco: int = 200 * 1024 * 1024, ttl: float = 24 * 3600):
+        self.diretorio = Path(diretorio) if diretorio else None
+        self.max_itens_memoria = max_itens_memoria
+        self.max_bytes_disco = max_bytes_disco
+        self.ttl = ttl
+        self._memoria = OrderedDict()  # chave -> (instante, valor)
+        self._lock = threading.Lock()
+        self._limpeza = threading.Lock()  # uma limpeza do disco por vez; as outras threads pulam
+        self._bytes_disco = None  # calculado no primeiro acesso ao disco
+        self.hits_memoria = 0
+        self.hits_disco = 0
+        self.misses = 0
+        self.gravacoes = 0
+        self.remocoes = 0
+
+    # ---------------- memória ----------------
+
+    def _get_memoria(self, chave: str):
+        item = self._memoria.get(chave)
+        if item is None:
+            return None
+        instante, valor = item
+        if time.time() - instante > self.ttl:
+            del self._memoria[chave]
+            return None
+        self._memoria.move_to_end(chave)
+        return valor
+
+    def _set_memoria(self, chave: str, valor: dict, instante: float) -> None:
+        self._memoria[chave] = (instante, valor)
+        self._memoria.move_to_end(chave)
+        while len(self._memoria) > self.max_itens_memoria:
+            self._memoria.popitem(last=False)
+            self.remocoes += 1
+
+    # ---------------- disco ----------------
+
+    def _caminho(self, chave: str) -> Path:
+        return self.diretorio / chave[:2] / f"{chave}.json"
+
+    def _arquivos_disco(self):
+        return list(self.diretorio.glob("*/*.json")) if self.diretorio.exists() else []
+
+    def _get_disco(self, chave: str):
+        caminho = self._caminho(chave)
+        try:
+            instante = caminho.stat().st_mtime
+            if time.time() - instante > self.ttl:
+                self._remover_arquivo(caminho)
+                return None
+            return instante, json.loads(caminho.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+
+    def _set_disco(self, chave: str, valor: dict) -> None:
+        caminho = self._caminho(chave)
+        caminho.parent.mkdir(parents=True, exist_ok=True)
+        conteudo = json.dumps(valor, ensure_ascii=False).encode("utf-8")
+        # Escrita atômica: outro worker nunca lê um JSON pela metade
+        fd, tmp = tempfile.mkstemp(dir=caminho.parent, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(conteudo)
+        anterior = self._tamanho(caminho)
+        os.replace(tmp, caminho)
+        total = sum(self._tamanho(p) for p in self._arquivos_disco()) if self._bytes_disco is None else None
+        with self._lock:
+            if self._bytes_disco is None:
+                self._bytes_disco = total
+            else:
+                self._bytes_disco += len(conteudo) - anterior
+            cheio = self._bytes_disco > self.max_bytes_disco
+        if cheio:
+            self._limpar_disco()
+
+    @staticmethod
+    def _tamanho(caminho: Path) -> int:
+        try:
+            return caminho.stat().st_size
+        except OSError:
+            return 0
+
+    def _remover_arquivo(self, caminho: Path) -> int:
+        tamanho = self._tamanho(caminho)
+        try:
+            caminho.unlink()
+        except OSError:
+            return 0
+        with self._lock:
+            self.remocoes += 1
+            if self._bytes_disco is not None:
+                self._bytes_disco -= tamanho
+        return tamanho
+
+    def _limpar_disco(self) -> None:
+        """Remove entradas expiradas e, se ainda preciso, as mais antigas até caber em 90% do limite."""
+        if not self._limpeza.acquire(blocking=False):
+            return
+        try:
+            self._limpar_disco_exclusivo()
+        finally:
+            self._limpeza.release()
+
+    def _limpar_disco_exclusivo(self) -> None:
+        agora = time.time()
+        arquivos = []
+        for p in self._arquivos_disco():
+            try:
+                st = p.stat()
+            except OSError:
+                continue
+            arquivos.append((st.st_mtime, st.st_size, p))
+        arquivos.sort()
+        total = sum(tam for _, tam, _ in arquivos)
+        alvo = self.max_bytes_disco * 0.9
+        removidos = 0
+        for instante, tamanho, p in arquivos:
+            if total <= alvo and agora - instante <= self.ttl:
+                continue
+            try:
+                p.unlink()
+            except OSError:
+                continue
+            total -= tamanho
+            removidos += 1
+        with self._lock:
+            self.remocoes += removidos
+            self._bytes_disco = total
+
+    # ---------------- API ----------------
+
+    def get(self, chave: str, contar: bool = True):
+        """
+        Valor guardado para a chave, ou None. Com contar=False a consulta fica fora
+        dos hits/misses (ex.: um segundo nível consultado na mesma requisição).
+        """
+        with self._lock:
+            valor = self._get_memoria(chave)
+            if valor is not None:
+                self.hits_memoria += contar
+                return valor
+        item = self._get_disco(chave) if self.diretorio is not None else None
+        with self._lock:
+            if item is not None:
+                instante, valor = item
+                self._set_memoria(chave, valor, instante)
+                self.hits_disco += contar
+                return valor
+            self.misses += contar
+            return None
+
+    def set(self, chave: str, valor: dict) -> None:
+        with self._lock:
+            self._set_memoria(chave, valor, time.time())
+            self.gravacoes += 1
+        if self.diretorio is not None:
+            try:
+                self._set_disco(chave, valor)
+            except OSError as e:
+                log.aviso("cache_ocr_falha_disco", erro=str(e))
+
+    def estatisticas(self) -> dict:
+        with self._lock:
+            consultas = self.hits_memoria + self.hits_disco + self.misses
+            return {
+                "hits_memoria": self.hits_memoria,
+                "hits_disco": self.hits_disco,
+                "misses": self.misses,
+                "taxa_acerto": round((self.hits_memoria + self.hits_disco) / consultas, 4) if consultas else 0.0,
+                "gravacoes": self.gravacoes,
+                "remocoes": self.remocoes,
+                "itens_memoria": len(self._memoria),
+                "bytes_disco": self._bytes_disco,
+            }
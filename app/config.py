@@ -1,4 +1,5 @@
 import os
+from pathlib import Path
 from dotenv import load_dotenv
 
 # Carregar as variáveis do .env
@@ -10,3 +11,139 @@ AZURE_ENDPOINT = os.getenv("AZURE_ENDPOINT")
 AZURE_KEY = os.getenv("AZURE_KEY")
 WABA_ID = os.getenv("WABA_ID")
 WHATSAPP_TOKEN = os.getenv("WHATSAPP_TOKEN")
+
+# Processamento assíncrono do webhook (fila + pool de workers)
+JOBS_ATIVO = os.getenv("JOBS_ATIVO", "0").lower() in ("1", "true", "sim")
+JOBS_WORKERS = int(os.getenv("JOBS_WORKERS", "4"))
+JOBS_FILA_MAX = int(os.getenv("JOBS_FILA_MAX", "50"))
+# Fila cheia: "rejeitar" (avisa o usuário), "bloquear" (espera JOBS_TIMEOUT_FILA s) ou "sincrono" (processa na requisição)
+JOBS_BACKPRESSURE = os.getenv("JOBS_BACKPRESSURE", "rejeitar").lower()
+JOBS_TIMEOUT_FILA = float(os.getenv("JOBS_TIMEOUT_FILA", "2"))
+
+# Cache de resultados de OCR (chave = hash da mídia + versão das regras)
+OCR_CACHE_ATIVO = os.getenv("OCR_CACHE_ATIVO", "1").lower() in ("1", "true", "sim")
+OCR_CACHE_DIR = os.getenv("OCR_CACHE_DIR", "cache_ocr")  # vazio = só memória
+OCR_CACHE_MEMORIA_ITENS = int(os.getenv("OCR_CACHE_MEMORIA_ITENS", "256"))
+OCR_CACHE_DISCO_MB = float(os.getenv("OCR_CACHE_DISCO_MB", "200"))
+OCR_CACHE_TTL = float(os.getenv("OCR_CACHE_TTL", str(7 * 24 * 3600)))  # segundos
+
+# Guarda uma cópia de cada mídia recebida em receitas/ (arquivamento, fora do pipeline de OCR)
+ARQUIVAR_RECEITAS = os.getenv("ARQUIVAR_RECEITAS", "1").lower() in ("1", "true", "sim")
+
+# Perfil de pré-processamento da imagem: rapido | balanceado | maxima_qualidade
+PREPROC_PERFIL = os.getenv("PREPROC_PERFIL", "balanceado").lower()
+
+# Cliente HTTP compartilhado (app/http_client.py)
+HTTP_POOL_MAX = int(os.getenv("HTTP_POOL_MAX", "10"))          # conexões keep-alive por host
+HTTP_RETRIES = int(os.getenv("HTTP_RETRIES", "3"))             # tentativas extras em 429/5xx
+HTTP_BACKOFF = float(os.getenv("HTTP_BACKOFF", "0.5"))         # backoff exponencial (s)
+HTTP_RETRY_AFTER_MAX = float(os.getenv("HTTP_RETRY_AFTER_MAX", "30"))  # teto p/ Retry-After (s)
+
+
+def _timeout(nome: str, padrao: str) -> tuple:
+    """Lê "conexão,leitura" em segundos de HTTP_TIMEOUT_<NOME>."""
+    conexao, leitura = os.getenv(f"HTTP_TIMEOUT_{nome}", padrao).split(",")
+    return float(conexao), float(leitura)
+
+
+HTTP_TIMEOUTS = {
+    "padrao": _timeout("PADRAO", "5,30"),
+    "twilio": _timeout("TWILIO", "5,30"),
+    "azure": _timeout("AZURE", "5,60"),
+    "graph": _timeout("GRAPH", "5,15"),
+    "whatsapp": _timeout("GRAPH", "5,15"),
+    "openfda": _timeout("OPENFDA", "3,10"),
+}
+
+# Envio de mensagens pela WhatsApp Cloud API (app/envio.py): fila persistente, limite de taxa e reenvio
+PHONE_NUMBER_ID = os.getenv("PHONE_NUMBER_ID")
+WHATSAPP_ENVIO_DB = os.getenv("WHATSAPP_ENVIO_DB", str(Path(__file__).resolve().parent / "data" / "envios.sqlite3"))
+WHATSAPP_TAXA = float(os.getenv("WHATSAPP_TAXA", "20"))          # mensagens/s por PHONE_NUMBER_ID, somando todos os workers
+WHATSAPP_RAJADA = float(os.getenv("WHATSAPP_RAJADA", "20"))      # mensagens enviadas de uma vez com o balde cheio
+WHATSAPP_CONCORRENCIA = int(os.getenv("WHATSAPP_CONCORRENCIA", "4"))  # POSTs simultâneos por processo
+WHATSAPP_TENTATIVAS = int(os.getenv("WHATSAPP_TENTATIVAS", "8"))  # até marcar a mensagem como "falhou"
+WHATSAPP_BACKOFF = float(os.getenv("WHATSAPP_BACKOFF", "1"))      # s antes do 1º reenvio, dobrando a cada tentativa
+WHATSAPP_BACKOFF_MAX = float(os.getenv("WHATSAPP_BACKOFF_MAX", "300"))
+WHATSAPP_MSG_MAX = int(os.getenv("WHATSAPP_MSG_MAX", "4096"))     # caracteres por mensagem de texto; acima disso divide
+WHATSAPP_RETENCAO = float(os.getenv("WHATSAPP_RETENCAO", str(7 * 24 * 3600)))  # s que as falhas ficam na fila
+
+# Base local de beneficiários (SQLite). Se estiver vazia, é populada a partir do beneficiarios.json
+BENEF_DB = os.getenv("BENEF_DB", str(Path(__file__).resolve().parent / "data" / "beneficiarios.sqlite3"))
+
+# Estado das conversas: "memoria" (um processo) ou "sqlite" (compartilhado entre workers)
+ESTADO_BACKEND = os.getenv("ESTADO_BACKEND", "memoria").lower()
+ESTADO_DB = os.getenv("ESTADO_DB", str(Path(__file__).resolve().parent / "data" / "conversas.sqlite3"))
+ESTADO_TTL = float(os.getenv("ESTADO_TTL", str(24 * 3600)))  # segundos sem interação até descartar
+ESTADO_MAX_ITENS = int(os.getenv("ESTADO_MAX_ITENS", "10000"))
+
+# Deduplicação do webhook pelo MessageSid do Twilio (app/idempotencia.py), compartilhada entre workers
+DEDUP_ATIVO = os.getenv("DEDUP_ATIVO", "1").lower() in ("1", "true", "sim")
+DEDUP_DB = os.getenv("DEDUP_DB", str(Path(__file__).resolve().parent / "data" / "webhook.sqlite3"))
+DEDUP_JANELA = float(os.getenv("DEDUP_JANELA", "3600"))        # s que um MessageSid (e a resposta) fica lembrado
+DEDUP_MAX_ITENS = int(os.getenv("DEDUP_MAX_ITENS", "100000"))
+DEDUP_ESPERA = float(os.getenv("DEDUP_ESPERA", "12"))          # s que uma repetição espera a resposta em andamento
+DEDUP_PROCESSANDO_MAX = float(os.getenv("DEDUP_PROCESSANDO_MAX", "300"))  # s até assumir que o worker caiu
+
+# OpenFDA (fallback de nomes) com cache persistente
+OPENFDA_URL = os.getenv("OPENFDA_URL", "https://api.fda.gov/drug/label.json")
+OPENFDA_DB = os.getenv("OPENFDA_DB", str(Path(__file__).resolve().parent / "data" / "openfda.sqlite3"))
+OPENFDA_TTL = float(os.getenv("OPENFDA_TTL", str(30 * 24 * 3600)))             # nomes encontrados
+OPENFDA_TTL_NEGATIVO = float(os.getenv("OPENFDA_TTL_NEGATIVO", str(24 * 3600)))  # "não encontrado"
+OPENFDA_CONCORRENCIA = int(os.getenv("OPENFDA_CONCORRENCIA", "4"))
+# Acrescenta "nome_openfda" a cada medicamento do JSON da receita
+OPENFDA_ENRIQUECER = os.getenv("OPENFDA_ENRIQUECER", "0").lower() in ("1", "true", "sim")
+
+# Correção aproximada de nomes de medicamentos (distância de edição máxima; 0 desliga)
+FUZZY_MAX_DISTANCIA = int(os.getenv("FUZZY_MAX_DISTANCIA", "2"))
+
+# Princípios ativos e o snapshot binário dos índices (trie, regex, IndiceFuzzy), refeito quando o CSV muda
+PRINCIPIOS_CSV = os.getenv("PRINCIPIOS_CSV", str(Path(__file__).resolve().parent / "principios_ativos.csv"))
+PRINCIPIOS_SNAPSHOT = os.getenv("PRINCIPIOS_SNAPSHOT", str(Path(__file__).resolve().parent / "data" / "principios.snapshot"))  # vazio = sem snapshot
+
+# create_app() carrega de imediato o que fica sob demanda (cv2, pdf2image, regex dos princípios).
+# Use com gunicorn --preload: o mestre carrega uma vez e os workers herdam no fork.
+AQUECER_NA_SUBIDA = os.getenv("AQUECER_NA_SUBIDA", "0").lower() in ("1", "true", "sim")
+
+# Regras de correção de OCR (JSON versionado)
+CORRECOES_OCR_ARQUIVO = os.getenv("CORRECOES_OCR_ARQUIVO", str(Path(__file__).resolve().parent / "correcoes_ocr.json"))
+
+# PDFs com várias páginas (app/pdf.py)
+PDF_MAX_PAGINAS = int(os.getenv("PDF_MAX_PAGINAS", "10"))          # páginas além disso são ignoradas
+PDF_MAX_MB = float(os.getenv("PDF_MAX_MB", "20"))                  # PDFs maiores são recusados
+PDF_DPI = int(os.getenv("PDF_DPI", "300"))
+PDF_MAX_MEGAPIXELS = float(os.getenv("PDF_MAX_MEGAPIXELS", "40"))  # reduz o DPI de páginas muito grandes
+PDF_THREADS = int(os.getenv("PDF_THREADS", "4"))  # páginas renderizadas/no OCR ao mesmo tempo
+PDF_TEXTO_MIN_CARACTERES = int(os.getenv("PDF_TEXTO_MIN_CARACTERES", "30"))  # camada de texto mínima p/ pular o OCR
+
+# API do Azure usada pelos motores "azure"/"camadas": "ocr" (vision/v3.2/ocr) ou "read" (analyze + polling)
+AZURE_OCR_API = os.getenv("AZURE_OCR_API", "ocr").lower()
+# Read API (app/azure_read.py): chaves separadas por vírgula, usadas em rodízio
+AZURE_READ_CHAVES = [c.strip() for c in os.getenv("AZURE_READ_CHAVES", AZURE_KEY or "").split(",") if c.strip()]
+AZURE_READ_MAX_EM_VOO = int(os.getenv("AZURE_READ_MAX_EM_VOO", "8"))          # operações em andamento por chave
+AZURE_READ_INTERVALO_INICIAL = float(os.getenv("AZURE_READ_INTERVALO_INICIAL", "0.5"))  # s entre consultas
+AZURE_READ_INTERVALO_MAX = float(os.getenv("AZURE_READ_INTERVALO_MAX", "3"))
+AZURE_READ_TIMEOUT = float(os.getenv("AZURE_READ_TIMEOUT", "120"))            # s até desistir de uma análise
+
+# Motor de OCR: "azure", "tesseract" (local) ou "camadas" (Tesseract primeiro, Azure se insuficiente)
+OCR_MOTOR = os.getenv("OCR_MOTOR", "azure").lower()
+OCR_TESSERACT_IDIOMA = os.getenv("OCR_TESSERACT_IDIOMA", "por")
+OCR_TESSERACT_PROCESSOS = int(os.getenv("OCR_TESSERACT_PROCESSOS", "2"))
+OCR_TESSERACT_TIMEOUT = float(os.getenv("OCR_TESSERACT_TIMEOUT", "30"))  # segundos por imagem
+OCR_CONFIANCA_MIN = float(os.getenv("OCR_CONFIANCA_MIN", "0.80"))    # confiança média das palavras (0-1)
+OCR_COMPLETUDE_MIN = float(os.getenv("OCR_COMPLETUDE_MIN", "0.65"))  # fração dos campos (e quantidades) encontrados
+
+# Observabilidade: métricas em GET /metrics (app/metricas.py) e log estruturado (app/log.py)
+METRICAS_ATIVO = os.getenv("METRICAS_ATIVO", "1").lower() in ("1", "true", "sim")
+LOG_NIVEL = os.getenv("LOG_NIVEL", "INFO").upper()
+LOG_FORMATO = os.getenv("LOG_FORMATO", "json").lower()   # "json" (uma linha por evento) ou "texto"
+LOG_FILA_MAX = int(os.getenv("LOG_FILA_MAX", "10000"))   # eventos pendentes; além disso são descartados
+LOG_INTERVALO = float(os.getenv("LOG_INTERVALO", "0.2"))  # s entre escritas em lote no stdout
+
+# Triagem de qualidade da foto antes do pré-processamento/OCR (app/qualidade.py)
+QUALIDADE_ATIVO = os.getenv("QUALIDADE_ATIVO", "1").lower() in ("1", "true", "sim")
+QUALIDADE_AMOSTRA_LADO = int(os.getenv("QUALIDADE_AMOSTRA_LADO", "800"))   # lado maior da cópia medida (px)
+QUALIDADE_LADO_MIN = int(os.getenv("QUALIDADE_LADO_MIN", "400"))           # menor lado da foto original (px)
+QUALIDADE_BRILHO_MIN = float(os.getenv("QUALIDADE_BRILHO_MIN", "50"))      # brilho médio (0-255)
+QUALIDADE_CONTRASTE_MIN = float(os.getenv("QUALIDADE_CONTRASTE_MIN", "40"))  # percentil 99,5 - percentil 0,5
+QUALIDADE_NITIDEZ_MIN = float(os.getenv("QUALIDADE_NITIDEZ_MIN", "50"))    # variância do Laplaciano
+QUALIDADE_TEXTO_MIN = float(os.getenv("QUALIDADE_TEXTO_MIN", "0.005"))     # fração da imagem com tinta
@@ -0,0 +1,140 @@
+"""
+Motor de correções de OCR orientado a dados (app/correcoes_ocr.json).
+
+As regras são carregadas e compiladas uma única vez:
+- "palavra": substituições literais de palavra inteira (\\b...\\b). Regras
+  "palavra" consecutivas viram um único regex combinado e rodam em uma passada;
+  com "normalizar_caixa", o próprio "para" em outra caixa também é reescrito;
+- "regex": padrão + substituição do re.sub, aplicados na ordem do arquivo.
+
+Todas as regras ignoram maiúsculas/minúsculas, como no corrigir_erros_ocr original.
+Cada regra conta quantas vezes disparou (estatisticas) para achar regras mortas;
+uma troca que deixa o texto igual não conta.
+"""
+
+import json
+import re
+import threading
+from collections import Counter
+from pathlib import Path
+
+TIPOS_REGRA = ("palavra", "regex")
+
+
+class ErroRegras(Exception):
+    """Arquivo de regras inválido."""
+
+
+class MotorCorrecoes:
+    def __init__(self, regras: list, versao: str = "0"):
+        self.versao = str(versao)
+        self.ids = []
+        self._etapas = []  # ("palavra", regex_combinado, {variante_minuscula: (id, para)}) | ("regex", id, regex, para)
+        self._contagem = Counter()
+        self._lock = threading.Lock()
+
+        grupo = []
+        for regra in regras:
+            rid = regra.get("id")
+            tipo = regra.get("tipo")
+            if not rid or rid in self.ids:
+                raise ErroRegras(f"Regra sem id ou com id repetido: {regra}")
+            if tipo not in TIPOS_REGRA:
+                raise ErroRegras(f"Regra '{rid}': tipo inválido {tipo!r} (use {', '.join(TIPOS_REGRA)})")
+            self.ids.append(rid)
+            if tipo == "palavra":
+                grupo.append(regra)
+                continue
+            self._fechar_grupo(grupo)
+            grupo = []
+            try:
+                padrao = re.compile(regra["padrao"], re.IGNORECASE)
+            except (KeyError, re.error) as e:
+                raise ErroRegras(f"Regra '{rid}': padrão inválido: {e}") from e
+            self._etapas.append(("regex", rid, padrao, regra.get("para", "")))
+        self._fechar_grupo(grupo)
+
+    def _fechar_grupo(self, grupo: list) -> None:
+        if not grupo:
+            return
+        destinos = {}
+        for regra in grupo:
+            variantes = regra.get("de", []) + ([regra["para"]] if regra.get("normalizar_caixa") else [])
+            for variante in variantes:
+                chave = variante.lower()
+                if chave in destinos:
+                    raise ErroRegras(f"Regra '{regra['id']}': '{variante}' já coberta por '{destinos[chave][0]}'")
+                destinos[chave] = (regra["id"], regra["para"])
+        # Variantes mais longas primeiro: a alternância do re para na primeira que casar
+        alternativas = "|".join(re.escape(v) for v in sorted(destinos, key=len, reverse=True))
+        self._etapas.append(("palavra", re.compile(rf"\b(?:{alternativas})\b", re.IGNORECASE), destinos))
+
+    @classmethod
+    def de_arquivo(cls, caminho: str | Path) -> "MotorCorrecoes":
+        try:
+            dados = json.loads(Path(caminho).read_text(encoding="utf-8"))
+        except (OSError, ValueError) as e:
+            raise ErroRegras(f"Não foi possível ler as regras de correção '{caminho}': {e}") from e
+        return cls(dados.get("regras", []), versao=dados.get("versao", "0"))
+
+    @property
+    def passadas(self) -> int:
+        """Número de varreduras do texto por chamada de aplicar()."""
+        return len(self._etapas)
+
+    def aplicar(self, texto: str) -> str:
+        texto, contagem = self._aplicar(texto)
+        self._registrar(contagem)
+        return texto
+
+    def _aplicar(self, texto: str):
+        contagem = Counter()
+        for etapa in self._etapas:
+            if etapa[0] == "palavra":
+                _, padrao, destinos = etapa
+
+                def substituir(m, destinos=destinos):
+                    destino = destinos.get(m.group(0).lower())
+                    if destino is None or destino[1] == m.group(0):  # sem mudança (ou caixa especial do Unicode)
+                        return m.group(0)
+                    contagem[destino[0]] += 1
+                    return destino[1]
+
+                texto = padrao.sub(substituir, texto)
+            else:
+                _, rid, padrao, para = etapa
+                texto, n = padrao.subn(para, texto)
+                if n:
+                    contagem[rid] += n
+        return texto, contagem
+
+    def _registrar(self, contagem: Counter) -> None:
+        if contagem:
+            with self._lock:
+                self._contagem.update(contagem)
+
+    def aplicar_linhas(self, linhas: list, contar: bool = True) -> list:
+        """
+        Corrige uma lista de linhas mantendo uma correção por linha de entrada.
+        Normalmente é uma única chamada de aplicar() no texto unido; se alguma regra
+        consumir uma quebra de linha (ex.: espaços duplos no fim da linha), as
+        linhas são corrigidas uma a uma para não perder a estrutura do OCR.
+        contar=False não altera as estatísticas (correções só para avaliação).
+        """
+        texto, contagem = self._aplicar("\n".join(linhas))
+        corrigidas = texto.split("\n")
+        if len(corrigidas) != len(linhas):
+            contagem = Counter()
+            corrigidas = []
+            for linha in linhas:
+                corrigida, c = self._aplicar(linha)
+                corrigidas.append(corrigida)
+                contagem.update(c)
+        if contar:
+            self._registrar(contagem)
+        return corrigidas
+
+    def estatisticas(self) -> dict:
+        """Disparos por regra (na ordem do arquivo); regras com 0 são candidatas a remoção."""
+        with self._lock:
+            return {rid: self._contagem.get(rid, 0) for rid in self.ids}
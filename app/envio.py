@@ -0,0 +1,448 @@
+"""
+Envio de mensagens pela WhatsApp Cloud API com limite de taxa e fila de reenvio.
+
+enviar(destino, texto) grava a mensagem numa fila SQLite (WHATSAPP_ENVIO_DB,
+modo WAL, compartilhada entre workers) e volta na hora; as threads do
+despachante (WHATSAPP_CONCORRENCIA por processo) fazem os POSTs:
+- texto acima de WHATSAPP_MSG_MAX caracteres (4096, limite do corpo de texto
+  da Cloud API) é dividido em partes, quebrando entre linhas (ou palavras) e
+  fechando/reabrindo um bloco ``` cortado; as partes saem em ordem, e uma
+  mensagem só sai depois das anteriores para o mesmo destino;
+- cada POST consome um token do balde do PHONE_NUMBER_ID (WHATSAPP_TAXA
+  mensagens/s, rajada de WHATSAPP_RAJADA); um 429 esvazia o balde do número;
+  o balde é uma linha do mesmo SQLite, então a taxa vale para todos os workers
+  juntos;
+- 429, 5xx, erros de limite da Meta e falhas de rede reagendam a mensagem a
+  partir da parte que falhou, com backoff exponencial (WHATSAPP_BACKOFF,
+  dobrando até WHATSAPP_BACKOFF_MAX) e respeitando o Retry-After; outros 4xx,
+  ou WHATSAPP_TENTATIVAS esgotadas, marcam a mensagem como "falhou" (guardada
+  por WHATSAPP_RETENCAO segundos).
+
+Mensagens de um worker que caiu no meio do envio voltam para a fila quando a
+reserva expira. Um timeout de leitura também é reenviado, então
+a entrega é "pelo menos uma vez".
+"""
+
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+import requests
+
+from . import log
+from .config import PHONE_NUMBER_ID, WHATSAPP_ENVIO_DB, WHATSAPP_TAXA, WHATSAPP_RAJADA, WHATSAPP_CONCORRENCIA
+from .config import WHATSAPP_TENTATIVAS, WHATSAPP_BACKOFF, WHATSAPP_BACKOFF_MAX, WHATSAPP_MSG_MAX, WHATSAPP_RETENCAO
+from .config import METRICAS_ATIVO
+from .metricas import REGISTRO
+
+ENVIOS = REGISTRO.contador("receitas_whatsapp_envios_total",
+                           "Mensagens da Cloud API por resultado (enviada, reagendada, falhou)")
+
+# Códigos de erro da Graph API que indicam limite de taxa mesmo com status 400
+# (80007/130429: vazão do número; 131056: muitas mensagens para o mesmo destino; 4: limite do app)
+CODIGOS_LIMITE = {4, 80007, 130429, 131056}
+
+_RESERVA = 120.0     # s que uma mensagem fica com a thread que a pegou antes de voltar para a fila
+_INTERVALO = 0.5     # s entre consultas à fila quando não há nada para enviar
+_ESPERA_MAX = 5.0    # s de espera por token na thread; acima disso a mensagem volta para a fila
+_CERCA_MAX = 16      # caracteres guardados da linha que abriu um bloco ``` (reaberto na parte seguinte)
+
+
+# ============================================================
+# Divisão de mensagens longas
+# ============================================================
+
+def _quebrar_linha(linha: str, tamanho: int):
+    """Pedaços de até `tamanho` caracteres, cortando no último espaço (ou no meio, sem espaço)."""
+    while len(linha) > tamanho:
+        corte = linha.rfind(" ", 0, tamanho + 1)
+        if corte <= 0:
+            corte = tamanho
+        yield linha[:corte]
+        linha = linha[corte:].lstrip(" ")
+    yield linha
+
+
+def dividir_mensagem(texto: str, limite: int = WHATSAPP_MSG_MAX) -> list:
+    """
+    Divide o texto em partes de até `limite` caracteres, entre linhas sempre que possível.
+    Um bloco ``` cortado é fechado no fim da parte e reaberto (com a mesma linguagem) na seguinte.
+    """
+    if len(texto) <= limite:
+        return [texto]
+    partes, atual, cerca = [], None, None  # cerca: linha que abriu o bloco ``` em aberto
+    tamanho_linha = limite - 2 * _CERCA_MAX  # folga para fechar e reabrir o bloco
+    for linha_original in texto.split("\n"):
+        for linha in _quebrar_linha(linha_original, tamanho_linha):
+            nova_cerca = cerca
+            if linha.lstrip().startswith("```"):
+                nova_cerca = None if cerca else linha.strip()[:_CERCA_MAX]
+            candidato = linha if atual is None else atual + "\n" + linha
+            if atual is not None and len(candidato) + (4 if nova_cerca else 0) > limite:
+                partes.append(atual + ("\n```" if cerca else ""))
+                candidato = (cerca + "\n" if cerca else "") + linha
+            atual, cerca = candidato, nova_cerca
+    partes.append(atual)
+    return partes
+
+
+# ============================================================
+# Limite de taxa
+# ============================================================
+
+class BaldeTokens:
+    """
+    Token bucket do número na fila SQLite: `taxa` tokens/s, acumulando até
+    `capacidade`. O estado (tokens, instante) é uma linha da tabela baldes,
+    lida e gravada na mesma transação BEGIN IMMEDIATE, e vale para todos os
+    processos que usam a fila.
+    """
+
+    def __init__(self, fila: "FilaEnvios", numero: str, taxa: float, capacidade: float):
+        self.fila = fila
+        self.numero = numero
+        self.taxa = taxa
+        self.capacidade = max(1.0, capacidade)
+
+    def _atualizar(self, func) -> float:
+        """Aplica func(tokens reabastecidos) -> tokens novos na linha do número; devolve os tokens novos."""
+        def op(con):
+            agora = time.time()
+            linha = con.execute("SELECT tokens, instante FROM baldes WHERE numero = ?", (self.numero,)).fetchone()
+            if linha is None:
+                tokens = self.capacidade
+            else:  # max(): relógios de processos diferentes podem divergir um pouco
+                tokens = min(self.capacidade, linha[0] + max(0.0, agora - linha[1]) * self.taxa)
+            tokens = func(tokens)
+            con.execute("INSERT INTO baldes (numero, tokens, instante) VALUES (?, ?, ?) "
+                        "ON CONFLICT(numero) DO UPDATE SET tokens = excluded.tokens, instante = excluded.instante",
+                        (self.numero, tokens, agora))
+            return tokens
+        return self.fila._transacao(op)
+
+    def reservar(self) -> float:
+        """Consome um token e devolve quantos segundos esperar até ele existir (0 = enviar já)."""
+        tokens = self._atualizar(lambda t: t - 1)
+        return 0.0 if tokens >= 0 else -tokens / self.taxa
+
+    def devolver(self) -> None:
+        """Devolve um token reservado e não usado."""
+        self._atualizar(lambda t: t + 1)
+
+    def pausar(self, segundos: float) -> None:
+        """Esvazia o balde por `segundos` (o número recebeu 429): os próximos envios esperam."""
+        self._atualizar(lambda t: min(t, -segundos * self.taxa))
+
+
+# ============================================================
+# Fila persistente
+# ============================================================
+
+_SCHEMA = (
+    """CREATE TABLE IF NOT EXISTS envios (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        numero TEXT NOT NULL,
+        destino TEXT NOT NULL,
+        partes TEXT NOT NULL,
+        enviadas INTEGER NOT NULL DEFAULT 0,
+        tentativas INTEGER NOT NULL DEFAULT 0,
+        estado TEXT NOT NULL DEFAULT 'pendente',
+        proximo_em REAL NOT NULL,
+        reservado_ate REAL NOT NULL DEFAULT 0,
+        atualizado_em REAL NOT NULL,
+        erro TEXT
+    )""",
+    "CREATE INDEX IF NOT EXISTS envios_fila ON envios (estado, proximo_em)",
+    "CREATE INDEX IF NOT EXISTS envios_destino ON envios (destino, id)",
+    "CREATE TABLE IF NOT EXISTS metricas (nome TEXT PRIMARY KEY, valor INTEGER NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS baldes (numero TEXT PRIMARY KEY, tokens REAL NOT NULL, instante REAL NOT NULL)",
+)
+
+# Próxima mensagem vencida (ou com a reserva expirada) sem mensagem anterior pendente para o mesmo destino
+_PROXIMA = """
+SELECT id, numero, destino, partes, enviadas, tentativas FROM envios
+WHERE ((estado = 'pendente' AND proximo_em <= :agora) OR (estado = 'enviando' AND reservado_ate < :agora))
+  AND NOT EXISTS (SELECT 1 FROM envios anterior WHERE anterior.destino = envios.destino
+                  AND anterior.id < envios.id AND anterior.estado IN ('pendente', 'enviando'))
+ORDER BY proximo_em LIMIT 1
+"""
+
+
+class FilaEnvios:
+    """Mensagens a enviar em SQLite, compartilhadas entre processos. Cada operação é uma transação."""
+
+    def __init__(self, caminho: str | Path = WHATSAPP_ENVIO_DB, retencao: float = WHATSAPP_RETENCAO):
+        self.caminho = Path(caminho)
+        self.retencao = retencao
+        self._local = threading.local()
+        self.caminho.parent.mkdir(parents=True, exist_ok=True)
+        con = self._conexao()
+        for sql in _SCHEMA:
+            con.execute(sql)
+
+    def _conexao(self) -> sqlite3.Connection:
+        con = getattr(self._local, "con", None)
+        if con is None or getattr(self._local, "pid", None) != os.getpid():
+            con = sqlite3.connect(self.caminho, timeout=30, isolation_level=None)
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute("PRAGMA synchronous=NORMAL")
+            self._local.con = con
+            self._local.pid = os.getpid()
+        return con
+
+    def _transacao(self, func):
+        con = self._conexao()
+        con.execute("BEGIN IMMEDIATE")
+        try:
+            resultado = func(con)
+            con.execute("COMMIT")
+            return resultado
+        except BaseException:
+            con.execute("ROLLBACK")
+            raise
+
+    @staticmethod
+    def _somar(con, nome: str, n: int = 1) -> None:
+        con.execute(
+            "INSERT INTO metricas (nome, valor) VALUES (?, ?) "
+            "ON CONFLICT(nome) DO UPDATE SET valor = valor + excluded.valor", (nome, n))
+
+    def adicionar(self, numero: str, destino: str, partes: list) -> int:
+        agora = time.time()
+        return self._transacao(lambda con: con.execute(
+            "INSERT INTO envios (numero, destino, partes, proximo_em, atualizado_em) VALUES (?, ?, ?, ?, ?)",
+            (numero, destino, json.dumps(partes, ensure_ascii=False), agora, agora)).lastrowid)
+
+    def reservar(self) -> dict | None:
+        """Pega a próxima mensagem a enviar (estado "enviando" por _RESERVA segundos) ou None."""
+        def op(con):
+            agora = time.time()
+            linha = con.execute(_PROXIMA, {"agora": agora}).fetchone()
+            if linha is None:
+                return None
+            con.execute("UPDATE envios SET estado = 'enviando', reservado_ate = ? WHERE id = ?",
+                        (agora + _RESERVA, linha[0]))
+            return {"id": linha[0], "numero": linha[1], "destino": linha[2], "partes": json.loads(linha[3]),
+                    "enviadas": linha[4], "tentativas": linha[5]}
+        return self._transacao(op)
+
+    def parte_enviada(self, envio: dict, enviadas: int) -> None:
+        """Registra o progresso (a mensagem é retomada dali) e remove a mensagem concluída."""
+        def op(con):
+            self._somar(con, "partes")
+            if enviadas >= len(envio["partes"]):
+                con.execute("DELETE FROM envios WHERE id = ?", (envio["id"],))
+                self._somar(con, "enviadas")
+            else:
+                con.execute("UPDATE envios SET enviadas = ?, reservado_ate = ?, atualizado_em = ? WHERE id = ?",
+                            (enviadas, time.time() + _RESERVA, time.time(), envio["id"]))
+        self._transacao(op)
+
+    def reagendar(self, envio: dict, tentativas: int, espera: float, erro: str) -> None:
+        def op(con):
+            agora = time.time()
+            con.execute("UPDATE envios SET estado = 'pendente', tentativas = ?, proximo_em = ?, atualizado_em = ?, "
+                        "erro = ? WHERE id = ?", (tentativas, agora + espera, agora, erro, envio["id"]))
+            self._somar(con, "reagendadas")
+        self._transacao(op)
+
+    def adiar(self, envio: dict, espera: float = 0.0) -> None:
+        """Devolve à fila, sem contar tentativa (balde vazio por muito tempo ou encerramento)."""
+        self._transacao(lambda con: con.execute(
+            "UPDATE envios SET estado = 'pendente', proximo_em = ?, reservado_ate = 0 WHERE id = ?",
+            (time.time() + espera, envio["id"])))
+
+    def falhar(self, envio: dict, tentativas: int, erro: str) -> None:
+        def op(con):
+            agora = time.time()
+            con.execute("UPDATE envios SET estado = 'falhou', tentativas = ?, atualizado_em = ?, erro = ? WHERE id = ?",
+                        (tentativas, agora, erro, envio["id"]))
+            con.execute("DELETE FROM envios WHERE estado = 'falhou' AND atualizado_em < ?", (agora - self.retencao,))
+            self._somar(con, "falhas")
+        self._transacao(op)
+
+    def proxima_em(self) -> float | None:
+        """Instante (time.time) da próxima mensagem pendente, para dormir até lá."""
+        return self._conexao().execute("SELECT MIN(proximo_em) FROM envios WHERE estado = 'pendente'").fetchone()[0]
+
+    def estatisticas(self) -> dict:
+        con = self._conexao()
+        por_estado = dict(con.execute("SELECT estado, COUNT(*) FROM envios GROUP BY estado").fetchall())
+        metricas = dict(con.execute("SELECT nome, valor FROM metricas").fetchall())
+        return {
+            "pendentes": por_estado.get("pendente", 0),
+            "enviando": por_estado.get("enviando", 0),
+            "falharam": por_estado.get("falhou", 0),
+            "enviadas_total": metricas.get("enviadas", 0),
+            "partes_total": metricas.get("partes", 0),
+            "reagendadas_total": metricas.get("reagendadas", 0),
+            "falhas_total": metricas.get("falhas", 0),
+        }
+
+
+# ============================================================
+# Despachante
+# ============================================================
+
+def _classificar(erro: Exception) -> tuple:
+    """(temporário?, Retry-After em s ou None, descrição) de uma falha no POST."""
+    if isinstance(erro, (requests.ConnectionError, requests.Timeout)):
+        return True, None, type(erro).__name__
+    resposta = getattr(erro, "response", None)
+    if resposta is None:
+        return False, None, repr(erro)
+    try:
+        codigo = resposta.json().get("error", {}).get("code")
+    except ValueError:
+        codigo = None
+    try:
+        retry_after = float(resposta.headers.get("Retry-After"))
+    except (TypeError, ValueError):
+        retry_after = None
+    limite = resposta.status_code == 429 or codigo in CODIGOS_LIMITE
+    descricao = f"HTTP {resposta.status_code}" + (f" (código {codigo})" if codigo is not None else "")
+    return limite or resposta.status_code >= 500, retry_after if limite else None, descricao
+
+
+def _enviar_parte(numero: str, destino: str, texto: str) -> None:
+    from .services import enviar_texto_whatsapp
+
+    enviar_texto_whatsapp(destino, texto, phone_number_id=numero)
+
+
+class Despachante:
+    """Fila persistente + WHATSAPP_CONCORRENCIA threads de envio, com um balde de tokens por número na fila."""
+
+    def __init__(self, fila: FilaEnvios | None = None, concorrencia: int = WHATSAPP_CONCORRENCIA,
+                 taxa: float = WHATSAPP_TAXA, rajada: float = WHATSAPP_RAJADA, tentativas: int = WHATSAPP_TENTATIVAS,
+                 backoff: float = WHATSAPP_BACKOFF, backoff_max: float = WHATSAPP_BACKOFF_MAX,
+                 limite: int = WHATSAPP_MSG_MAX, enviar_parte=_enviar_parte):
+        self.fila = fila if fila is not None else FilaEnvios()
+        self.taxa = taxa
+        self.rajada = rajada
+        self.tentativas = tentativas
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+        self.limite = limite
+        self.enviar_parte = enviar_parte
+        self.pid = os.getpid()
+        self._baldes = {}
+        self._lock = threading.Lock()
+        self._acordar = threading.Event()
+        self._parar = threading.Event()
+        self._threads = []
+        for i in range(max(1, concorrencia)):
+            t = threading.Thread(target=self._executar, name=f"whatsapp-envio-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def enviar(self, destino: str, texto: str, numero: str | None = None) -> int:
+        """Enfileira a mensagem (dividida em partes se preciso) e devolve o id na fila."""
+        numero = numero or PHONE_NUMBER_ID
+        if not numero:
+            raise RuntimeError("Defina PHONE_NUMBER_ID nas variáveis de ambiente.")
+        id_envio = self.fila.adicionar(numero, destino, dividir_mensagem(texto, self.limite))
+        self._acordar.set()
+        return id_envio
+
+    def balde(self, numero: str) -> BaldeTokens:
+        with self._lock:
+            balde = self._baldes.get(numero)
+            if balde is None:
+                balde = self._baldes[numero] = BaldeTokens(self.fila, numero, self.taxa, self.rajada)
+            return balde
+
+    def _executar(self) -> None:
+        while not self._parar.is_set():
+            try:
+                envio = self.fila.reservar()
+            except sqlite3.Error as e:
+                log.erro("whatsapp_fila_falhou", erro=str(e), exc_info=e)
+                envio = None
+            if envio is not None:
+                try:
+                    self._processar(envio)
+                except Exception as e:  # a reserva expira e a mensagem volta para a fila
+                    log.erro("whatsapp_envio_erro", id=envio["id"], erro=str(e), exc_info=e)
+                continue
+            proxima = self.fila.proxima_em()
+            espera = _INTERVALO if proxima is None else min(_INTERVALO, max(0.0, proxima - time.time()))
+            if self._acordar.wait(espera):
+                self._acordar.clear()
+
+    def _processar(self, envio: dict) -> None:
+        balde = self.balde(envio["numero"])
+        for i in range(envio["enviadas"], len(envio["partes"])):
+            espera = balde.reservar()
+            if espera > _ESPERA_MAX:
+                balde.devolver()
+                self.fila.adiar(envio, espera)
+                return
+            if espera and self._parar.wait(espera):
+                self.fila.adiar(envio)
+                return
+            try:
+                self.enviar_parte(envio["numero"], envio["destino"], envio["partes"][i])
+            except Exception as e:
+                self._falha(envio, balde, e)
+                return
+            self.fila.parte_enviada(envio, i + 1)
+        if METRICAS_ATIVO:
+            ENVIOS.incrementar(resultado="enviada")
+
+    def _falha(self, envio: dict, balde: BaldeTokens, erro: Exception) -> None:
+        temporario, retry_after, descricao = _classificar(erro)
+        tentativas = envio["tentativas"] + 1
+        if not temporario or tentativas >= self.tentativas:
+            self.fila.falhar(envio, tentativas, descricao)
+            if METRICAS_ATIVO:
+                ENVIOS.incrementar(resultado="falhou")
+            log.erro("whatsapp_envio_falhou", id=envio["id"], tentativas=tentativas, erro=descricao)
+            return
+        # Backoff exponencial com jitter; o Retry-After da Meta, se vier, é o mínimo
+        espera = min(self.backoff_max, self.backoff * 2 ** (tentativas - 1)) * random.uniform(0.5, 1.0)
+        if retry_after is not None:
+            espera = max(espera, retry_after)
+            balde.pausar(retry_after)
+        self.fila.reagendar(envio, tentativas, espera, descricao)
+        if METRICAS_ATIVO:
+            ENVIOS.incrementar(resultado="reagendada")
+        log.aviso("whatsapp_envio_reagendado", id=envio["id"], tentativas=tentativas, espera_s=round(espera, 2),
+                  erro=descricao)
+
+    def aguardar(self, timeout: float | None = None) -> bool:
+        """Bloqueia até não haver mensagens pendentes (útil em scripts e testes); False se estourar o timeout."""
+        limite = None if timeout is None else time.monotonic() + timeout
+        while True:
+            e = self.fila.estatisticas()
+            if not e["pendentes"] and not e["enviando"]:
+                return True
+            if limite is not None and time.monotonic() > limite:
+                return False
+            time.sleep(0.05)
+
+    def encerrar(self) -> None:
+        self._parar.set()
+        self._acordar.set()
+        for t in self._threads:
+            t.join()
+
+    def status(self) -> dict:
+        return {"threads": len(self._threads), "taxa": self.taxa, "rajada": self.rajada, **self.fila.estatisticas()}
+
+
+_despachante = None
+_despachante_lock = threading.Lock()
+
+
+def obter_despachante() -> Despachante:
+    """Despachante do processo, criado no primeiro uso (e recriado após fork: threads não passam pelo fork)."""
+    global _despachante
+    with _despachante_lock:
+        if _despachante is None or _despachante.pid != os.getpid():
+            _despachante = Despachante()
+        return _despachante
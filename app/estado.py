@@ -0,0 +1,248 @@
+"""
+Armazenamento do estado das conversas (fluxo de perguntas de quantidade).
+
+Dois backends com a mesma interface:
+- EstadoMemoria: dict no processo, com TTL e limite LRU;
+- EstadoSQLite: arquivo SQLite em modo WAL, compartilhado entre workers
+  (gunicorn com vários processos).
+
+atualizar(sender, func) faz leitura-modificação-escrita atômica por remetente:
+func recebe o estado atual (ou None) e devolve (novo_estado | None, retorno).
+
+O TTL conta a partir do último acesso (leitura ou escrita) de cada remetente.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+from .config import ESTADO_BACKEND, ESTADO_DB, ESTADO_TTL, ESTADO_MAX_ITENS
+
+_PODA = 64  # gravações entre remoções das conversas expiradas e verificações do limite de itens
+
+
+class EstadoMemoria:
+    def __init__(self, ttl: float = ESTADO_TTL, max_itens: int = ESTADO_MAX_ITENS):
+        self.ttl = ttl
+        self.max_itens = max_itens
+        self._itens = OrderedDict()  # sender -> (expira_em, estado), do acesso mais antigo ao mais recente
+        self._lock = threading.RLock()
+        self.remocoes_ttl = 0
+        self.remocoes_lru = 0
+
+    def _ler(self, sender: str):
+        item = self._itens.get(sender)
+        if item is None:
+            return None
+        expira, estado = item
+        if expira < time.time():
+            del self._itens[sender]
+            self.remocoes_ttl += 1
+            return None
+        self._itens[sender] = (time.time() + self.ttl, estado)
+        self._itens.move_to_end(sender)
+        return estado
+
+    def _gravar(self, sender: str, estado) -> None:
+        if estado is None:
+            self._itens.pop(sender, None)
+            return
+        self._itens[sender] = (time.time() + self.ttl, estado)
+        self._itens.move_to_end(sender)
+        self._expirar()
+        while len(self._itens) > self.max_itens:
+            self._itens.popitem(last=False)
+            self.remocoes_lru += 1
+
+    def _expirar(self) -> None:
+        agora = time.time()
+        # Ordem de acesso = ordem de expiração: para no primeiro item ainda válido
+        while self._itens:
+            sender, (expira, _) = next(iter(self._itens.items()))
+            if expira >= agora:
+                break
+            del self._itens[sender]
+            self.remocoes_ttl += 1
+
+    def obter(self, sender: str):
+        with self._lock:
+            return self._ler(sender)
+
+    def salvar(self, sender: str, estado: dict) -> None:
+        with self._lock:
+            self._gravar(sender, estado)
+
+    def remover(self, sender: str) -> None:
+        with self._lock:
+            self._itens.pop(sender, None)
+
+    def atualizar(self, sender: str, func):
+        with self._lock:
+            novo, retorno = func(self._ler(sender))
+            self._gravar(sender, novo)
+            return retorno
+
+    def __contains__(self, sender: str) -> bool:
+        return self.obter(sender) is not None
+
+    def estatisticas(self) -> dict:
+        with self._lock:
+            self._expirar()
+            return {
+                "backend": "memoria",
+                "tamanho": len(self._itens),
+                "remocoes_ttl": self.remocoes_ttl,
+                "remocoes_lru": self.remocoes_lru,
+            }
+
+
+_SCHEMA = (
+    """CREATE TABLE IF NOT EXISTS conversas (
+        sender TEXT PRIMARY KEY,
+        dados TEXT NOT NULL,
+        expira_em REAL NOT NULL,
+        acesso REAL NOT NULL
+    ) WITHOUT ROWID""",
+    "CREATE INDEX IF NOT EXISTS conversas_expira ON conversas (expira_em)",
+    "CREATE INDEX IF NOT EXISTS conversas_acesso ON conversas (acesso)",
+    "CREATE TABLE IF NOT EXISTS metricas (nome TEXT PRIMARY KEY, valor INTEGER NOT NULL)",
+)
+
+
+class EstadoSQLite:
+    """
+    Backend compartilhado entre processos. Cada escrita é uma transação BEGIN
+    IMMEDIATE; atualizar() sem conversa em andamento só lê. Conversas expiradas
+    e o excesso sobre max_itens são removidos a cada _PODA gravações do processo
+    (até lá, as expiradas já não são devolvidas).
+    """
+
+    def __init__(self, caminho: str | Path = ESTADO_DB, ttl: float = ESTADO_TTL, max_itens: int = ESTADO_MAX_ITENS):
+        self.caminho = Path(caminho)
+        self.ttl = ttl
+        self.max_itens = max_itens
+        self._local = threading.local()
+        self._gravacoes = 0
+        self.caminho.parent.mkdir(parents=True, exist_ok=True)
+        con = self._conexao()
+        for sql in _SCHEMA:
+            con.execute(sql)
+
+    def _conexao(self) -> sqlite3.Connection:
+        con = getattr(self._local, "con", None)
+        if con is None or getattr(self._local, "pid", None) != os.getpid():
+            # isolation_level=None: as transações são controladas explicitamente
+            con = sqlite3.connect(self.caminho, timeout=30, isolation_level=None)
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute("PRAGMA synchronous=NORMAL")
+            self._local.con = con
+            self._local.pid = os.getpid()
+        return con
+
+    def _transacao(self, func):
+        con = self._conexao()
+        con.execute("BEGIN IMMEDIATE")
+        try:
+            resultado = func(con)
+            con.execute("COMMIT")
+            return resultado
+        except BaseException:
+            con.execute("ROLLBACK")
+            raise
+
+    @staticmethod
+    def _somar(con, nome: str, n: int) -> None:
+        if n:
+            con.execute(
+                "INSERT INTO metricas (nome, valor) VALUES (?, ?) "
+                "ON CONFLICT(nome) DO UPDATE SET valor = valor + excluded.valor", (nome, n))
+
+    def _ler(self, con, sender: str, agora: float):
+        linha = con.execute("SELECT dados, expira_em FROM conversas WHERE sender = ?", (sender,)).fetchone()
+        if linha is None:
+            return None
+        if linha[1] < agora:
+            con.execute("DELETE FROM conversas WHERE sender = ?", (sender,))
+            self._somar(con, "remocoes_ttl", 1)
+            return None
+        return json.loads(linha[0])
+
+    def _gravar(self, con, sender: str, estado, agora: float) -> None:
+        if estado is None:
+            con.execute("DELETE FROM conversas WHERE sender = ?", (sender,))
+            return
+        con.execute(
+            "INSERT INTO conversas (sender, dados, expira_em, acesso) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(sender) DO UPDATE SET dados = excluded.dados, expira_em = excluded.expira_em, "
+            "acesso = excluded.acesso",
+            (sender, json.dumps(estado, ensure_ascii=False), agora + self.ttl, agora))
+        self._gravacoes += 1
+        if self._gravacoes % _PODA:
+            return
+        self._somar(con, "remocoes_ttl", con.execute("DELETE FROM conversas WHERE expira_em < ?", (agora,)).rowcount)
+        excesso = con.execute("SELECT COUNT(*) FROM conversas").fetchone()[0] - self.max_itens
+        if excesso > 0:
+            con.execute(
+                "DELETE FROM conversas WHERE sender IN "
+                "(SELECT sender FROM conversas ORDER BY acesso LIMIT ?)", (excesso,))
+            self._somar(con, "remocoes_lru", excesso)
+
+    def obter(self, sender: str):
+        def op(con):
+            agora = time.time()
+            estado = self._ler(con, sender, agora)
+            if estado is not None:
+                con.execute("UPDATE conversas SET acesso = ?, expira_em = ? WHERE sender = ?",
+                            (agora, agora + self.ttl, sender))
+            return estado
+        return self._transacao(op)
+
+    def salvar(self, sender: str, estado: dict) -> None:
+        self._transacao(lambda con: self._gravar(con, sender, estado, time.time()))
+
+    def remover(self, sender: str) -> None:
+        self._transacao(lambda con: self._gravar(con, sender, None, time.time()))
+
+    def atualizar(self, sender: str, func):
+        # Sem conversa em andamento (a maioria das mensagens) e sem nada a gravar, fica na leitura,
+        # sem trava de escrita; senão a transação relê o estado e só chama func de novo se ele mudou
+        previo = None
+        if self._conexao().execute("SELECT 1 FROM conversas WHERE sender = ? AND expira_em >= ?",
+                                   (sender, time.time())).fetchone() is None:
+            previo = func(None)
+            if previo[0] is None:
+                return previo[1]
+
+        def op(con):
+            agora = time.time()
+            estado = self._ler(con, sender, agora)
+            novo, retorno = previo if estado is None and previo is not None else func(estado)
+            self._gravar(con, sender, novo, agora)
+            return retorno
+        return self._transacao(op)
+
+    def __contains__(self, sender: str) -> bool:
+        return self.obter(sender) is not None
+
+    def estatisticas(self) -> dict:
+        con = self._conexao()
+        metricas = dict(con.execute("SELECT nome, valor FROM metricas").fetchall())
+        return {
+            "backend": "sqlite",
+            "tamanho": con.execute("SELECT COUNT(*) FROM conversas WHERE expira_em >= ?", (time.time(),)).fetchone()[0],
+            "remocoes_ttl": metricas.get("remocoes_ttl", 0),
+            "remocoes_lru": metricas.get("remocoes_lru", 0),
+        }
+
+
+def criar_estado_conversas():
+    """Instancia o backend escolhido em ESTADO_BACKEND ("memoria" ou "sqlite")."""
+    if ESTADO_BACKEND == "sqlite":
+        return EstadoSQLite()
+    if ESTADO_BACKEND == "memoria":
+        return EstadoMemoria()
+    raise ValueError(f"ESTADO_BACKEND inválido: {ESTADO_BACKEND!r} (use memoria ou sqlite)")
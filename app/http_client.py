@@ -0,0 +1,114 @@
+"""
+Camada HTTP compartilhada para as chamadas externas (Twilio, Azure, Graph, OpenFDA).
+
+- uma requests.Session por serviço (host), com keep-alive e pool limitado;
+- retry com backoff exponencial em 429/5xx, respeitando o cabeçalho Retry-After;
+- timeouts (conexão, leitura) configuráveis por serviço.
+
+Uso:
+    from .http_client import http_get, http_post
+    resp = http_post("azure", url, headers=..., data=...)
+"""
+
+import os
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from .config import HTTP_POOL_MAX, HTTP_RETRIES, HTTP_BACKOFF, HTTP_RETRY_AFTER_MAX, HTTP_TIMEOUTS
+
+STATUS_RETRY = (429, 500, 502, 503, 504)
+
+# Métodos que podem ser repetidos por serviço. POSTs no Graph só são repetidos em 429,
+# quando a Meta garante que não foram aceitos; o envio de mensagens ("whatsapp") não
+# repete nada aqui: 429/5xx voltam para a fila de app/envio.py, que reagenda com backoff.
+SERVICOS = {
+    "twilio": {"metodos": ("GET",), "status": STATUS_RETRY},
+    "azure": {"metodos": ("GET", "POST"), "status": STATUS_RETRY},
+    "graph": {"metodos": ("GET", "POST"), "status": (429,)},
+    "whatsapp": {"metodos": ("POST",), "status": ()},
+    "openfda": {"metodos": ("GET",), "status": STATUS_RETRY},
+}
+
+
+class _RetryLimitado(Retry):
+    """Retry que respeita o Retry-After, mas nunca espera mais que HTTP_RETRY_AFTER_MAX segundos."""
+
+    def get_retry_after(self, response):
+        espera = super().get_retry_after(response)
+        return None if espera is None else min(espera, HTTP_RETRY_AFTER_MAX)
+
+
+def _criar_sessao(servico: str) -> requests.Session:
+    config = SERVICOS.get(servico, SERVICOS["openfda"])
+    retry = _RetryLimitado(
+        total=HTTP_RETRIES,
+        connect=HTTP_RETRIES,
+        read=0,  # timeout de leitura não é repetido: a requisição pode ter sido processada
+        status=HTTP_RETRIES if config["status"] else 0,
+        allowed_methods=frozenset(config["metodos"]),
+        status_forcelist=config["status"],
+        backoff_factor=HTTP_BACKOFF,
+        respect_retry_after_header=bool(config["status"]),  # sem isso o urllib3 repete 429/503 com Retry-After
+        raise_on_status=False,  # a resposta final volta para o chamador (raise_for_status)
+    )
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=HTTP_POOL_MAX, max_retries=retry, pool_block=False)
+    sessao = requests.Session()
+    sessao.mount("https://", adapter)
+    sessao.mount("http://", adapter)
+    return sessao
+
+
+_sessoes = {}
+_pid = os.getpid()
+_lock = threading.Lock()
+
+
+def obter_sessao(servico: str) -> requests.Session:
+    """Sessão do serviço neste processo (recriada após fork para não herdar sockets do pai)."""
+    global _pid
+    with _lock:
+        if os.getpid() != _pid:
+            _sessoes.clear()
+            _pid = os.getpid()
+        sessao = _sessoes.get(servico)
+        if sessao is None:
+            sessao = _sessoes[servico] = _criar_sessao(servico)
+        return sessao
+
+
+def timeout_para(servico: str) -> tuple:
+    return HTTP_TIMEOUTS.get(servico, HTTP_TIMEOUTS["padrao"])
+
+
+def http_request(servico: str, metodo: str, url: str, **kwargs) -> requests.Response:
+    kwargs.setdefault("timeout", timeout_para(servico))
+    return obter_sessao(servico).request(metodo, url, **kwargs)
+
+
+def http_get(servico: str, url: str, **kwargs) -> requests.Response:
+    return http_request(servico, "GET", url, **kwargs)
+
+
+def http_post(servico: str, url: str, **kwargs) -> requests.Response:
+    return http_request(servico, "POST", url, **kwargs)
+
+
+def estatisticas() -> dict:
+    """Conexões abertas (handshakes) e requisições feitas por serviço, somando os pools do urllib3."""
+    resultado = {}
+    with _lock:
+        sessoes = dict(_sessoes)
+    for servico, sessao in sessoes.items():
+        conexoes = requisicoes = 0
+        adapters = {id(a): a for a in sessao.adapters.values()}.values()
+        for adapter in adapters:
+            for chave in list(adapter.poolmanager.pools.keys()):
+                pool = adapter.poolmanager.pools.get(chave)
+                if pool is not None:
+                    conexoes += pool.num_connections
+                    requisicoes += pool.num_requests
+        resultado[servico] = {"conexoes_abertas": conexoes, "requisicoes": requisicoes}
+    return resultado
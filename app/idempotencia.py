@@ -0,0 +1,195 @@
+"""
+Deduplicação do webhook pelo MessageSid do Twilio.
+
+O Twilio repete o POST em /webhook-whatsapp quando a resposta demora; sem
+deduplicação, cada repetição baixava a mídia e chamava o OCR de novo enquanto
+a primeira ainda rodava. executar(sid, func):
+- primeira vez do sid (ou já fora da janela): marca "processando", executa
+  func e guarda a resposta por DEDUP_JANELA segundos;
+- sid já concluído: devolve a resposta guardada, sem executar nada;
+- sid em processamento (single-flight): espera a resposta da execução em
+  andamento, até DEDUP_ESPERA segundos (menos que os 15 s em que o Twilio
+  desiste); estourado o tempo, devolve None e a rota responde 503. Um 200,
+  mesmo vazio, é dado como entregue pelo Twilio (que já abandonou a primeira
+  requisição, lenta): com o 503, a repetição seguinte pega a resposta guardada.
+
+O registro fica em SQLite (DEDUP_DB, modo WAL), compartilhado entre os workers
+do gunicorn e limitado a DEDUP_MAX_ITENS sids. No mesmo processo a espera é
+por um Event; entre processos, consultando o SQLite. Se func levantar exceção
+o sid é liberado (a próxima repetição processa de novo), e um "processando"
+mais velho que DEDUP_PROCESSANDO_MAX (worker que caiu) é assumido por quem chegar.
+As repetições absorvidas são contadas em receitas_webhook_duplicadas_total.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from . import log
+from .config import DEDUP_DB, DEDUP_JANELA, DEDUP_MAX_ITENS, DEDUP_ESPERA, DEDUP_PROCESSANDO_MAX, METRICAS_ATIVO
+from .metricas import REGISTRO
+
+DUPLICADAS = REGISTRO.contador("receitas_webhook_duplicadas_total",
+                               "Repetições do webhook absorvidas pelo MessageSid, por desfecho")
+
+_CONSULTA = 0.05  # s entre consultas ao SQLite esperando outro processo
+_PODA = 64        # inserções entre verificações do limite de itens
+
+_SCHEMA = (
+    """CREATE TABLE IF NOT EXISTS mensagens (
+        sid TEXT PRIMARY KEY,
+        resposta TEXT,
+        criado_em REAL NOT NULL,
+        expira_em REAL NOT NULL
+    ) WITHOUT ROWID""",
+    "CREATE INDEX IF NOT EXISTS mensagens_expira ON mensagens (expira_em)",
+    "CREATE INDEX IF NOT EXISTS mensagens_criado ON mensagens (criado_em)",
+    "CREATE TABLE IF NOT EXISTS metricas (nome TEXT PRIMARY KEY, valor INTEGER NOT NULL)",
+)
+
+
+class Deduplicador:
+    """Registro de MessageSids (resposta NULL = em processamento). Cada operação é uma transação BEGIN IMMEDIATE."""
+
+    def __init__(self, caminho: str | Path = DEDUP_DB, janela: float = DEDUP_JANELA, max_itens: int = DEDUP_MAX_ITENS,
+                 espera: float = DEDUP_ESPERA, processando_max: float = DEDUP_PROCESSANDO_MAX):
+        self.caminho = Path(caminho)
+        self.janela = janela
+        self.max_itens = max_itens
+        self.espera = espera
+        self.processando_max = processando_max
+        self._local = threading.local()
+        self._em_voo = {}  # sid -> Event, execuções em andamento neste processo
+        self._lock = threading.Lock()
+        self._insercoes = 0
+        self.caminho.parent.mkdir(parents=True, exist_ok=True)
+        con = self._conexao()
+        for sql in _SCHEMA:
+            con.execute(sql)
+
+    def _conexao(self) -> sqlite3.Connection:
+        con = getattr(self._local, "con", None)
+        if con is None or getattr(self._local, "pid", None) != os.getpid():
+            con = sqlite3.connect(self.caminho, timeout=30, isolation_level=None)
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute("PRAGMA synchronous=NORMAL")
+            self._local.con = con
+            self._local.pid = os.getpid()
+        return con
+
+    def _transacao(self, func):
+        con = self._conexao()
+        con.execute("BEGIN IMMEDIATE")
+        try:
+            resultado = func(con)
+            con.execute("COMMIT")
+            return resultado
+        except BaseException:
+            con.execute("ROLLBACK")
+            raise
+
+    @staticmethod
+    def _somar(con, nome: str, n: int = 1) -> None:
+        con.execute(
+            "INSERT INTO metricas (nome, valor) VALUES (?, ?) "
+            "ON CONFLICT(nome) DO UPDATE SET valor = valor + excluded.valor", (nome, n))
+
+    def _reservar(self, sid: str):
+        """(True, None) se este chamador deve processar; senão (False, resposta | None se em processamento)."""
+        def op(con):
+            agora = time.time()
+            linha = con.execute("SELECT resposta, criado_em, expira_em FROM mensagens WHERE sid = ?",
+                                (sid,)).fetchone()
+            if linha is not None:
+                resposta, criado_em, expira_em = linha
+                if resposta is not None and expira_em >= agora:
+                    return False, resposta
+                if resposta is None and criado_em + self.processando_max >= agora:
+                    return False, None
+            con.execute(
+                "INSERT INTO mensagens (sid, resposta, criado_em, expira_em) VALUES (?, NULL, ?, ?) "
+                "ON CONFLICT(sid) DO UPDATE SET resposta = NULL, criado_em = excluded.criado_em, "
+                "expira_em = excluded.expira_em", (sid, agora, agora + self.janela))
+            self._podar(con, agora)
+            return True, None
+        return self._transacao(op)
+
+    def _podar(self, con, agora: float) -> None:
+        con.execute("DELETE FROM mensagens WHERE expira_em < ? AND resposta IS NOT NULL", (agora,))
+        self._insercoes += 1
+        if self._insercoes % _PODA:
+            return
+        excesso = con.execute("SELECT COUNT(*) FROM mensagens").fetchone()[0] - self.max_itens
+        if excesso > 0:
+            con.execute("DELETE FROM mensagens WHERE sid IN "
+                        "(SELECT sid FROM mensagens ORDER BY criado_em LIMIT ?)", (excesso,))
+
+    def _concluir(self, sid: str, resposta: str | None) -> None:
+        """Guarda a resposta ou, com None (func falhou), libera o sid para a próxima repetição."""
+        if resposta is None:
+            self._transacao(lambda con: con.execute(
+                "DELETE FROM mensagens WHERE sid = ? AND resposta IS NULL", (sid,)))
+        else:
+            self._transacao(lambda con: con.execute(
+                "UPDATE mensagens SET resposta = ?, expira_em = ? WHERE sid = ?",
+                (resposta, time.time() + self.janela, sid)))
+
+    def _contar(self, desfecho: str, sid: str) -> None:
+        self._transacao(lambda con: self._somar(con, desfecho))
+        if METRICAS_ATIVO:
+            DUPLICADAS.incrementar(desfecho=desfecho)
+        log.aviso("webhook_duplicado", sid=sid, desfecho=desfecho)
+
+    def executar(self, sid: str, func):
+        """
+        Executa func() uma vez por sid dentro da janela e devolve a resposta (str).
+        Repetições recebem a mesma resposta; None se a execução em andamento não terminar em DEDUP_ESPERA s
+        (o chamador deve responder com erro, para o Twilio repetir).
+        """
+        limite = time.monotonic() + self.espera
+        aguardou = False
+        while True:
+            processar, resposta = self._reservar(sid)
+            if processar:
+                break
+            if resposta is not None:
+                self._contar("aguardou" if aguardou else "repetida", sid)
+                return resposta
+            restante = limite - time.monotonic()
+            if restante <= 0:
+                self._contar("tempo_esgotado", sid)
+                return None
+            aguardou = True
+            with self._lock:
+                evento = self._em_voo.get(sid)
+            # Execução no mesmo processo: acorda quando ela terminar; em outro processo: consulta periódica
+            if evento is not None:
+                evento.wait(restante)
+            else:
+                time.sleep(min(_CONSULTA, restante))
+
+        with self._lock:
+            evento = self._em_voo[sid] = threading.Event()
+        resposta = None
+        try:
+            resposta = func()
+            return resposta
+        finally:
+            try:
+                self._concluir(sid, resposta)
+            finally:
+                with self._lock:
+                    self._em_voo.pop(sid, None)
+                evento.set()
+
+    def estatisticas(self) -> dict:
+        con = self._conexao()
+        agora = time.time()
+        metricas = dict(con.execute("SELECT nome, valor FROM metricas").fetchall())
+        return {
+            "lembrados": con.execute("SELECT COUNT(*) FROM mensagens WHERE expira_em >= ?", (agora,)).fetchone()[0],
+            "processando": con.execute("SELECT COUNT(*) FROM mensagens WHERE resposta IS NULL").fetchone()[0],
+            "duplicadas": {d: metricas.get(d, 0) for d in ("repetida", "aguardou", "tempo_esgotado")},
+        }
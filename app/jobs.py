@@ -0,0 +1,111 @@
+"""
+Pool de workers para processar receitas fora da requisição HTTP.
+
+O webhook só enfileira o trabalho e responde ao Twilio na hora; os workers
+executam download → OCR → parsing e enfileiram o resultado para a WhatsApp
+Cloud API (app/envio.py).
+"""
+
+import queue
+import threading
+
+from . import log
+from .config import JOBS_WORKERS, JOBS_FILA_MAX, JOBS_BACKPRESSURE, JOBS_TIMEOUT_FILA
+
+BACKPRESSURE_VALIDOS = ("rejeitar", "bloquear", "sincrono")
+
+
+class FilaCheia(Exception):
+    """A fila de jobs está no limite e a política de backpressure não permite esperar."""
+
+
+class PoolTrabalho:
+    """Fila limitada + N threads consumidoras."""
+
+    def __init__(self, workers: int = JOBS_WORKERS, fila_max: int = JOBS_FILA_MAX,
+                 backpressure: str = JOBS_BACKPRESSURE, timeout_fila: float = JOBS_TIMEOUT_FILA):
+        if backpressure not in BACKPRESSURE_VALIDOS:
+            raise ValueError(f"JOBS_BACKPRESSURE inválido: {backpressure!r} (use {', '.join(BACKPRESSURE_VALIDOS)})")
+        self.backpressure = backpressure
+        self.timeout_fila = timeout_fila
+        self._fila = queue.Queue(maxsize=max(1, fila_max))
+        self._threads = []
+        self._lock = threading.Lock()
+        self.processados = 0
+        self.falhas = 0
+        self.rejeitados = 0
+        for i in range(max(1, workers)):
+            t = threading.Thread(target=self._executar, name=f"ocr-worker-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def submeter(self, func, *args) -> None:
+        """
+        Enfileira func(*args). Com a fila cheia:
+        - "rejeitar": levanta FilaCheia imediatamente;
+        - "bloquear": espera até timeout_fila segundos e então levanta FilaCheia;
+        - "sincrono": executa func(*args) na thread atual.
+        """
+        try:
+            if self.backpressure == "bloquear":
+                self._fila.put((func, args), timeout=self.timeout_fila)
+            else:
+                self._fila.put_nowait((func, args))
+        except queue.Full:
+            if self.backpressure == "sincrono":
+                func(*args)
+                return
+            with self._lock:
+                self.rejeitados += 1
+            raise FilaCheia(f"Fila de processamento cheia ({self._fila.maxsize} jobs).")
+
+    def _executar(self):
+        while True:
+            item = self._fila.get()
+            if item is None:
+                self._fila.task_done()
+                return
+            func, args = item
+            try:
+                func(*args)
+                with self._lock:
+                    self.processados += 1
+            except Exception as e:
+                with self._lock:
+                    self.falhas += 1
+                log.erro("job_falhou", job=getattr(func, "__name__", str(func)), erro=str(e), exc_info=e)
+            finally:
+                self._fila.task_done()
+
+    def aguardar(self) -> None:
+        """Bloqueia até a fila esvaziar (útil em scripts e testes)."""
+        self._fila.join()
+
+    def encerrar(self) -> None:
+        for _ in self._threads:
+            self._fila.put(None)
+        for t in self._threads:
+            t.join()
+
+    def status(self) -> dict:
+        return {
+            "workers": len(self._threads),
+            "fila": self._fila.qsize(),
+            "fila_max": self._fila.maxsize,
+            "processados": self.processados,
+            "falhas": self.falhas,
+            "rejeitados": self.rejeitados,
+        }
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def obter_pool() -> PoolTrabalho:
+    """Pool compartilhado pelo processo, criado no primeiro uso."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = PoolTrabalho()
+        return _pool
@@ -0,0 +1,124 @@
+"""
+Log estruturado e não bloqueante.
+
+evento("ocr_cache", resultado="acerto") só acrescenta uma tupla a uma fila em
+memória; uma thread em segundo plano formata os eventos acumulados e os escreve
+no stdout em lote (um write por lote, a cada LOG_INTERVALO segundos), então a
+thread da requisição nunca espera pelo I/O do terminal/arquivo nem formata
+JSON. A fila é limitada (LOG_FILA_MAX): cheia, o evento é descartado e contado
+(receitas_log_descartados_total em /metrics) em vez de bloquear.
+
+Formato (LOG_FORMATO): "json" (padrão, uma linha JSON por evento, com os
+campos passados como chaves) ou "texto" (legível no terminal).
+Nível mínimo em LOG_NIVEL (DEBUG, INFO, WARNING, ERROR).
+"""
+
+import atexit
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+
+from .config import LOG_NIVEL, LOG_FORMATO, LOG_FILA_MAX, LOG_INTERVALO
+
+DEBUG, INFO, WARNING, ERROR = logging.DEBUG, logging.INFO, logging.WARNING, logging.ERROR
+_NOMES = {DEBUG: "debug", INFO: "info", WARNING: "warning", ERROR: "error"}
+_nivel_min = logging.getLevelName(LOG_NIVEL) if isinstance(logging.getLevelName(LOG_NIVEL), int) else INFO
+
+_fila = deque()  # (instante, nível, evento, thread, campos, exceção)
+_lock = threading.Lock()
+_pid = None
+_parar = threading.Event()
+_escritor = None
+_descartados = 0
+
+
+def _formatar(item) -> str:
+    instante, nivel, nome, thread, campos, excecao = item
+    ts = time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(instante)) + f".{int(instante % 1 * 1000):03d}"
+    if excecao is not None:
+        campos = {**campos, "excecao": "".join(traceback.format_exception(excecao)).rstrip()}
+    if LOG_FORMATO == "texto":
+        extras = " ".join(f"{k}={v}" for k, v in campos.items())
+        return f"{ts[11:]} {_NOMES.get(nivel, nivel):<7} {nome} {extras}".rstrip()
+    return json.dumps({"ts": ts, "nivel": _NOMES.get(nivel, nivel), "evento": nome, "thread": thread, **campos},
+                      ensure_ascii=False, default=str)
+
+
+def _escrever_pendentes() -> None:
+    linhas = []
+    while _fila:
+        try:
+            linhas.append(_formatar(_fila.popleft()))
+        except Exception as e:  # um campo que não serializa não derruba o log
+            linhas.append(json.dumps({"evento": "log_falha_formatacao", "erro": repr(e)}))
+    if linhas:
+        try:
+            sys.stdout.write("\n".join(linhas) + "\n")
+            sys.stdout.flush()
+        except (OSError, ValueError):
+            pass
+
+
+def _executar_escritor() -> None:
+    while not _parar.wait(LOG_INTERVALO):
+        _escrever_pendentes()
+    _escrever_pendentes()
+
+
+def _iniciar() -> None:
+    """Uma thread escritora por processo (recriada após fork, como o loop do azure_read)."""
+    global _pid, _escritor
+    with _lock:
+        if _pid == os.getpid():
+            return
+        _fila.clear()  # eventos herdados do processo pai já são dele
+        _parar.clear()
+        _escritor = threading.Thread(target=_executar_escritor, name="log-escritor", daemon=True)
+        _escritor.start()
+        _pid = os.getpid()
+
+
+def parar() -> None:
+    """Escreve o que estiver pendente e encerra a thread escritora (chamado também no atexit)."""
+    global _pid
+    with _lock:
+        if _escritor is not None and _pid == os.getpid():
+            _parar.set()
+            _escritor.join(timeout=5)
+        _pid = None
+
+
+atexit.register(parar)
+
+
+def evento(nome: str, nivel: int = INFO, exc_info: BaseException | None = None, **campos) -> None:
+    global _descartados
+    if nivel < _nivel_min:
+        return
+    if _pid != os.getpid():
+        _iniciar()
+    if len(_fila) >= LOG_FILA_MAX:
+        _descartados += 1
+        return
+    _fila.append((time.time(), nivel, nome, threading.current_thread().name, campos, exc_info))
+
+
+def depuracao(nome: str, **campos) -> None:
+    evento(nome, DEBUG, **campos)
+
+
+def aviso(nome: str, **campos) -> None:
+    evento(nome, WARNING, **campos)
+
+
+def erro(nome: str, exc_info: BaseException | None = None, **campos) -> None:
+    evento(nome, ERROR, exc_info=exc_info, **campos)
+
+
+def descartados() -> int:
+    return _descartados
@@ -0,0 +1,242 @@
+"""
+Processamento em lote (offline) de um diretório de receitas → JSONL.
+
+    python -m app.lote receitas/ --saida resultados.jsonl [--processos 4] [--concorrencia 8]
+    python -m app.lote receitas/ --saida resultados.jsonl --ocr-cache
+
+Mesmo pipeline do webhook (services.extrair_texto_midia), dividido em etapas
+para que cada recurso trabalhe em paralelo:
+- leitura + sha256 (thread principal), consultando o CACHE_OCR;
+- CPU, em um pool de processos (--processos): decodificação, triagem de
+  qualidade, pré-processamento e JPEG; nos PDFs, camada de texto e
+  rasterização página a página;
+- rede, em um pool de threads (--concorrencia): OCR de cada imagem/página,
+  seguido de correções e parsing (e OpenFDA, se ligado).
+No máximo processos * 2 + concorrencia arquivos ficam na memória ao mesmo tempo.
+
+Retomável: cada arquivo vira uma linha do JSONL assim que termina. Ao rodar de
+novo com a mesma saída, arquivos já gravados com o mesmo sha256, a mesma
+versão (VERSAO_CACHE_OCR) e sem erro são pulados; vale a última linha de cada
+arquivo. --ocr-cache não chama o OCR: refaz só correções e parsing a partir das
+linhas de OCR guardadas no cache (útil depois de mudar regras de parsing);
+arquivos sem OCR em cache saem com erro.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+
+from . import services
+from .pdf import paginas_para_ocr, unir_paginas
+from .cache import chave_conteudo
+
+EXTENSOES = {"jpg", "jpeg", "png", "webp", "bmp", "tif", "tiff", "pdf"}
+ETAPAS = ("leitura", "cpu", "ocr", "parsing", "total")
+
+
+def _etapa_cpu(conteudo: bytes, extensao: str) -> tuple:
+    """
+    Executa no pool de processos. Devolve ({página: JPEG pré-processado ou
+    [LinhaOCR] da camada de texto}, segundos).
+    """
+    inicio = time.perf_counter()
+    if extensao == "pdf":
+        paginas = paginas_para_ocr(conteudo, services.preparar_pagina_pdf)
+    else:
+        img = services.decodificar_midia(conteudo, extensao)
+        if img is None:
+            raise ValueError("Falha ao decodificar a imagem.")
+        motivos = services.triagem_qualidade(img)
+        if motivos:
+            raise ValueError(f"Foto recusada na triagem de qualidade: {', '.join(motivos)}")
+        paginas = {1: services._preparar_para_ocr(img, conteudo)}
+    return paginas, time.perf_counter() - inicio
+
+
+def _percentil(valores: list, p: float) -> float:
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(len(ordenados) * p))]
+
+
+class Lote:
+    def __init__(self, saida: Path, processos: int, concorrencia: int, so_cache: bool = False):
+        self.saida = saida
+        self.processos = max(1, processos)
+        self.concorrencia = max(1, concorrencia)
+        self.so_cache = so_cache
+        self.tempos = {etapa: [] for etapa in ETAPAS}
+        self.contagem = Counter()
+        self.falhas = []
+        self._lock = threading.Lock()
+        self._em_voo = threading.BoundedSemaphore(self.processos * 2 + self.concorrencia)
+
+    def concluidos(self) -> set:
+        """(arquivo, sha256) já gravados sem erro com a versão atual."""
+        feitos = set()
+        if not self.saida.exists():
+            return feitos
+        with self.saida.open(encoding="utf-8") as f:
+            for linha in f:
+                try:
+                    registro = json.loads(linha)
+                except ValueError:
+                    continue  # última linha cortada por uma interrupção
+                chave = (registro.get("arquivo"), registro.get("sha256"))
+                if registro.get("versao") == services.VERSAO_CACHE_OCR and not registro.get("erro"):
+                    feitos.add(chave)
+                else:
+                    feitos.discard(chave)
+        return feitos
+
+    def _gravar(self, registro: dict, tempos: dict) -> None:
+        tempos["total"] = time.perf_counter() - tempos["total"]
+        registro["tempos_ms"] = {k: round(v * 1000, 1) for k, v in tempos.items()}
+        linha = json.dumps(registro, ensure_ascii=False) + "\n"
+        with self._lock:
+            self._arquivo.write(linha)
+            self._arquivo.flush()
+            for etapa, segundos in tempos.items():
+                self.tempos[etapa].append(segundos)
+            if registro["erro"]:
+                self.contagem["erros"] += 1
+                self.falhas.append((registro["arquivo"], registro["erro"]))
+                print(f"❌ {registro['arquivo']}: {registro['erro']}")
+            else:
+                self.contagem[registro["origem"]] += 1
+                print(f"✅ {registro['arquivo']} ({registro['origem']}, {registro['tempos_ms']['total']:.0f} ms)")
+        self._em_voo.release()
+
+    def _finalizar(self, registro: dict, tempos: dict, conteudo: bytes, linhas: list | None = None,
+                   paginas: dict | None = None) -> None:
+        """Na thread de rede: OCR das páginas (se ainda não há linhas), correções, parsing e cache."""
+        try:
+            if linhas is None:
+                inicio = time.perf_counter()
+                # Como no webhook: só imagens avulsas usam a completude para decidir a escalada
+                avaliar = None if registro["arquivo"].lower().endswith(".pdf") else services._completude_ocr
+                lidas = {n: services.OCR.ler(p, avaliar=avaliar) if isinstance(p, bytes) else p
+                         for n, p in paginas.items()}
+                linhas = unir_paginas(lidas)
+                services.guardar_linhas_ocr(conteudo, linhas)
+                tempos["ocr"] = time.perf_counter() - inicio
+            inicio = time.perf_counter()
+            texto, dados = services.analisar_linhas_ocr(linhas)
+            if services.CACHE_OCR is not None:
+                services.CACHE_OCR.set(chave_conteudo(conteudo, services.VERSAO_CACHE_OCR),
+                                       {"texto": texto, "dados": dados})
+            tempos["parsing"] = time.perf_counter() - inicio
+            registro["dados"] = dados
+        except Exception as e:
+            registro["erro"] = f"{type(e).__name__}: {e}"
+        self._gravar(registro, tempos)
+
+    def _apos_cpu(self, futuro, registro: dict, tempos: dict, conteudo: bytes) -> None:
+        try:
+            paginas, tempos["cpu"] = futuro.result()
+        except Exception as e:
+            registro["erro"] = f"{type(e).__name__}: {e}"
+            self._gravar(registro, tempos)
+            return
+        self._rede.submit(self._finalizar, registro, tempos, conteudo, paginas=paginas)
+
+    def _enviar(self, caminho: Path, relativo: str) -> None:
+        tempos = {"total": time.perf_counter()}
+        conteudo = caminho.read_bytes()
+        registro = {"arquivo": relativo, "sha256": hashlib.sha256(conteudo).hexdigest(),
+                    "versao": services.VERSAO_CACHE_OCR, "origem": "ocr", "dados": None, "erro": None}
+        tempos["leitura"] = time.perf_counter() - tempos["total"]
+        if (relativo, registro["sha256"]) in self._feitos:
+            with self._lock:
+                self.contagem["pulados"] += 1
+            self._em_voo.release()
+            return
+
+        em_cache = services.CACHE_OCR.get(chave_conteudo(conteudo, services.VERSAO_CACHE_OCR)) \
+            if services.CACHE_OCR is not None else None
+        linhas = None if em_cache is not None else services.linhas_ocr_em_cache(conteudo)
+        if em_cache is not None:
+            registro.update(origem="cache", dados=em_cache["dados"])
+            self._gravar(registro, tempos)
+        elif linhas is not None:
+            registro["origem"] = "cache_ocr"
+            self._rede.submit(self._finalizar, registro, tempos, conteudo, linhas)
+        elif self.so_cache:
+            registro["erro"] = "OCR não está no cache (--ocr-cache não chama o OCR)"
+            self._gravar(registro, tempos)
+        else:
+            futuro = self._cpu.submit(_etapa_cpu, conteudo, caminho.suffix.lstrip(".").lower())
+            futuro.add_done_callback(lambda f: self._apos_cpu(f, registro, tempos, conteudo))
+
+    def executar(self, diretorio: Path) -> None:
+        arquivos = sorted(p for p in diretorio.rglob("*")
+                          if p.is_file() and p.suffix.lstrip(".").lower() in EXTENSOES)
+        self._feitos = self.concluidos()
+        if self.so_cache:
+            self._cpu = None
+        else:
+            # Processos criados (fork) antes de qualquer thread do lote
+            self._cpu = ProcessPoolExecutor(max_workers=self.processos)
+            list(self._cpu.map(abs, range(self.processos)))
+        self._rede = ThreadPoolExecutor(max_workers=self.concorrencia, thread_name_prefix="lote-rede")
+        self._inicio = time.perf_counter()
+        print(f"📂 {len(arquivos)} arquivos em {diretorio} ({len(self._feitos)} já concluídos em {self.saida})")
+        try:
+            with self.saida.open("a", encoding="utf-8") as self._arquivo:
+                for caminho in arquivos:
+                    self._em_voo.acquire()
+                    relativo = caminho.relative_to(diretorio).as_posix()
+                    try:
+                        self._enviar(caminho, relativo)
+                    except Exception as e:
+                        self._gravar({"arquivo": relativo, "sha256": None, "versao": services.VERSAO_CACHE_OCR,
+                                      "origem": None, "dados": None, "erro": f"{type(e).__name__}: {e}"},
+                                     {"total": time.perf_counter()})
+                # Espera os arquivos em andamento devolverem suas vagas
+                for _ in range(self.processos * 2 + self.concorrencia):
+                    self._em_voo.acquire()
+        finally:
+            self._rede.shutdown(cancel_futures=True)
+            if self._cpu is not None:
+                self._cpu.shutdown(cancel_futures=True)
+        self._duracao = time.perf_counter() - self._inicio
+
+    def relatorio(self) -> dict:
+        processados = sum(v for k, v in self.contagem.items() if k != "pulados")
+        return {
+            "arquivos_processados": processados,
+            "por_origem": {k: v for k, v in self.contagem.items() if k not in ("pulados", "erros")},
+            "pulados": self.contagem["pulados"],
+            "erros": self.contagem["erros"],
+            "duracao_s": round(self._duracao, 2),
+            "arquivos_por_s": round(processados / self._duracao, 2) if self._duracao else 0.0,
+            "etapas_ms": {
+                etapa: {"n": len(v), "p50": round(_percentil(v, 0.5) * 1000, 1),
+                        "p95": round(_percentil(v, 0.95) * 1000, 1), "soma": round(sum(v) * 1000, 1)}
+                for etapa, v in self.tempos.items() if v
+            },
+            "falhas": [{"arquivo": a, "erro": e} for a, e in self.falhas],
+        }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Processa um diretório de receitas em lote (JSONL, retomável)")
+    parser.add_argument("diretorio", type=Path)
+    parser.add_argument("--saida", type=Path, default=Path("resultados.jsonl"))
+    parser.add_argument("--processos", type=int, default=os.cpu_count() or 1,
+                        help="processos para decodificação/pré-processamento/PDF")
+    parser.add_argument("--concorrencia", type=int, default=4, help="chamadas de OCR ao mesmo tempo")
+    parser.add_argument("--ocr-cache", action="store_true",
+                        help="não chama o OCR; refaz o parsing do OCR guardado no cache")
+    args = parser.parse_args()
+
+    if args.ocr_cache and services.CACHE_OCR is None:
+        parser.error("--ocr-cache exige OCR_CACHE_ATIVO=1")
+    lote = Lote(args.saida, args.processos, args.concorrencia, so_cache=args.ocr_cache)
+    lote.executar(args.diretorio)
+    print(json.dumps(lote.relatorio(), indent=2, ensure_ascii=False))
@@ -0,0 +1,226 @@
+"""
+Métricas em memória no formato de texto do Prometheus (GET /metrics), sem dependências.
+
+- etapa("ocr"): mede a duração de uma etapa da receita no histograma
+  receitas_etapa_segundos{etapa="ocr"} e conta exceções em
+  receitas_erros_total{etapa="ocr"};
+- contadores (acertos de cache, erros tratados) e medidores (requisições e
+  jobs em andamento);
+- coletores: funções chamadas só na exportação, para expor contadores que já
+  existem em outros módulos (fila de jobs, cache de OCR, ...) sem custo no
+  caminho da requisição.
+
+Cada processo tem o próprio registro: com vários workers do gunicorn, cada
+coleta do Prometheus vê o worker que a atendeu. O custo por etapa medida fica
+em benchmarks/bench_metricas.py, que falha acima do orçamento por receita.
+"""
+
+import threading
+import time
+from bisect import bisect_left
+
+from .config import METRICAS_ATIVO
+
+# Do OCR local/correções (ms) ao Azure com polling (dezenas de segundos)
+BUCKETS_SEGUNDOS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _escapar(valor) -> str:
+    return str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _rotulos(chave: tuple, extra: tuple = ()) -> str:
+    pares = [f'{k}="{_escapar(v)}"' for k, v in chave + extra]
+    return "{" + ",".join(pares) + "}" if pares else ""
+
+
+def _numero(valor: float) -> str:
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+class Contador:
+    tipo = "counter"
+
+    def __init__(self, nome: str, descricao: str):
+        self.nome = nome
+        self.descricao = descricao
+        self._valores = {}  # rótulos (tupla ordenada) -> valor
+        self._lock = threading.Lock()
+
+    def incrementar(self, valor: float = 1, **rotulos) -> None:
+        chave = tuple(sorted(rotulos.items()))
+        with self._lock:
+            self._valores[chave] = self._valores.get(chave, 0) + valor
+
+    def valor(self, **rotulos) -> float:
+        with self._lock:
+            return self._valores.get(tuple(sorted(rotulos.items())), 0)
+
+    def exportar(self) -> list:
+        with self._lock:
+            return [f"{self.nome}{_rotulos(k)} {_numero(v)}" for k, v in sorted(self._valores.items())]
+
+
+class Medidor(Contador):
+    """Valor que sobe e desce (ex.: requisições em andamento)."""
+
+    tipo = "gauge"
+
+    def definir(self, valor: float, **rotulos) -> None:
+        with self._lock:
+            self._valores[tuple(sorted(rotulos.items()))] = valor
+
+
+class Histograma:
+    tipo = "histogram"
+
+    def __init__(self, nome: str, descricao: str, buckets: tuple = BUCKETS_SEGUNDOS):
+        self.nome = nome
+        self.descricao = descricao
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # rótulos -> [contagem por bucket..., contagem acima do último, soma]
+        self._lock = threading.Lock()
+
+    def observar(self, valor: float, **rotulos) -> None:
+        chave = tuple(sorted(rotulos.items()))
+        i = bisect_left(self.buckets, valor)
+        with self._lock:
+            serie = self._series.get(chave)
+            if serie is None:
+                serie = self._series[chave] = [0] * (len(self.buckets) + 1) + [0.0]
+            serie[i] += 1
+            serie[-1] += valor
+
+    def exportar(self) -> list:
+        with self._lock:
+            series = {k: list(v) for k, v in self._series.items()}
+        linhas = []
+        for chave, serie in sorted(series.items()):
+            acumulado = 0
+            for limite, n in zip(self.buckets, serie):
+                acumulado += n
+                linhas.append(f"{self.nome}_bucket{_rotulos(chave, (('le', f'{limite:g}'),))} {acumulado}")
+            acumulado += serie[len(self.buckets)]
+            linhas.append(f"{self.nome}_bucket{_rotulos(chave, (('le', '+Inf'),))} {acumulado}")
+            linhas.append(f"{self.nome}_sum{_rotulos(chave)} {_numero(serie[-1])}")
+            linhas.append(f"{self.nome}_count{_rotulos(chave)} {acumulado}")
+        return linhas
+
+
+class Coletor:
+    """Métrica calculada na exportação: func() -> número ou [(rótulos, número), ...]."""
+
+    def __init__(self, nome: str, descricao: str, func, tipo: str = "gauge"):
+        self.nome = nome
+        self.descricao = descricao
+        self.func = func
+        self.tipo = tipo
+
+    def exportar(self) -> list:
+        valores = self.func()
+        if isinstance(valores, (int, float)):
+            valores = [({}, valores)]
+        return [f"{self.nome}{_rotulos(tuple(sorted(r.items())))} {_numero(v)}" for r, v in valores]
+
+
+class Registro:
+    def __init__(self):
+        self._metricas = {}
+        self._lock = threading.Lock()
+
+    def _registrar(self, metrica):
+        with self._lock:
+            return self._metricas.setdefault(metrica.nome, metrica)
+
+    def contador(self, nome: str, descricao: str) -> Contador:
+        return self._registrar(Contador(nome, descricao))
+
+    def medidor(self, nome: str, descricao: str) -> Medidor:
+        return self._registrar(Medidor(nome, descricao))
+
+    def histograma(self, nome: str, descricao: str, buckets: tuple = BUCKETS_SEGUNDOS) -> Histograma:
+        return self._registrar(Histograma(nome, descricao, buckets))
+
+    def coletor(self, nome: str, descricao: str, func, tipo: str = "gauge") -> Coletor:
+        """Registra (ou substitui) uma métrica calculada na exportação."""
+        coletor = Coletor(nome, descricao, func, tipo)
+        with self._lock:
+            self._metricas[nome] = coletor
+        return coletor
+
+    def exportar(self) -> str:
+        """Texto no formato de exposição do Prometheus (text/plain; version=0.0.4)."""
+        with self._lock:
+            metricas = list(self._metricas.values())
+        saida = []
+        for m in metricas:
+            try:
+                linhas = m.exportar()
+            except Exception as e:  # um coletor quebrado não derruba o /metrics
+                saida.append(f"# falha ao coletar {m.nome}: {e!r}".replace("\n", " "))
+                continue
+            saida.append(f"# HELP {m.nome} {m.descricao}")
+            saida.append(f"# TYPE {m.nome} {m.tipo}")
+            saida.extend(linhas)
+        return "\n".join(saida) + "\n"
+
+
+REGISTRO = Registro()
+DURACAO_ETAPAS = REGISTRO.histograma("receitas_etapa_segundos", "Duração de cada etapa do processamento da receita")
+ERROS = REGISTRO.contador("receitas_erros_total", "Erros por etapa (exceções e falhas tratadas)")
+CACHE = REGISTRO.contador("receitas_cache_total", "Consultas aos caches por resultado (acerto/falha)")
+EM_ANDAMENTO = REGISTRO.medidor("receitas_em_andamento", "Requisições e jobs em processamento")
+
+
+class _Etapa:
+    __slots__ = ("nome", "_inicio")
+
+    def __init__(self, nome: str):
+        self.nome = nome
+
+    def __enter__(self):
+        self._inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, tipo, valor, tb):
+        if METRICAS_ATIVO:
+            DURACAO_ETAPAS.observar(time.perf_counter() - self._inicio, etapa=self.nome)
+            if tipo is not None:
+                ERROS.incrementar(etapa=self.nome)
+        return False
+
+
+class _EmAndamento:
+    __slots__ = ("tipo",)
+
+    def __init__(self, tipo: str):
+        self.tipo = tipo
+
+    def __enter__(self):
+        EM_ANDAMENTO.incrementar(1, tipo=self.tipo)
+        return self
+
+    def __exit__(self, *exc):
+        EM_ANDAMENTO.incrementar(-1, tipo=self.tipo)
+        return False
+
+
+def etapa(nome: str) -> _Etapa:
+    """with etapa("ocr"): mede o bloco em receitas_etapa_segundos e conta exceções em receitas_erros_total."""
+    return _Etapa(nome)
+
+
+def em_andamento(tipo: str) -> _EmAndamento:
+    """with em_andamento("webhook"): soma 1 em receitas_em_andamento{tipo=...} enquanto o bloco executa."""
+    return _EmAndamento(tipo)
+
+
+def contar_cache(cache: str, acerto: bool) -> None:
+    if METRICAS_ATIVO:
+        CACHE.incrementar(cache=cache, resultado="acerto" if acerto else "falha")
+
+
+def contar_erro(etapa_: str) -> None:
+    """Para falhas tratadas (sem exceção propagada), ex.: JSON de erro devolvido ao usuário."""
+    if METRICAS_ATIVO:
+        ERROS.incrementar(etapa=etapa_)
@@ -0,0 +1,319 @@
+"""
+Motores de OCR e OCR em camadas (local primeiro, Azure quando necessário).
+
+- MotorTesseract: Tesseract local (pytesseract, idioma "por") em um pool de
+  processos, com a confiança média das palavras;
+- MotorAzure: o endpoint vision/v3.2/ocr usado até aqui (sem confiança);
+- MotorAzureRead: a Read API (analyze + polling assíncrono, app/azure_read.py),
+  com a confiança das palavras;
+- OCRCamadas: tenta os motores em ordem e só passa para o próximo quando a
+  confiança média fica abaixo de OCR_CONFIANCA_MIN, quando a extração não tem
+  medicamentos ou tem menos medicamentos que doses ("500mg") no texto lido,
+  quando a completude (campos da receita e quantidades encontrados) fica
+  abaixo de OCR_COMPLETUDE_MIN ou quando o motor falha. O último motor
+  sempre é aceito.
+
+Todos os motores devolvem ResultadoOCR com as mesmas LinhaOCR do parser.
+Para rodar sem rede, aponte AZURE_ENDPOINT para um stub local
+(ver benchmarks/bench_ocr_camadas.py).
+"""
+
+import atexit
+import io
+import multiprocessing
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import NamedTuple
+
+from .config import AZURE_ENDPOINT, AZURE_KEY
+from .config import OCR_TESSERACT_IDIOMA, OCR_TESSERACT_PROCESSOS, OCR_TESSERACT_TIMEOUT
+from .config import OCR_MOTOR, OCR_CONFIANCA_MIN, OCR_COMPLETUDE_MIN, AZURE_OCR_API, AZURE_READ_TIMEOUT
+from .http_client import http_post
+from .parser_receita import LinhaOCR, linhas_do_resultado_azure, linhas_do_resultado_read
+from . import log
+
+# app/azure_read (aiohttp) e pytesseract/PIL são importados só pelos motores que os usam
+
+# Incremente ao mudar as regras de escalada: as linhas do modo "camadas" em cache deixam de valer
+VERSAO_ESCALADA = 2
+
+
+class ResultadoOCR(NamedTuple):
+    linhas: list
+    confianca: float | None = None  # média de 0 a 1 das palavras; None se o motor não informa
+
+
+class Avaliacao(NamedTuple):
+    """O que a extração feita sobre uma leitura encontrou, para decidir a escalada."""
+    completude: float  # ver completude()
+    medicamentos: int  # medicamentos extraídos
+    doses: int         # menções "<número> <unidade>" no texto lido
+
+
+class MotorAzure:
+    nome = "azure"
+
+    def __init__(self, endpoint: str | None = AZURE_ENDPOINT, chave: str | None = AZURE_KEY):
+        self.endpoint = endpoint
+        self.chave = chave
+
+    def ler(self, image_data: bytes) -> ResultadoOCR:
+        ocr_url = f"{self.endpoint}vision/v3.2/ocr?language=pt&detectOrientation=true"
+        headers = {
+            "Ocp-Apim-Subscription-Key": self.chave,
+            "Content-Type": "application/octet-stream"
+        }
+        response = http_post("azure", ocr_url, headers=headers, data=image_data)
+        response.raise_for_status()
+        return ResultadoOCR(linhas_do_resultado_azure(response.json()))
+
+
+class MotorAzureRead:
+    """Read API pelo cliente assíncrono; chamado de threads, roda no event loop compartilhado."""
+
+    nome = "azure_read"
+
+    def __init__(self, cliente: "ClienteRead | None" = None):
+        from .azure_read import ClienteRead
+
+        self.cliente = cliente or ClienteRead()
+        atexit.register(self.fechar)
+
+    def ler(self, image_data: bytes) -> ResultadoOCR:
+        from .azure_read import executar
+
+        resultado = executar(self.cliente.analisar(image_data), timeout=AZURE_READ_TIMEOUT + 30)
+        confiancas = [w["confidence"] for pagina in resultado.get("readResults", [])
+                      for line in pagina.get("lines", []) for w in line.get("words", []) if "confidence" in w]
+        return ResultadoOCR(linhas_do_resultado_read(resultado),
+                            sum(confiancas) / len(confiancas) if confiancas else None)
+
+    def fechar(self) -> None:
+        from .azure_read import executar
+
+        try:
+            executar(self.cliente.fechar(), timeout=5)
+        except Exception:
+            pass
+
+
+def _ler_tesseract(image_data: bytes, idioma: str, timeout: float) -> ResultadoOCR:
+    """Executa no processo do pool: image_to_data → linhas (bloco = região) + confiança média."""
+    from PIL import Image
+
+    try:  # opcional: sem pytesseract (ou sem o binário tesseract) o motor local falha e o OCR escala
+        import pytesseract
+    except ImportError:  # pragma: no cover
+        raise RuntimeError("pytesseract não está instalado") from None
+    dados = pytesseract.image_to_data(Image.open(io.BytesIO(image_data)), lang=idioma,
+                                      output_type=pytesseract.Output.DICT, timeout=timeout)
+    linhas = {}
+    confiancas = []
+    for i, texto in enumerate(dados["text"]):
+        texto = texto.strip()
+        conf = float(dados["conf"][i])
+        if not texto or conf < 0:
+            continue
+        confiancas.append(conf / 100)
+        chave = (dados["block_num"][i], dados["par_num"][i], dados["line_num"][i])
+        x, y, w, h = dados["left"][i], dados["top"][i], dados["width"][i], dados["height"][i]
+        if chave not in linhas:
+            linhas[chave] = ([texto], [x, y, x + w, y + h])
+            continue
+        palavras, caixa = linhas[chave]
+        palavras.append(texto)
+        caixa[:] = [min(caixa[0], x), min(caixa[1], y), max(caixa[2], x + w), max(caixa[3], y + h)]
+    resultado = [
+        LinhaOCR(" ".join(palavras), bloco, (c[0], c[1], c[2] - c[0], c[3] - c[1]))
+        for (bloco, _, _), (palavras, c) in sorted(linhas.items())
+    ]
+    return ResultadoOCR(resultado, sum(confiancas) / len(confiancas) if confiancas else None)
+
+
+class MotorTesseract:
+    """
+    Tesseract em processos separados (o OCR local é CPU-bound e não libera o GIL).
+
+    O pool é criado na primeira leitura, num worker que já tem as threads do
+    Flask, do log, dos jobs e do despachante: os processos vêm de um forkserver
+    (um fork ali poderia herdar um lock preso por outra thread). Se um processo
+    do pool morrer (BrokenProcessPool), a leitura falha e escala, e o pool é
+    recriado na próxima.
+    """
+
+    nome = "tesseract"
+
+    def __init__(self, idioma: str = OCR_TESSERACT_IDIOMA, processos: int = OCR_TESSERACT_PROCESSOS,
+                 timeout: float = OCR_TESSERACT_TIMEOUT):
+        self.idioma = idioma
+        self.processos = max(1, processos)
+        self.timeout = timeout
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def _executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                contexto = multiprocessing.get_context("forkserver")
+                contexto.set_forkserver_preload(["app.ocr"])
+                self._pool = ProcessPoolExecutor(max_workers=self.processos, mp_context=contexto)
+            return self._pool
+
+    def _descartar(self, pool: ProcessPoolExecutor) -> None:
+        with self._lock:
+            if self._pool is pool:
+                self._pool = None
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def ler(self, image_data: bytes) -> ResultadoOCR:
+        pool = self._executor()
+        try:
+            return pool.submit(_ler_tesseract, image_data, self.idioma, self.timeout).result(timeout=self.timeout + 5)
+        except BrokenProcessPool:
+            log.aviso("tesseract_pool_recriado", processos=self.processos)
+            self._descartar(pool)
+            raise
+
+    def fechar(self) -> None:
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(cancel_futures=True)
+                self._pool = None
+
+
+def completude(dados: dict) -> float:
+    """
+    Fração dos campos da receita encontrados (nome, CPF, CRM, data, medicamentos
+    e, como sexto campo, a fração dos medicamentos com quantidade). Uma leitura
+    que perdeu as linhas de posologia perde as quantidades mesmo achando os nomes.
+    """
+    medicamentos = dados.get("medicamentos") or []
+    encontrados = [
+        dados.get("nome") not in (None, "Não identificado"),
+        bool(dados.get("cpf")),
+        bool(dados.get("crm_medico")),
+        bool(dados.get("data_receita")),
+        bool(medicamentos),
+    ]
+    quantidades = sum(m.get("quantidade") not in (None, "Não identificado") for m in medicamentos)
+    return (sum(encontrados) + (quantidades / len(medicamentos) if medicamentos else 0)) / (len(encontrados) + 1)
+
+
+class MetricasOCR:
+    """Chamadas, falhas e latência por motor; escalonamentos por motivo."""
+
+    def __init__(self, janela: int = 1000):
+        self._lock = threading.Lock()
+        self._latencias = {}  # motor -> deque das últimas `janela` latências (s)
+        self._janela = janela
+        self._contagem = Counter()
+        self.motivos = Counter()
+
+    def registrar(self, motor: str, segundos: float, falha: bool = False) -> None:
+        with self._lock:
+            self._latencias.setdefault(motor, deque(maxlen=self._janela)).append(segundos)
+            self._contagem[(motor, "chamadas")] += 1
+            if falha:
+                self._contagem[(motor, "falhas")] += 1
+
+    def escalonar(self, motivo: str) -> None:
+        with self._lock:
+            self.motivos[motivo] += 1
+
+    def leitura(self) -> None:
+        with self._lock:
+            self._contagem["leituras"] += 1
+
+    def estatisticas(self) -> dict:
+        with self._lock:
+            motores = {}
+            for motor, lat in self._latencias.items():
+                ordenadas = sorted(lat)
+                motores[motor] = {
+                    "chamadas": self._contagem[(motor, "chamadas")],
+                    "falhas": self._contagem[(motor, "falhas")],
+                    "latencia_p50_ms": round(ordenadas[len(ordenadas) // 2] * 1000, 1),
+                    "latencia_p95_ms": round(ordenadas[int(len(ordenadas) * 0.95)] * 1000, 1),
+                }
+            leituras = self._contagem["leituras"]
+            escalonadas = sum(self.motivos.values())
+            return {
+                "leituras": leituras,
+                "escalonadas": escalonadas,
+                "taxa_escalonamento": round(escalonadas / leituras, 3) if leituras else 0.0,
+                "motivos": dict(self.motivos),
+                "motores": motores,
+            }
+
+
+class OCRCamadas:
+    def __init__(self, motores: list, confianca_min: float = 0.0, completude_min: float = 0.0,
+                 metricas: MetricasOCR | None = None):
+        if not motores:
+            raise ValueError("OCRCamadas precisa de pelo menos um motor")
+        self.motores = motores
+        self.confianca_min = confianca_min
+        self.completude_min = completude_min
+        self.metricas = metricas or MetricasOCR()
+
+    def ler(self, image_data: bytes, avaliar=None) -> list:
+        """
+        Devolve as LinhaOCR do primeiro motor aceito. avaliar(linhas) -> Avaliacao
+        da extração; sem avaliar (ex.: página isolada de um PDF) só a confiança conta.
+        """
+        self.metricas.leitura()
+        for i, motor in enumerate(self.motores):
+            ultimo = i == len(self.motores) - 1
+            inicio = time.perf_counter()
+            try:
+                resultado = motor.ler(image_data)
+            except Exception as e:
+                self.metricas.registrar(motor.nome, time.perf_counter() - inicio, falha=True)
+                if ultimo:
+                    raise
+                log.aviso("ocr_escalado", motor=motor.nome, motivo="falha", proximo=self.motores[i + 1].nome, erro=str(e))
+                self.metricas.escalonar("falha")
+                continue
+            self.metricas.registrar(motor.nome, time.perf_counter() - inicio)
+            if ultimo:
+                return resultado.linhas
+            motivo = self._motivo(resultado, avaliar)
+            if motivo is None:
+                return resultado.linhas
+            log.evento("ocr_escalado", motor=motor.nome, motivo=motivo, proximo=self.motores[i + 1].nome)
+            self.metricas.escalonar(motivo)
+
+    def _motivo(self, resultado: ResultadoOCR, avaliar) -> str | None:
+        if not resultado.linhas:
+            return "vazio"
+        if resultado.confianca is not None and resultado.confianca < self.confianca_min:
+            return "confianca"
+        if avaliar is None:
+            return None
+        avaliacao = avaliar(resultado.linhas)
+        if avaliacao.medicamentos == 0:
+            return "sem_medicamentos"
+        if avaliacao.medicamentos < avaliacao.doses:
+            return "medicamentos"
+        if avaliacao.completude < self.completude_min:
+            return "completude"
+        return None
+
+
+def criar_ocr(motor: str = OCR_MOTOR, api_azure: str = AZURE_OCR_API) -> OCRCamadas:
+    """Monta o OCR configurado em OCR_MOTOR ("azure", "tesseract" ou "camadas") e AZURE_OCR_API."""
+    if api_azure not in ("ocr", "read"):
+        raise ValueError(f"AZURE_OCR_API inválido: {api_azure!r} (use ocr ou read)")
+    azure = MotorAzureRead if api_azure == "read" else MotorAzure
+    if motor == "azure":
+        motores = [azure()]
+    elif motor == "tesseract":
+        motores = [MotorTesseract()]
+    elif motor == "camadas":
+        motores = [MotorTesseract(), azure()]
+    else:
+        raise ValueError(f"OCR_MOTOR inválido: {motor!r} (use azure, tesseract ou camadas)")
+    return OCRCamadas(motores, confianca_min=OCR_CONFIANCA_MIN, completude_min=OCR_COMPLETUDE_MIN)
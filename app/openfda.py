@@ -0,0 +1,213 @@
+"""
+Consulta ao OpenFDA (fallback de nomes de medicamentos) com cache persistente.
+
+- cache SQLite por nome normalizado, com TTL, inclusive para "não encontrado"
+  (cache negativo com TTL menor);
+- falhas de rede/HTTP são registradas e NÃO entram no cache;
+- buscar_openfda_lote resolve os nomes ainda não cacheados em paralelo;
+- o cache pode ser aquecido offline a partir do dump de rótulos do OpenFDA
+  (drug-label-*.json ou .json.zip, formato {"results": [...]}).
+
+Aquecimento manual:
+    python -m app.openfda aquecer drug-label-0001-of-0012.json.zip
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from .config import OPENFDA_URL, OPENFDA_DB, OPENFDA_TTL, OPENFDA_TTL_NEGATIVO, OPENFDA_CONCORRENCIA
+from .http_client import http_get
+from . import log
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS openfda (
+    nome TEXT PRIMARY KEY,
+    resultado TEXT,
+    expira_em REAL NOT NULL
+) WITHOUT ROWID
+"""
+
+_UPSERT = """
+INSERT INTO openfda (nome, resultado, expira_em) VALUES (?, ?, ?)
+ON CONFLICT(nome) DO UPDATE SET resultado = excluded.resultado, expira_em = excluded.expira_em
+"""
+
+
+class ErroOpenFDA(Exception):
+    """Falha de rede ou HTTP ao consultar o OpenFDA (não vai para o cache)."""
+
+
+def normalizar_nome(nome: str) -> str:
+    return " ".join(nome.split()).lower()
+
+
+class CacheOpenFDA:
+    def __init__(self, caminho: str | Path = OPENFDA_DB, ttl: float = OPENFDA_TTL,
+                 ttl_negativo: float = OPENFDA_TTL_NEGATIVO):
+        self.caminho = Path(caminho)
+        self.ttl = ttl
+        self.ttl_negativo = ttl_negativo
+        self._local = threading.local()
+        self._lock = threading.Lock()  # contadores: buscar_openfda_lote roda em várias threads (jobs)
+        self.caminho.parent.mkdir(parents=True, exist_ok=True)
+        with self._conexao() as con:
+            con.execute(_SCHEMA)
+        self.hits = 0
+        self.hits_negativos = 0
+        self.misses = 0
+        self.falhas = 0
+
+    def _conexao(self) -> sqlite3.Connection:
+        con = getattr(self._local, "con", None)
+        if con is None or getattr(self._local, "pid", None) != os.getpid():
+            con = sqlite3.connect(self.caminho, timeout=30)
+            con.execute("PRAGMA journal_mode=WAL")
+            self._local.con = con
+            self._local.pid = os.getpid()
+        return con
+
+    def buscar_varios(self, nomes) -> dict:
+        """
+        Retorna {nome: resultado | None} só para os nomes com entrada válida no cache.
+        None significa "não encontrado" (cache negativo).
+        """
+        nomes = list(nomes)
+        if not nomes:
+            return {}
+        linhas = self._conexao().execute(
+            f"SELECT nome, resultado FROM openfda WHERE expira_em >= ? AND nome IN ({','.join('?' * len(nomes))})",
+            [time.time(), *nomes],
+        ).fetchall()
+        return dict(linhas)
+
+    def gravar_varios(self, resultados: dict) -> None:
+        agora = time.time()
+        linhas = [(nome, res, agora + (self.ttl if res is not None else self.ttl_negativo))
+                  for nome, res in resultados.items()]
+        with self._conexao() as con:
+            con.executemany(_UPSERT, linhas)
+
+    def contar(self, hits: int = 0, hits_negativos: int = 0, misses: int = 0, falhas: int = 0) -> None:
+        with self._lock:
+            self.hits += hits
+            self.hits_negativos += hits_negativos
+            self.misses += misses
+            self.falhas += falhas
+
+    def estatisticas(self) -> dict:
+        with self._lock:
+            contadores = {"hits": self.hits, "hits_negativos": self.hits_negativos,
+                          "misses": self.misses, "falhas": self.falhas}
+        return {
+            **contadores,
+            "entradas": self._conexao().execute("SELECT COUNT(*) FROM openfda").fetchone()[0],
+        }
+
+
+def consultar_openfda(nome: str) -> str | None:
+    """Consulta ao vivo. Retorna o nome encontrado, None se não houver resultado, ou levanta ErroOpenFDA."""
+    q = nome.replace(" ", "+")
+    url = f"{OPENFDA_URL}?search=generic_name:{q}&limit=1"
+    try:
+        resp = http_get("openfda", url)
+    except Exception as e:
+        raise ErroOpenFDA(f"falha de rede: {e}") from e
+    if resp.status_code == 404:  # o OpenFDA responde 404 quando a busca não tem resultados
+        return None
+    if resp.status_code != 200:
+        raise ErroOpenFDA(f"HTTP {resp.status_code}")
+    res = resp.json().get("results", [])
+    if res:
+        return res[0].get("openfda", {}).get("brand_name", [None])[0] or res[0].get("generic_name")
+    return None
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def obter_cache() -> CacheOpenFDA:
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = CacheOpenFDA()
+        return _cache
+
+
+def buscar_openfda_lote(nomes, max_concorrencia: int = OPENFDA_CONCORRENCIA) -> dict:
+    """
+    Resolve vários nomes de uma vez: uma consulta ao cache e, para os nomes frios,
+    chamadas concorrentes ao OpenFDA. Retorna {nome_original: resultado | None}.
+    """
+    cache = obter_cache()
+    chaves = {nome: normalizar_nome(nome) for nome in nomes if nome and nome.strip()}
+    em_cache = cache.buscar_varios(set(chaves.values()))
+    frios = sorted(set(chaves.values()) - set(em_cache))
+    negativos = sum(1 for v in em_cache.values() if v is None)
+    cache.contar(hits=len(em_cache) - negativos, hits_negativos=negativos, misses=len(frios))
+
+    novos = {}
+    if frios:
+        def resolver(chave):
+            try:
+                return chave, consultar_openfda(chave), None
+            except ErroOpenFDA as e:
+                return chave, None, e
+
+        with ThreadPoolExecutor(max_workers=max(1, min(max_concorrencia, len(frios)))) as pool:
+            for chave, resultado, erro in pool.map(resolver, frios):
+                if erro is not None:
+                    cache.contar(falhas=1)
+                    log.aviso("openfda_indisponivel", medicamento=chave, erro=str(erro))
+                    continue
+                novos[chave] = resultado
+        if novos:
+            cache.gravar_varios(novos)
+
+    resolvidos = {**em_cache, **novos}
+    return {nome: resolvidos.get(chave) for nome, chave in chaves.items()}
+
+
+def aquecer_cache_de_dump(caminho: str | Path) -> int:
+    """
+    Popula o cache a partir do dump de rótulos do OpenFDA (JSON ou ZIP com JSONs).
+    Cada generic_name vira uma entrada com o primeiro brand_name (ou o próprio generic_name).
+    """
+    caminho = Path(caminho)
+    if caminho.suffix.lower() == ".zip":
+        with zipfile.ZipFile(caminho) as z:
+            documentos = [json.loads(z.read(n)) for n in z.namelist() if n.endswith(".json")]
+    else:
+        documentos = [json.loads(caminho.read_text(encoding="utf-8"))]
+
+    resultados = {}
+    for doc in documentos:
+        for rotulo in doc.get("results", []):
+            openfda = rotulo.get("openfda", {})
+            marca = (openfda.get("brand_name") or [None])[0]
+            for generico in openfda.get("generic_name", []) or rotulo.get("generic_name", []):
+                chave = normalizar_nome(generico)
+                if chave and chave not in resultados:
+                    resultados[chave] = marca or generico
+    obter_cache().gravar_varios(resultados)
+    return len(resultados)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Cache local do OpenFDA")
+    sub = parser.add_subparsers(dest="comando", required=True)
+    aq = sub.add_parser("aquecer", help="popula o cache a partir de um dump drug-label (.json ou .zip)")
+    aq.add_argument("arquivos", nargs="+")
+    args = parser.parse_args()
+
+    for arquivo in args.arquivos:
+        print(f"✅ {aquecer_cache_de_dump(arquivo)} nomes carregados de {arquivo}")
+    print(obter_cache().estatisticas())
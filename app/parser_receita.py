@@ -0,0 +1,213 @@
+"""
+Parser da receita em uma única passada sobre as linhas do OCR.
+
+O resultado do Azure (regiões → linhas → palavras) é tokenizado uma vez em
+LinhaOCR (texto, região e caixa delimitadora). A partir daí:
+
+- paciente, CPF, CRM e data saem de uma só varredura do texto, com um regex
+  combinado (cada campo fica com a primeira ocorrência, como no re.search);
+- cada medicamento é localizado por busca literal (str.find) no texto em
+  minúsculas, sem regex;
+- a posologia de cada medicamento só é procurada nas linhas próximas: da
+  ocorrência do nome até o próximo medicamento, no máximo `janela_linhas`
+  linhas abaixo, sem mudar de região e sem atravessar um espaço vertical
+  grande (assinatura, rodapé). Assim a posologia de um remédio não "vaza"
+  para outro e o custo total é linear no tamanho do texto.
+"""
+
+import re
+from bisect import bisect_right
+from typing import NamedTuple
+
+NAO_IDENTIFICADO = "Não identificado"
+
+_FORMA = r"(comprimido|cápsula|gota)s?"
+_RE_POSOLOGIA = re.compile(rf"\s*[-–—:]*\s*(\d+)\s*{_FORMA}.*?(\d+)\s*x.*?(\d+)\s*dias", re.IGNORECASE)
+_RE_POSOLOGIA_SIMPLES = re.compile(rf"\s*[-–—:]*\s*(\d+)\s*{_FORMA}.*?(\d+)\s*dias", re.IGNORECASE)
+
+# Lookaheads: cada posição pode iniciar qualquer campo, inclusive dentro de outro
+# (ex.: CPF na mesma linha do "PACIENTE:"), exatamente como buscas separadas.
+_RE_CAMPOS = re.compile(
+    r"(?=(?i:paciente[:\s\-]*(?P<nome>[^\n]+)))"
+    r"|(?=(?P<cpf>\d{3}[\.\s_]?\d{3}[\.\s_]?\d{3}[-\s_]?\d{2}))"
+    r"|(?=(?i:CRM[-\s:]*(?P<crm>[A-Z]{2}-?\s*\d+)))"
+    r"|(?=(?P<data>\d{1,2}\s+de\s+\w+\s+de\s+\d{4}))"
+)
+_CAMPOS = ("nome", "cpf", "crm", "data")
+
+
+class LinhaOCR(NamedTuple):
+    texto: str
+    regiao: int = 0
+    caixa: tuple | None = None  # (x, y, largura, altura) em pixels
+
+
+def _caixa(bbox) -> tuple | None:
+    """Aceita "x,y,w,h" (v3.2/ocr) ou os 8 números dos vértices (Read API)."""
+    if not bbox:
+        return None
+    try:
+        valores = [float(v) for v in (bbox.split(",") if isinstance(bbox, str) else bbox)]
+    except (TypeError, ValueError):
+        return None
+    if len(valores) == 4:
+        return tuple(valores)
+    if len(valores) == 8:
+        xs, ys = valores[0::2], valores[1::2]
+        return (min(xs), min(ys), max(xs) - min(xs), max(ys) - min(ys))
+    return None
+
+
+def linhas_do_resultado_azure(result: dict) -> list:
+    """Tokeniza o JSON do Azure uma única vez em LinhaOCR, na ordem de leitura do OCR."""
+    linhas = []
+    for i, region in enumerate(result.get("regions", [])):
+        for line in region.get("lines", []):
+            texto = " ".join([word["text"] for word in line.get("words", [])])
+            linhas.append(LinhaOCR(texto, i, _caixa(line.get("boundingBox"))))
+    return linhas
+
+
+def linhas_do_resultado_read(analyze_result: dict) -> list:
+    """Mesma tokenização para o analyzeResult da Read API: cada página vira uma região."""
+    linhas = []
+    for i, pagina in enumerate(analyze_result.get("readResults", [])):
+        for line in pagina.get("lines", []):
+            palavras = line.get("words")
+            texto = " ".join(w["text"] for w in palavras) if palavras else line.get("text", "")
+            linhas.append(LinhaOCR(texto, i, _caixa(line.get("boundingBox"))))
+    return linhas
+
+
+def linhas_do_texto(texto: str) -> list:
+    """Texto puro (sem layout): cada linha vira uma LinhaOCR sem caixa."""
+    return [LinhaOCR(t) for t in texto.split("\n")]
+
+
+class ParserReceita:
+    """
+    encontrar_medicamentos(texto) -> nomes já limpos (title case);
+    corrigir_nomes(texto) -> texto com os nomes corrigidos, sem alterar as quebras de linha.
+    """
+
+    def __init__(self, encontrar_medicamentos, corrigir_nomes=None, janela_linhas: int = 4,
+                 fator_espaco: float = 1.5):
+        self.encontrar_medicamentos = encontrar_medicamentos
+        self.corrigir_nomes = corrigir_nomes
+        self.janela_linhas = janela_linhas
+        self.fator_espaco = fator_espaco
+
+    def analisar(self, linhas: list) -> dict:
+        texto = "\n".join(l.texto for l in linhas)
+        if self.corrigir_nomes is not None:
+            texto = self.corrigir_nomes(texto)
+
+        campos = {}
+        for m in _RE_CAMPOS.finditer(texto):
+            campo = m.lastgroup
+            if campo not in campos:
+                campos[campo] = m.group(campo)
+                if len(campos) == len(_CAMPOS):
+                    break
+
+        medicamentos = self.quantidades(linhas, texto, self.encontrar_medicamentos(texto))
+
+        nome = campos.get("nome")
+        cpf = campos.get("cpf")
+        crm = campos.get("crm")
+        return {
+            "nome": nome.strip() if nome else NAO_IDENTIFICADO,
+            "cpf": cpf.replace("_", ".") if cpf else None,
+            "medicamentos": medicamentos,
+            "data_receita": campos.get("data"),
+            "crm_medico": crm.replace("-", "").strip() if crm else None,
+        }
+
+    def quantidades(self, linhas: list, texto: str, nomes: list) -> list:
+        """
+        [{"nome", "quantidade"}] de cada nome, com a posologia procurada só na
+        janela que começa na primeira ocorrência dele no texto (já corrigido,
+        com as mesmas quebras de `linhas`).
+        """
+        medicamentos = []
+        if not nomes:
+            return medicamentos
+        inicios = []
+        pos = 0
+        for t in texto.split("\n"):
+            inicios.append(pos)
+            pos += len(t) + 1
+        ocorrencias = self._ocorrencias(nomes, texto)
+        limites = self._limites_de_bloco(linhas, inicios, len(texto))
+        inicios_ordenados = sorted(p for p, _ in ocorrencias.values())
+        for nome in nomes:
+            if nome not in ocorrencias:
+                medicamentos.append({"nome": nome.title(), "quantidade": NAO_IDENTIFICADO})
+                continue
+            inicio, fim = ocorrencias[nome]
+            linha = bisect_right(inicios, inicio) - 1
+            limite = limites[linha]
+            # O próximo medicamento (mesmo que na mesma linha) encerra a janela
+            k = bisect_right(inicios_ordenados, inicio)
+            if k < len(inicios_ordenados):
+                limite = min(limite, inicios_ordenados[k])
+            medicamentos.append({
+                "nome": nome.title(),
+                "quantidade": _quantidade(texto, fim, max(fim, limite)),
+            })
+        return medicamentos
+
+    @staticmethod
+    def _ocorrencias(nomes: list, texto: str) -> dict:
+        """{nome: (inicio, fim)} da primeira ocorrência de cada nome (sem diferenciar maiúsculas)."""
+        minusculo = texto.lower()
+        ocorrencias = {}
+        for nome in nomes:
+            if len(minusculo) == len(texto):  # busca literal em C, sem backtracking
+                inicio = minusculo.find(nome.lower())
+                fim = inicio + len(nome)
+            else:  # lower() mudou o comprimento (Unicode raro): as posições não batem
+                m = re.search(re.escape(nome), texto, re.IGNORECASE)
+                inicio, fim = (m.start(), m.end()) if m else (-1, -1)
+            if inicio >= 0:
+                ocorrencias[nome] = (inicio, fim)
+        return ocorrencias
+
+    def _limites_de_bloco(self, linhas: list, inicios: list, tamanho: int) -> list:
+        """
+        Para cada linha, a posição no texto onde termina a janela de posologia
+        que começa nela. Calculado de trás para frente em O(linhas).
+        """
+        n = len(inicios)
+        alturas = sorted(l.caixa[3] for l in linhas if l.caixa and l.caixa[3] > 0)
+        altura = alturas[len(alturas) // 2] if alturas else 0
+
+        # quebra[i]: a linha i+1 não continua o bloco da linha i
+        quebra = [False] * n
+        for i in range(n - 1):
+            a, b = linhas[i], linhas[i + 1]
+            if a.regiao != b.regiao:
+                quebra[i] = True
+            elif altura and a.caixa and b.caixa:
+                quebra[i] = b.caixa[1] - (a.caixa[1] + a.caixa[3]) > self.fator_espaco * altura
+
+        fim_linha = [inicios[i + 1] - 1 if i + 1 < n else tamanho for i in range(n)]
+        limites = [0] * n
+        ultima = n - 1  # última linha do bloco contíguo que contém i
+        for i in range(n - 1, -1, -1):
+            if i < n - 1 and quebra[i]:
+                ultima = i
+            limites[i] = fim_linha[min(ultima, i + self.janela_linhas)]
+        return limites
+
+
+def _quantidade(texto: str, inicio: int, fim: int) -> str:
+    match = _RE_POSOLOGIA.search(texto, inicio, fim)
+    if match:
+        quantidade, forma, vezes_dia, dias = match.groups()
+        return f"{int(quantidade) * int(vezes_dia) * int(dias)} {forma}s"
+    match = _RE_POSOLOGIA_SIMPLES.search(texto, inicio, fim)
+    if match:
+        quantidade, forma, dias = match.groups()
+        return f"{int(quantidade) * int(dias)} {forma}s"
+    return NAO_IDENTIFICADO
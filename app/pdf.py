@@ -0,0 +1,199 @@
+"""
+PDFs de receita com várias páginas.
+
+- Todas as páginas são processadas (até PDF_MAX_PAGINAS), não só a primeira.
+- Páginas com camada de texto (PDF gerado por sistema de prontuário) usam o
+  texto do próprio PDF (pdftotext) e não são rasterizadas nem vão para o OCR.
+- As demais são renderizadas em paralelo, uma página por tarefa, em até
+  PDF_THREADS threads (cada pdftoppm é um processo separado). Cada página
+  segue para o OCR assim que fica pronta, sem esperar as outras.
+- Limites de memória: tamanho máximo do arquivo (PDF_MAX_MB), número de
+  páginas, no máximo PDF_THREADS páginas rasterizadas ao mesmo tempo e DPI
+  reduzido quando a página passaria de PDF_MAX_MEGAPIXELS (calculado página a
+  página: uma folha A3 ou uma foto escaneada no meio de páginas A4 não
+  estoura a memória nem rebaixa as demais).
+
+As linhas de todas as páginas são unidas, na ordem das páginas, em uma única
+lista de LinhaOCR; cada página ganha regiões próprias para que o parser não
+associe a posologia de uma página ao medicamento de outra.
+"""
+
+import re
+import subprocess
+import tempfile
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+from .config import PDF_MAX_PAGINAS, PDF_MAX_MB, PDF_DPI, PDF_MAX_MEGAPIXELS, PDF_THREADS
+from .config import PDF_TEXTO_MIN_CARACTERES
+from .parser_receita import LinhaOCR
+from .metricas import etapa
+from . import log
+
+_estatisticas = Counter()
+_lock = threading.Lock()
+
+
+class ErroPDF(Exception):
+    """PDF inválido, grande demais ou com falha em alguma página."""
+
+
+def _contar(**valores) -> None:
+    with _lock:
+        _estatisticas.update(valores)
+
+
+def estatisticas() -> dict:
+    with _lock:
+        return dict(_estatisticas)
+
+
+def dpi_para_pagina(largura_pt: float, altura_pt: float, dpi: int = PDF_DPI,
+                    max_megapixels: float = PDF_MAX_MEGAPIXELS) -> int:
+    """DPI de renderização: PDF_DPI, reduzido se a página passar de max_megapixels."""
+    pixels = (largura_pt / 72 * dpi) * (altura_pt / 72 * dpi)
+    if pixels <= max_megapixels * 1e6:
+        return dpi
+    return max(72, int(dpi * (max_megapixels * 1e6 / pixels) ** 0.5))
+
+
+def _tamanho_pagina(tamanho: str | None) -> tuple:
+    """"595.276 x 841.89 pts (A4)" → (595.276, 841.89); A4 se o pdfinfo não informar."""
+    m = re.match(r"\s*([\d.]+)\s*x\s*([\d.]+)", str(tamanho or ""))
+    return (float(m.group(1)), float(m.group(2))) if m else (595.0, 842.0)
+
+
+def dpis_por_pagina(info: dict, paginas: int) -> dict:
+    """
+    {página: DPI} a partir do pdfinfo com -f/-l, que informa "Page    N size"
+    para cada página; sem essa linha, vale o "Page size" geral.
+    """
+    tamanhos = {}
+    for chave, valor in info.items():
+        m = re.fullmatch(r"Page\s+(\d+)\s+size", chave)
+        if m:
+            tamanhos[int(m.group(1))] = valor
+    return {n: dpi_para_pagina(*_tamanho_pagina(tamanhos.get(n, info.get("Page size"))))
+            for n in range(1, paginas + 1)}
+
+
+def camada_de_texto(caminho: str, paginas: int) -> list:
+    """
+    Texto de cada página (pdftotext, do poppler). Páginas sem texto, ou
+    com texto curto demais para ser a receita, voltam como "".
+    """
+    try:
+        saida = subprocess.run(
+            ["pdftotext", "-f", "1", "-l", str(paginas), "-enc", "UTF-8", caminho, "-"],
+            capture_output=True, timeout=30, check=True,
+        ).stdout.decode("utf-8", errors="replace")
+    except (OSError, subprocess.SubprocessError) as e:
+        log.aviso("pdf_sem_camada_de_texto", erro=str(e))
+        return [""] * paginas
+    textos = saida.split("\f")[:paginas]
+    textos += [""] * (paginas - len(textos))
+    return [t if len("".join(t.split())) >= PDF_TEXTO_MIN_CARACTERES else "" for t in textos]
+
+
+@contextmanager
+def _abrir(conteudo: bytes, max_paginas: int):
+    """
+    Grava o PDF em um diretório temporário e produz
+    (caminho, páginas, {página: dpi}, {página: linhas}, [páginas p/ OCR]).
+    """
+    if len(conteudo) > PDF_MAX_MB * 1024 * 1024:
+        raise ErroPDF(f"PDF com {len(conteudo) / 1024 / 1024:.1f} MB (limite: {PDF_MAX_MB:g} MB)")
+
+    with tempfile.TemporaryDirectory(prefix="pdf_") as pasta:
+        caminho = str(Path(pasta) / "receita.pdf")
+        Path(caminho).write_bytes(conteudo)
+        from pdf2image import pdfinfo_from_path  # import sob demanda: a subida do worker não paga o pdf2image
+
+        try:
+            # -f/-l: tamanho de cada página (o pdfinfo limita -l ao total de páginas)
+            info = pdfinfo_from_path(caminho, first_page=1, last_page=max_paginas)
+            total = int(info["Pages"])
+        except Exception as e:
+            raise ErroPDF(f"Não foi possível ler o PDF: {e}") from e
+        if total < 1:
+            raise ErroPDF("O arquivo PDF está vazio ou não contém páginas válidas.")
+        if total > max_paginas:
+            log.aviso("pdf_paginas_ignoradas", paginas=total, processadas=max_paginas)
+        paginas = min(total, max_paginas)
+        dpis = dpis_por_pagina(info, paginas)
+
+        com_texto = {}
+        with etapa("pdf_camada_texto"):
+            textos = camada_de_texto(caminho, paginas)
+        para_ocr = []
+        for numero, texto in enumerate(textos, 1):
+            if texto:
+                com_texto[numero] = [LinhaOCR(l.strip()) for l in texto.splitlines() if l.strip()]
+            else:
+                para_ocr.append(numero)
+        _contar(pdfs=1, paginas_texto=len(com_texto), paginas_ocr=len(para_ocr))
+        yield caminho, paginas, dpis, com_texto, para_ocr
+
+
+def _renderizar(caminho: str, dpi: int, numero: int):
+    from pdf2image import convert_from_path
+
+    with etapa("conversao_pdf"):
+        imagens = convert_from_path(caminho, dpi=dpi, first_page=numero, last_page=numero)
+    if not imagens:
+        raise ErroPDF(f"Página {numero} não pôde ser renderizada.")
+    return imagens[0]
+
+
+def unir_paginas(resultados: dict) -> list:
+    """{página: [LinhaOCR]} → uma lista na ordem das páginas, com regiões próprias por página."""
+    linhas = []
+    deslocamento = 0
+    for numero in sorted(resultados):
+        pagina = resultados[numero]
+        linhas.extend(l._replace(regiao=deslocamento + l.regiao) for l in pagina)
+        deslocamento += max((l.regiao for l in pagina), default=0) + 1
+    return linhas
+
+
+def processar_pdf(conteudo: bytes, ocr_pagina, max_paginas: int = PDF_MAX_PAGINAS,
+                  threads: int = PDF_THREADS) -> list:
+    """
+    Processa todas as páginas e devolve as LinhaOCR unidas na ordem das páginas.
+    ocr_pagina(imagem_pil, numero_pagina) -> list[LinhaOCR] faz pré-processamento + OCR.
+    """
+    with _abrir(conteudo, max_paginas) as (caminho, paginas, dpis, resultados, para_ocr):
+        if para_ocr:
+            # Cada tarefa mantém uma página rasterizada na memória: no máximo `threads` ao mesmo tempo
+            with ThreadPoolExecutor(max_workers=max(1, min(threads, len(para_ocr))),
+                                    thread_name_prefix="pdf-pagina") as pool:
+                futuros = {pool.submit(lambda n: ocr_pagina(_renderizar(caminho, dpis[n], n), n), n): n
+                           for n in para_ocr}
+                for futuro in as_completed(futuros):
+                    numero = futuros[futuro]
+                    try:
+                        resultados[numero] = futuro.result()
+                    except Exception as e:
+                        for f in futuros:
+                            f.cancel()
+                        raise ErroPDF(f"Falha na página {numero}: {e}") from e
+                    log.depuracao("pdf_pagina_lida", pagina=numero, paginas=paginas)
+    return unir_paginas(resultados)
+
+
+def paginas_para_ocr(conteudo: bytes, preparar, max_paginas: int = PDF_MAX_PAGINAS) -> dict:
+    """
+    Só a parte de CPU, página por página e sem threads (para rodar dentro de um
+    processo de um pool, ex.: app/lote.py): {página: [LinhaOCR]} nas páginas com
+    camada de texto e {página: preparar(imagem_pil)} nas que ainda vão para o OCR.
+    """
+    with _abrir(conteudo, max_paginas) as (caminho, _, dpis, resultados, para_ocr):
+        for numero in para_ocr:
+            try:
+                resultados[numero] = preparar(_renderizar(caminho, dpis[numero], numero))
+            except Exception as e:
+                raise ErroPDF(f"Falha na página {numero}: {e}") from e
+    return resultados
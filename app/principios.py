@@ -0,0 +1,421 @@
+"""
+Índice de princípios ativos para busca de medicamentos no texto do OCR.
+
+Substitui o laço "um regex por princípio" de encontrar_todos_os_medicamentos
+por um índice montado uma única vez quando o CSV é carregado:
+
+- uma trie (dict aninhado) com todos os princípios em minúsculas;
+- um único regex combinado, gerado a partir da trie, que localiza em uma
+  só varredura as posições onde algum princípio é seguido de dose + unidade.
+
+Para cada posição candidata a trie enumera todos os princípios que casam ali,
+reproduzindo exatamente o resultado do re.findall por princípio.
+
+Montar a trie, o regex e o IndiceFuzzy custa ~0,2 s por processo. Para que
+cada worker do gunicorn não pague isso ao subir, carregar_indices() usa um
+snapshot binário (marshal, com versão do formato, do Python e hash do CSV) com
+tudo já montado: ~30 ms para carregar. Cada processo monta os próprios objetos
+a partir dele (marshal.loads não compartilha memória entre os workers); o ganho
+é só não refazer a trie, o regex e as deleções a cada subida. O snapshot é refeito
+automaticamente quando o CSV ou o formato mudam, ou antes do deploy com
+`python -m app.principios`. O regex combinado só é compilado no primeiro uso.
+"""
+
+import csv
+import difflib
+import hashlib
+import io
+import marshal
+import mmap
+import os
+import re
+import sys
+import tempfile
+import threading
+import unicodedata
+from pathlib import Path
+
+try:  # rapidfuzz vem com o thefuzz (requirements.txt); sem ele usamos a versão em Python puro
+    from rapidfuzz.distance import OSA as _OSA
+except ImportError:  # pragma: no cover
+    _OSA = None
+
+UNIDADES = "(?:g/ml|g|mg|mcg|ml|ui|%)"
+PADRAO_NUMERO = r"\d+(?:[.,]\d+)?"
+PADRAO_DOSE = rf"\s+{PADRAO_NUMERO}\s?{UNIDADES}\b"
+
+_FIM = ""  # chave que marca o fim de um princípio dentro da trie
+
+# Incremente ao mudar o conteúdo do snapshot (trie, regex, IndiceFuzzy)
+FORMATO_SNAPSHOT = 1
+_CABECALHO = b"PRINCIPIOS-SNAPSHOT %d py%d.%d marshal%d\n" % (
+    FORMATO_SNAPSHOT, sys.version_info[0], sys.version_info[1], marshal.version)
+
+
+def _minusculo(c: str) -> str:
+    """Minúscula caractere a caractere sem alterar o comprimento do texto."""
+    m = c.lower()
+    return m if len(m) == 1 else c
+
+
+def _trie_para_regex(no: dict) -> str:
+    """Converte a trie em um regex equivalente à alternância de todos os termos."""
+    fim = _FIM in no
+    ramos = [re.escape(c) + _trie_para_regex(filho) for c, filho in sorted(no.items()) if c != _FIM]
+    if not ramos:
+        return ""
+    if len(ramos) == 1 and not fim:
+        return ramos[0]
+    corpo = "(?:" + "|".join(ramos) + ")"
+    return corpo + "?" if fim else corpo
+
+
+class IndicePrincipios:
+    """Índice compilado dos princípios ativos (trie + regex combinado)."""
+
+    def __init__(self, principios, trie: dict | None = None, regex: str | None = None):
+        """trie e regex (corpo gerado por _trie_para_regex) vêm prontos do snapshot."""
+        self.principios = frozenset(principios)
+        if trie is None:
+            trie = {}
+            for p in self.principios:
+                if not p:
+                    continue
+                no = trie
+                for c in p:
+                    no = no.setdefault(c, {})
+                no[_FIM] = p
+        self.trie = trie
+        self.regex = _trie_para_regex(trie) if regex is None else regex
+        self._re_dose = re.compile(PADRAO_DOSE, re.IGNORECASE)
+        self._re_candidatos = None
+        self._lock = threading.Lock()
+
+    def compilar(self):
+        """Compila o regex combinado (~80 ms); chamado no primeiro encontrar() ou no aquecimento."""
+        if self._re_candidatos is None and self.regex:
+            with self._lock:
+                if self._re_candidatos is None:
+                    self._re_candidatos = re.compile(rf"(?=(?:{self.regex}){PADRAO_DOSE})", re.IGNORECASE)
+        return self._re_candidatos
+
+    def __len__(self) -> int:
+        return len(self.principios)
+
+    def _principios_em(self, texto: str, inicio: int):
+        """Percorre a trie a partir de `inicio` e devolve (principio, fim) de cada termo completo."""
+        no = self.trie
+        i = inicio
+        while i < len(texto):
+            no = no.get(_minusculo(texto[i]))
+            if no is None:
+                return
+            i += 1
+            if _FIM in no:
+                yield no[_FIM], i
+
+    def encontrar(self, texto: str) -> list:
+        """
+        Retorna os trechos "<princípio> <dose><unidade>" encontrados no texto,
+        com o mesmo conteúdo que re.findall(rf"({p}\\s+dose)\\b") para cada princípio.
+        """
+        candidatos = self._re_candidatos or self.compilar()
+        if candidatos is None:
+            return []
+        encontrados = []
+        ultimo_fim = {}  # findall não sobrepõe ocorrências do mesmo princípio
+        for m in candidatos.finditer(texto):
+            inicio = m.start()
+            for principio, fim_nome in self._principios_em(texto, inicio):
+                if inicio < ultimo_fim.get(principio, 0):
+                    continue
+                dose = self._re_dose.match(texto, fim_nome)
+                if dose:
+                    encontrados.append(texto[inicio:dose.end()])
+                    ultimo_fim[principio] = dose.end()
+        return encontrados
+
+
+# ============================================================
+# Busca aproximada (nomes truncados/trocados pelo OCR)
+# ============================================================
+
+# Palavras comuns de receita que aparecem antes de doses e nunca devem ser "corrigidas"
+PALAVRAS_IGNORADAS = frozenset({
+    "aplicar", "tomar", "usar", "dias", "iniciar", "termino", "apos", "mar", "das",
+    "comprimido", "comprimidos", "capsula", "capsulas", "gotas", "ampola", "frasco",
+    "dose", "doses", "cada", "horas", "manha", "noite", "tarde", "via", "oral", "uso",
+})
+
+
+def sem_acentos(texto: str) -> str:
+    return "".join(c for c in unicodedata.normalize("NFKD", texto) if not unicodedata.combining(c))
+
+
+def distancia_edicao(a: str, b: str, limite: int) -> int:
+    """
+    Distância de Damerau-Levenshtein (OSA) entre a e b, interrompida assim que
+    passar de `limite` (retorna limite + 1 nesse caso).
+    """
+    if abs(len(a) - len(b)) > limite:
+        return limite + 1
+    if _OSA is not None:
+        return _OSA.distance(a, b, score_cutoff=limite)
+    anterior2 = None
+    anterior = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        atual = [i] + [0] * len(b)
+        menor = atual[0]
+        for j in range(1, len(b) + 1):
+            custo = 0 if a[i - 1] == b[j - 1] else 1
+            v = min(anterior[j] + 1, atual[j - 1] + 1, anterior[j - 1] + custo)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                v = min(v, anterior2[j - 2] + 1)
+            atual[j] = v
+            menor = min(menor, v)
+        if menor > limite:
+            return limite + 1
+        anterior2, anterior = anterior, atual
+    return anterior[-1]
+
+
+def limite_por_tamanho(palavra: str, max_distancia: int) -> int:
+    """Palavras curtas toleram menos erros (evita trocar "dias" por "das", etc.)."""
+    if len(palavra) <= 4:
+        return 0
+    if len(palavra) <= 8:
+        return min(1, max_distancia)
+    return max_distancia
+
+
+class IndiceFuzzy:
+    """
+    Corretor aproximado sobre o vocabulário (palavras) dos princípios ativos,
+    no estilo SymSpell: cada palavra é indexada por todas as variações do seu
+    prefixo com até `max_distancia` deleções. Uma consulta gera as deleções da
+    palavra lida, consulta o dicionário e só calcula a distância real para os
+    poucos candidatos encontrados. Os candidatos de cada deleção ficam em uma
+    string separada por espaços (carrega bem mais rápido do snapshot que listas).
+    """
+
+    def __init__(self, principios, max_distancia: int = 2, tamanho_prefixo: int = 7,
+                 frequencia: dict | None = None, deletes: dict | None = None):
+        self.max_distancia = max_distancia
+        self.tamanho_prefixo = tamanho_prefixo
+        # Começos e finais (em palavras) de cada princípio, para corrigir_texto só aceitar
+        # correções que formem um pedaço de nome ("atorvastatina", "cloridrato de sertralina")
+        self.trechos = frozenset(t for p in principios for t in _trechos_de_nome(p))
+        if frequencia is None:
+            frequencia = {}
+            for p in principios:
+                for palavra in _RE_PALAVRA.findall(sem_acentos(p.lower())):
+                    frequencia[palavra] = frequencia.get(palavra, 0) + 1
+        self.frequencia = frequencia
+        if deletes is None:
+            listas = {}
+            for palavra in frequencia:
+                if len(palavra) <= 4:
+                    continue
+                for d in self._deletes(palavra[:tamanho_prefixo]):
+                    listas.setdefault(d, []).append(palavra)
+            deletes = {d: " ".join(palavras) for d, palavras in listas.items()}
+        self.deletes = deletes
+
+    def _deletes(self, palavra: str) -> set:
+        resultado = {palavra}
+        fronteira = {palavra}
+        for _ in range(self.max_distancia):
+            proxima = set()
+            for w in fronteira:
+                for i in range(len(w)):
+                    proxima.add(w[:i] + w[i + 1:])
+            resultado |= proxima
+            fronteira = proxima
+        return resultado
+
+    def corrigir_palavra(self, palavra: str) -> str | None:
+        """
+        Palavra canônica (do CSV) mais próxima dentro do limite de edição, ou None.
+        Palavras já conhecidas, curtas ou ignoradas retornam None (nada a corrigir).
+        """
+        chave = sem_acentos(palavra.lower())
+        if chave in self.frequencia or chave in PALAVRAS_IGNORADAS:
+            return None
+        limite = limite_por_tamanho(chave, self.max_distancia)
+        if limite == 0:
+            return None
+        candidatos = set()
+        for d in self._deletes(chave[:self.tamanho_prefixo]):
+            candidatos.update(self.deletes.get(d, "").split())
+        melhor = None
+        for candidato in candidatos:
+            dist = distancia_edicao(chave, candidato, limite)
+            if dist > limite:
+                continue
+            ordem = (dist, -self.frequencia[candidato], candidato)
+            if melhor is None or ordem < melhor:
+                melhor = ordem
+        return melhor[2] if melhor else None
+
+    def corrigir_texto(self, texto: str) -> str:
+        """
+        Corrige, no texto, as palavras que antecedem uma dose (até 3 palavras antes
+        de "<número> <unidade>"), onde ficam os nomes dos medicamentos. O nome é a
+        sequência final de palavras conhecidas ou corrigíveis; as correções só entram
+        se o nome corrigido for o começo, o final ou o todo de um princípio do CSV.
+        Assim "Sertrallna" vira "Sertralina", mas uma palavra válida fora do
+        vocabulário ("Amoxicilina Tri-hidratada") não é trocada pela mais parecida.
+        As letras não trocadas mantêm a grafia original (acentos, caixa).
+        """
+        if self.max_distancia <= 0:
+            return texto
+
+        def corrigir_trecho(m):
+            trecho = m.group(0)
+            palavras = list(_RE_PALAVRA.finditer(trecho))
+            corretas = [self.corrigir_palavra(p.group(0)) for p in palavras]
+            if not any(corretas):
+                return trecho
+            inicio = len(palavras)
+            while inicio > 0 and (corretas[inicio - 1] or self._conhecida(palavras[inicio - 1].group(0))):
+                inicio -= 1
+            nome = tuple(c or sem_acentos(p.group(0).lower()) for p, c in zip(palavras[inicio:], corretas[inicio:]))
+            if not nome or nome not in self.trechos:
+                return trecho
+            saida = [trecho[:palavras[inicio].start()]]
+            fim = palavras[inicio].start()
+            for palavra, correta in zip(palavras[inicio:], corretas[inicio:]):
+                saida.append(trecho[fim:palavra.start()])
+                saida.append(_com_grafia_original(palavra.group(0), correta) if correta else palavra.group(0))
+                fim = palavra.end()
+            saida.append(trecho[fim:])
+            return "".join(saida)
+
+        return _RE_NOME_ANTES_DA_DOSE.sub(corrigir_trecho, texto)
+
+    def _conhecida(self, palavra: str) -> bool:
+        chave = sem_acentos(palavra.lower())
+        return chave in self.frequencia and chave not in PALAVRAS_IGNORADAS
+
+
+def _trechos_de_nome(principio: str):
+    """Começos e finais, em palavras, de cada componente ("a+b") do princípio: ("cloridrato", "de"), ("metformina",)..."""
+    for componente in re.split(r"[+,()]", principio):
+        palavras = tuple(_RE_PALAVRA.findall(sem_acentos(componente.lower())))
+        for i in range(1, len(palavras) + 1):
+            yield palavras[:i]
+            yield palavras[-i:]
+
+
+def _com_grafia_original(original: str, correta: str) -> str:
+    """
+    Aplica a correção (minúscula, sem acentos) mantendo as letras do original que
+    não mudaram: "Sódlca" → "Sódica", "SERTRALLNA" → "SERTRALINA".
+    """
+    base = sem_acentos(original.lower())
+    if len(base) != len(original):  # ligaduras etc.: sem alinhamento letra a letra
+        letras = list(correta)
+    else:
+        letras = []
+        for op, i1, i2, j1, j2 in difflib.SequenceMatcher(None, base, correta, autojunk=False).get_opcodes():
+            letras.extend(original[i1:i2].lower() if op == "equal" else correta[j1:j2])
+    if original.isupper():
+        return "".join(letras).upper()
+    if original[0].isupper():
+        return "".join(letras).capitalize()
+    return "".join(letras)
+
+
+_RE_PALAVRA = re.compile(r"[^\W\d_]+")
+_RE_NOME_ANTES_DA_DOSE = re.compile(
+    rf"[^\W\d_]+(?:[ \t\-]+[^\W\d_]+){{0,2}}(?=[ \t]+{PADRAO_NUMERO}[ \t]?{UNIDADES}\b)", re.IGNORECASE
+)
+
+
+# ============================================================
+# Snapshot binário dos índices (carregamento rápido por worker)
+# ============================================================
+
+def _serializar(indice: IndicePrincipios, fuzzy: "IndiceFuzzy", origem: str) -> bytes:
+    dados = {
+        "origem": origem,
+        "max_distancia": fuzzy.max_distancia,
+        "tamanho_prefixo": fuzzy.tamanho_prefixo,
+        "principios": sorted(indice.principios),
+        "trie": indice.trie,
+        "regex": indice.regex,
+        "frequencia": fuzzy.frequencia,
+        "deletes": (list(fuzzy.deletes), list(fuzzy.deletes.values())),
+    }
+    return _CABECALHO + marshal.dumps(dados)
+
+
+def ler_snapshot(caminho: str | Path, origem: str, max_distancia: int, tamanho_prefixo: int = 7):
+    """(IndicePrincipios, IndiceFuzzy) do snapshot, ou None se faltar, estiver corrompido ou desatualizado."""
+    try:
+        with open(caminho, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+            if m[:len(_CABECALHO)] != _CABECALHO:
+                return None
+            dados = marshal.loads(memoryview(m)[len(_CABECALHO):])
+    except (OSError, ValueError, EOFError, TypeError):
+        return None
+    if (dados.get("origem"), dados.get("max_distancia"), dados.get("tamanho_prefixo")) != \
+            (origem, max_distancia, tamanho_prefixo):
+        return None
+    indice = IndicePrincipios(dados["principios"], trie=dados["trie"], regex=dados["regex"])
+    fuzzy = IndiceFuzzy(indice.principios, max_distancia, tamanho_prefixo, frequencia=dados["frequencia"],
+                        deletes=dict(zip(*dados["deletes"])))
+    return indice, fuzzy
+
+
+def gravar_snapshot(caminho: str | Path, indice: IndicePrincipios, fuzzy: "IndiceFuzzy", origem: str) -> None:
+    """Escrita atômica: outro worker nunca lê um snapshot pela metade."""
+    caminho = Path(caminho)
+    caminho.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=caminho.parent, suffix=".tmp")
+    with os.fdopen(fd, "wb") as f:
+        f.write(_serializar(indice, fuzzy, origem))
+    os.replace(tmp, caminho)
+
+
+def ler_csv(caminho: str | Path) -> tuple:
+    """(princípios em minúsculas, hash do conteúdo do arquivo)."""
+    conteudo = Path(caminho).read_bytes()
+    linhas = csv.reader(io.StringIO(conteudo.decode("utf-8"), newline=""))
+    return {row[0].strip().lower() for row in linhas if row and row[0]}, hashlib.sha256(conteudo).hexdigest()
+
+
+def carregar_indices(principios, origem: str, snapshot: str | Path | None, max_distancia: int) -> tuple:
+    """
+    (IndicePrincipios, IndiceFuzzy) dos princípios, via snapshot quando ele bate com `origem`
+    (hash do CSV). Sem snapshot válido, monta em memória e tenta gravar o snapshot para os
+    próximos processos.
+    """
+    if snapshot:
+        indices = ler_snapshot(snapshot, origem, max_distancia)
+        if indices is not None:
+            return indices
+    indice = IndicePrincipios(principios)
+    fuzzy = IndiceFuzzy(indice.principios, max_distancia=max_distancia)
+    if snapshot:
+        try:
+            gravar_snapshot(snapshot, indice, fuzzy, origem)
+        except OSError:
+            pass  # diretório só de leitura: segue com os índices montados em memória
+    return indice, fuzzy
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from .config import FUZZY_MAX_DISTANCIA, PRINCIPIOS_CSV, PRINCIPIOS_SNAPSHOT
+
+    parser = argparse.ArgumentParser(description="Gera o snapshot binário dos índices de princípios ativos")
+    parser.add_argument("--csv", default=PRINCIPIOS_CSV)
+    parser.add_argument("--saida", default=PRINCIPIOS_SNAPSHOT)
+    args = parser.parse_args()
+
+    principios, origem = ler_csv(args.csv)
+    indice = IndicePrincipios(principios)
+    gravar_snapshot(args.saida, indice, IndiceFuzzy(indice.principios, max_distancia=FUZZY_MAX_DISTANCIA), origem)
+    print(f"✅ {len(indice)} princípios ativos → {args.saida} ({Path(args.saida).stat().st_size // 1024} KB)")
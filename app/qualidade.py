@@ -0,0 +1,116 @@
+"""
+Triagem rápida da qualidade da foto, antes do pré-processamento e do OCR.
+
+Mede uma cópia reduzida da imagem (lado maior = QUALIDADE_AMOSTRA_LADO) e
+recusa fotos que o OCR não vai conseguir ler, para pedir outra foto em dezenas
+de milissegundos em vez de gastar o filtro de ruído, a chamada ao Azure e o
+parsing:
+- resolucao: menor lado da foto original abaixo de QUALIDADE_LADO_MIN px;
+- escura: brilho médio abaixo de QUALIDADE_BRILHO_MIN (0-255);
+- contraste: diferença entre os percentis 99,5 e 0,5 do brilho abaixo de
+  QUALIDADE_CONTRASTE_MIN (foto lavada, reflexo, papel fora de foco de luz);
+- desfocada: variância do Laplaciano (com o contraste normalizado) abaixo de
+  QUALIDADE_NITIDEZ_MIN;
+- sem_texto: fração da imagem com traços de tinta (limiar adaptativo) abaixo
+  de QUALIDADE_TEXTO_MIN.
+
+Os limites vêm da config (calibrados em benchmarks/bench_qualidade.py, que
+mede o tempo da triagem, a taxa de recusa indevida e o que deixou de ser gasto).
+"""
+
+from typing import NamedTuple
+
+from .config import QUALIDADE_AMOSTRA_LADO, QUALIDADE_LADO_MIN, QUALIDADE_BRILHO_MIN, QUALIDADE_CONTRASTE_MIN
+from .config import QUALIDADE_NITIDEZ_MIN, QUALIDADE_TEXTO_MIN, METRICAS_ATIVO
+from .metricas import REGISTRO
+
+RECUSAS = REGISTRO.contador("receitas_qualidade_recusas_total", "Fotos recusadas na triagem de qualidade, por motivo")
+
+# Motivo → trecho da mensagem pedindo outra foto
+MENSAGENS = {
+    "resolucao": "a imagem está muito pequena",
+    "escura": "a foto está escura",
+    "contraste": "a foto está lavada ou com reflexo",
+    "desfocada": "a foto está desfocada",
+    "sem_texto": "não encontrei texto na imagem",
+}
+
+
+class Qualidade(NamedTuple):
+    motivos: tuple   # vazio = foto aceita
+    medidas: dict    # lado_min, brilho, contraste, nitidez, texto
+
+    @property
+    def aceita(self) -> bool:
+        return not self.motivos
+
+
+def _amostra_cinza(img):
+    """Cópia em tons de cinza com o lado maior em QUALIDADE_AMOSTRA_LADO."""
+    import cv2
+
+    h, w = img.shape[:2]
+    fator = QUALIDADE_AMOSTRA_LADO / max(h, w)
+    if fator < 1:
+        # INTER_AREA direto na foto inteira custa ~25 ms em 12 MP: bilinear até o dobro do
+        # alvo (~2 ms) e só a última redução pela metade com INTER_AREA, já em tons de cinza
+        dobro = fator < 0.5
+        alvo = (max(1, int(w * fator)) * (2 if dobro else 1), max(1, int(h * fator)) * (2 if dobro else 1))
+        img = cv2.resize(img, alvo, interpolation=cv2.INTER_LINEAR)
+    cinza = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY) if img.ndim == 3 else img
+    if fator < 0.5:
+        cinza = cv2.resize(cinza, None, fx=0.5, fy=0.5, interpolation=cv2.INTER_AREA)
+    return cinza
+
+
+def avaliar(img) -> Qualidade:
+    """Mede a foto (array BGR ou cinza) e devolve os motivos de recusa, se houver."""
+    import cv2
+    import numpy as np
+
+    cinza = _amostra_cinza(img)
+    histograma = np.cumsum(cv2.calcHist([cinza], [0], None, [256], [0, 256]).ravel())
+    total = histograma[-1]
+    # Percentis 0,5/99,5: numa receita com pouco texto, a tinta pode ser só ~1% dos pixels
+    escuro = int(np.searchsorted(histograma, total * 0.005))
+    claro = int(np.searchsorted(histograma, total * 0.995))
+    contraste = claro - escuro
+    brilho = float(cinza.mean())
+
+    # Nitidez independente da exposição: estica [escuro, claro] para [0, 255] antes do Laplaciano;
+    # a suavização 3x3 tira o ruído do sensor, que sozinho daria uma variância alta numa foto borrada
+    alpha = 255.0 / max(contraste, 1)
+    esticada = cv2.convertScaleAbs(cinza, alpha=alpha, beta=-escuro * alpha)
+    nitidez = float(cv2.Laplacian(cv2.GaussianBlur(esticada, (3, 3), 0), cv2.CV_16S).var())
+
+    # Tinta: pixels bem mais escuros que a vizinhança (o fundo e o ruído leve não passam)
+    tinta = cv2.adaptiveThreshold(esticada, 1, cv2.ADAPTIVE_THRESH_MEAN_C, cv2.THRESH_BINARY_INV, 15, 20)
+    texto = float(tinta.mean())
+
+    medidas = {"lado_min": min(img.shape[:2]), "brilho": round(brilho, 1), "contraste": contraste,
+               "nitidez": round(nitidez, 1), "texto": round(texto, 4)}
+    motivos = []
+    if medidas["lado_min"] < QUALIDADE_LADO_MIN:
+        motivos.append("resolucao")
+    # Um motivo de exposição/conteúdo por vez: escura já implica pouco contraste, e sem
+    # contraste ou sem texto o Laplaciano só mede ruído (desfoque é o último a ser apontado)
+    if brilho < QUALIDADE_BRILHO_MIN:
+        motivos.append("escura")
+    elif contraste < QUALIDADE_CONTRASTE_MIN:
+        motivos.append("contraste")
+    elif texto < QUALIDADE_TEXTO_MIN:
+        motivos.append("sem_texto")
+    elif nitidez < QUALIDADE_NITIDEZ_MIN:
+        motivos.append("desfocada")
+    if METRICAS_ATIVO:
+        for motivo in motivos:
+            RECUSAS.incrementar(motivo=motivo)
+    return Qualidade(tuple(motivos), medidas)
+
+
+def mensagem_nova_foto(motivos) -> str:
+    """Resposta ao usuário pedindo outra foto, citando o que foi detectado."""
+    trechos = [MENSAGENS[m] for m in motivos if m in MENSAGENS]
+    detalhe = (", ".join(trechos[:-1]) + " e " + trechos[-1]) if len(trechos) > 1 else "".join(trechos)
+    return (f"📷 Não consegui ler sua receita: {detalhe}. " if detalhe else "📷 Não consegui ler sua receita. ") + \
+        "Por favor, envie outra foto da receita inteira, bem iluminada, com o celular parado e o texto em foco."
@@ -1,16 +1,89 @@
-from flask import Blueprint, request
+from flask import Blueprint, Response, request, jsonify
 from twilio.twiml.messaging_response import MessagingResponse
-from .services import salvar_arquivo, extrair_texto_azure
+from .services import baixar_midia, arquivar_midia, extrair_texto_midia, CACHE_OCR, MOTOR_CORRECOES, OCR
+from .config import JOBS_ATIVO, ARQUIVAR_RECEITAS, OPENFDA_ENRIQUECER, DEDUP_ATIVO
+from .jobs import obter_pool, FilaCheia
+from .envio import obter_despachante
+from .estado import criar_estado_conversas
+from .idempotencia import Deduplicador
+from . import http_client, openfda, pdf, log
+from .metricas import REGISTRO, etapa, em_andamento, contar_erro
+from .qualidade import mensagem_nova_foto
 import json
 
 webhook_bp = Blueprint("webhook", __name__)
 
-# Simples armazenamento em memória para controle de conversa
-conversas_em_andaamento = {}
+# Estado das conversas em andamento (backend escolhido por ESTADO_BACKEND)
+conversas_em_andaamento = criar_estado_conversas()
+
+# MessageSids já atendidos ou em andamento (repetições do Twilio não processam de novo)
+deduplicador = Deduplicador() if DEDUP_ATIVO else None
+
+
+def _coletar_cache_ocr():
+    if CACHE_OCR is None:
+        return []
+    e = CACHE_OCR.estatisticas()
+    return [({"nivel": "memoria"}, e["hits_memoria"]), ({"nivel": "disco"}, e["hits_disco"])]
+
+
+def _coletar_escalonamentos():
+    return [({"motivo": m}, n) for m, n in OCR.metricas.estatisticas()["motivos"].items()]
+
+
+# Contadores que já existem em outros módulos, lidos só quando o Prometheus coleta
+REGISTRO.coletor("receitas_jobs_fila", "Jobs aguardando na fila",
+                 lambda: obter_pool().status()["fila"] if JOBS_ATIVO else 0)
+REGISTRO.coletor("receitas_jobs_rejeitados_total", "Jobs recusados com a fila cheia",
+                 lambda: obter_pool().status()["rejeitados"] if JOBS_ATIVO else 0, tipo="counter")
+REGISTRO.coletor("receitas_whatsapp_fila", "Mensagens aguardando envio pela Cloud API (todos os workers)",
+                 lambda: obter_despachante().status()["pendentes"] if JOBS_ATIVO else 0)
+REGISTRO.coletor("receitas_cache_ocr_acertos_total", "Acertos do cache de OCR por nível", _coletar_cache_ocr,
+                 tipo="counter")
+REGISTRO.coletor("receitas_ocr_escalonamentos_total", "Leituras passadas ao próximo motor de OCR, por motivo",
+                 _coletar_escalonamentos, tipo="counter")
+REGISTRO.coletor("receitas_log_descartados_total", "Eventos de log descartados com a fila cheia",
+                 log.descartados, tipo="counter")
+
+
+@webhook_bp.route("/metrics", methods=["GET"])
+def metrics():
+    """Métricas no formato do Prometheus (deste processo)."""
+    return Response(REGISTRO.exportar(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@webhook_bp.route("/status", methods=["GET"])
+def status():
+    """Contadores operacionais: fila de jobs e de envio, cache de OCR, motores de OCR e conexões HTTP."""
+    return jsonify({
+        "jobs": obter_pool().status() if JOBS_ATIVO else None,
+        "envio_whatsapp": obter_despachante().status() if JOBS_ATIVO else None,
+        "cache_ocr": CACHE_OCR.estatisticas() if CACHE_OCR is not None else None,
+        "http": http_client.estatisticas(),
+        "conversas": conversas_em_andaamento.estatisticas(),
+        "webhook_dedup": deduplicador.estatisticas() if deduplicador is not None else None,
+        "correcoes_ocr": MOTOR_CORRECOES.estatisticas(),
+        "openfda": openfda.obter_cache().estatisticas() if OPENFDA_ENRIQUECER else None,
+        "pdf": pdf.estatisticas(),
+        "ocr": OCR.metricas.estatisticas(),
+    })
 
 
 @webhook_bp.route("/webhook-whatsapp", methods=["POST"])
 def webhook_whatsapp():
+    with em_andamento("webhook"), etapa("webhook"):
+        sid = request.form.get("MessageSid")
+        if deduplicador is None or not sid:
+            return _webhook_whatsapp()
+        resposta = deduplicador.executar(sid, _webhook_whatsapp)
+        if resposta is None:
+            # A primeira entrega ainda está processando. Não pode ser 200 (o Twilio daria a mensagem
+            # por entregue e a resposta do OCR se perderia): com 503 ele repete e pega a resposta guardada
+            return Response("", status=503, headers={"Retry-After": "5"})
+        return resposta
+
+
+def _webhook_whatsapp():
     sender = request.form.get("From")
     body = (request.form.get("Body") or "").strip()
     media_url = request.form.get("MediaUrl0")
@@ -21,30 +94,10 @@ def webhook_whatsapp():
     # --------------------------------------------------------------------
     # SEÇÃO 1: Lógica para conversas já em andamento (pedindo quantidade)
     # --------------------------------------------------------------------
-    if sender in conversas_em_andaamento:
-        estado = conversas_em_andaamento[sender]
-        json_receita = estado["json_receita"]
-        med_nome = estado["aguardando_medicamento"]
-
-        # Atualiza a quantidade informada pelo usuário
-        for med in json_receita["medicamentos"]:
-            if med["nome"] == med_nome:
-                med["quantidade"] = body
-                break
-
-        # Verifica se há mais medicamentos sem quantidade
-        proximo = next((m for m in json_receita["medicamentos"] if m["quantidade"] == "Não identificado"), None)
-
-        if proximo:
-            estado["aguardando_medicamento"] = proximo["nome"]
-            message.body(
-                f"⚠️ Não identificamos a quantidade para o medicamento: *{proximo['nome']}*. Por favor, informe a quantidade (ex: 30 comprimidos).")
-        else:
-            # Finaliza a conversa se não houver mais pendências
-            message.body(
-                f"✅ Receita finalizada:\n```json\n{json.dumps(json_receita, indent=2, ensure_ascii=False)}\n```")
-            conversas_em_andaamento.pop(sender)
-
+    with etapa("estado"):
+        resposta = conversas_em_andaamento.atualizar(sender, lambda estado: registrar_quantidade(estado, body))
+    if resposta is not None:
+        message.body(resposta)
         return str(response)
 
     # --------------------------------------------------------------------
@@ -60,35 +113,93 @@ def webhook_whatsapp():
         return str(response)
 
     # Se for uma mensagem com imagem/PDF, inicia o processamento
-    file_path = salvar_arquivo(media_url, sender)
-    if not file_path:
-        message.body("❌ Desculpe, tive um problema ao salvar seu arquivo. Tente novamente.")
-        return str(response)
+    if JOBS_ATIVO:
+        # Modo job: responde ao Twilio na hora e o resultado vai pela Cloud API
+        try:
+            obter_pool().submeter(processar_e_enviar, sender, media_url)
+        except FilaCheia as e:
+            contar_erro("fila_cheia")
+            log.aviso("job_rejeitado", erro=str(e))
+            message.body("⏳ Estamos com muitas receitas em processamento. Tente novamente em alguns minutos.")
+            return str(response)
+        return str(MessagingResponse())
 
-    texto_receita_json_str = extrair_texto_azure(file_path)
+    message.body(processar_receita(sender, media_url))
+    return str(response)
+
+
+def registrar_quantidade(estado: dict | None, body: str):
+    """
+    Aplica a quantidade informada ao medicamento pendente.
+    Retorna (novo_estado | None, resposta); sem conversa em andamento retorna (None, None).
+    """
+    if estado is None:
+        return None, None
+    json_receita = estado["json_receita"]
+    med_nome = estado["aguardando_medicamento"]
+
+    # Atualiza a quantidade informada pelo usuário
+    for med in json_receita["medicamentos"]:
+        if med["nome"] == med_nome:
+            med["quantidade"] = body
+            break
+
+    # Verifica se há mais medicamentos sem quantidade
+    proximo = next((m for m in json_receita["medicamentos"] if m["quantidade"] == "Não identificado"), None)
+
+    if proximo:
+        estado["aguardando_medicamento"] = proximo["nome"]
+        return estado, f"⚠️ Não identificamos a quantidade para o medicamento: *{proximo['nome']}*. Por favor, informe a quantidade (ex: 30 comprimidos)."
+
+    # Finaliza a conversa se não houver mais pendências
+    return None, f"✅ Receita finalizada:\n```json\n{json.dumps(json_receita, indent=2, ensure_ascii=False)}\n```"
+
+
+def processar_receita(sender: str, media_url: str) -> str:
+    """Baixa a mídia, roda o OCR e devolve o texto de resposta para o usuário."""
+    midia = baixar_midia(media_url)
+    if not midia:
+        return "❌ Desculpe, tive um problema ao salvar seu arquivo. Tente novamente."
+    conteudo, extensao = midia
+    if ARQUIVAR_RECEITAS:
+        arquivar_midia(conteudo, sender, extensao)
+
+    texto_receita_json_str = extrair_texto_midia(conteudo, extensao)
     dados_json = json.loads(texto_receita_json_str)
     # --- PONTO CRÍTICO DA CORREÇÃO ---
     # ✅ 1. VERIFICA SE A EXTRAÇÃO RETORNOU UM ERRO
+    if "qualidade" in dados_json:
+        # Recusada na triagem (app/qualidade.py): pede outra foto dizendo o que houve
+        return mensagem_nova_foto(dados_json["qualidade"])
     if "erro" in dados_json:
         # Envia uma mensagem amigável para o usuário e o erro técnico para debug
         error_message = dados_json['erro']
-        print(f"ERRO TÉCNICO NA EXTRAÇÃO: {error_message}")
-        message.body(
-            "Desculpe, não consegui ler as informações da sua receita. Por favor, tente enviar uma foto mais nítida e bem iluminada.")
-    else:
-        # ✅ 2. SE NÃO HOUVE ERRO, PROSSEGUE COM A LÓGICA NORMAL
-        medicamentos = dados_json.get("medicamentos", [])
-        med_incompleto = next((m for m in medicamentos if m.get("quantidade") == "Não identificado"), None)
-        if med_incompleto:
-            # Inicia o fluxo de conversa para pedir a quantidade
-            conversas_em_andaamento[sender] = {
+        log.erro("extracao_sem_dados", erro=error_message)
+        return "Desculpe, não consegui ler as informações da sua receita. Por favor, tente enviar uma foto mais nítida e bem iluminada."
+
+    # ✅ 2. SE NÃO HOUVE ERRO, PROSSEGUE COM A LÓGICA NORMAL
+    medicamentos = dados_json.get("medicamentos", [])
+    med_incompleto = next((m for m in medicamentos if m.get("quantidade") == "Não identificado"), None)
+    if med_incompleto:
+        # Inicia o fluxo de conversa para pedir a quantidade
+        with etapa("estado"):
+            conversas_em_andaamento.salvar(sender, {
                 "json_receita": dados_json,
                 "aguardando_medicamento": med_incompleto["nome"]
-            }
-            message.body(
-                f"⚠️ Não identificamos a quantidade para o medicamento: *{med_incompleto['nome']}*. Por favor, informe a quantidade (ex: 30 ).")
-        else:
-            # Se tudo estiver completo, envia o resultado final
-            message.body(
-                f"✅ Receita recebida com sucesso:\n```json\n{json.dumps(dados_json, indent=2, ensure_ascii=False)}\n```")
-    return str(response)
\ No newline at end of file
+            })
+        return f"⚠️ Não identificamos a quantidade para o medicamento: *{med_incompleto['nome']}*. Por favor, informe a quantidade (ex: 30 )."
+
+    # Se tudo estiver completo, envia o resultado final
+    return f"✅ Receita recebida com sucesso:\n```json\n{json.dumps(dados_json, indent=2, ensure_ascii=False)}\n```"
+
+
+def processar_e_enviar(sender: str, media_url: str) -> None:
+    """Job executado pelo pool: processa a receita e enfileira a resposta para a WhatsApp Cloud API."""
+    with em_andamento("job"), etapa("job"):
+        texto = processar_receita(sender, media_url)
+        obter_despachante().enviar(destino_e164(sender), texto)
+
+
+def destino_e164(sender: str) -> str:
+    """Converte o remetente do Twilio ("whatsapp:+5511...") para o formato E.164."""
+    return sender.split(":", 1)[-1] if sender else sender
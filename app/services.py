@@ -1,90 +1,99 @@
 import os
 import re
 import json
-import csv
-import cv2
-import requests
+import hashlib
+import threading
 from pathlib import Path
-from PIL import Image, UnidentifiedImageError
-from pdf2image import convert_from_path
-from pdf2image.exceptions import PDFPageCountError
 from requests.auth import HTTPBasicAuth
-from .config import TWILIO_SID, TWILIO_AUTH, AZURE_ENDPOINT, AZURE_KEY, WABA_ID, WHATSAPP_TOKEN
+from .config import TWILIO_SID, TWILIO_AUTH, WABA_ID, WHATSAPP_TOKEN
+from .config import PREPROC_PERFIL, FUZZY_MAX_DISTANCIA, CORRECOES_OCR_ARQUIVO
+from .correcoes import MotorCorrecoes
+from .config import OCR_CACHE_ATIVO, OCR_CACHE_DIR, OCR_CACHE_MEMORIA_ITENS, OCR_CACHE_DISCO_MB, OCR_CACHE_TTL
+from .principios import carregar_indices, ler_csv, UNIDADES, PADRAO_NUMERO
+from .cache import CacheOCR, chave_conteudo
+from .http_client import http_get, http_post
+from .beneficiarios import BaseBeneficiarios
+from .config import BENEF_DB, OPENFDA_ENRIQUECER
+from .openfda import buscar_openfda_lote
+from .parser_receita import ParserReceita, LinhaOCR, linhas_do_texto
+from .pdf import processar_pdf, ErroPDF
+from .ocr import criar_ocr, completude, Avaliacao, VERSAO_ESCALADA
+from .qualidade import avaliar as avaliar_qualidade
+from .config import OCR_MOTOR, OCR_CONFIANCA_MIN, OCR_COMPLETUDE_MIN, AZURE_OCR_API
+from .config import PDF_MAX_PAGINAS, PDF_DPI, QUALIDADE_ATIVO, PRINCIPIOS_CSV, PRINCIPIOS_SNAPSHOT
+from .metricas import etapa, contar_cache, contar_erro
+from . import log
+
+# cv2, numpy e pdf2image (~0,2 s de import) são importados dentro das funções que
+# os usam: o worker sobe e atende o webhook sem carregá-los até a primeira imagem.
 
 # ============================================================
 # 0) CONFIG BASE + WABA (variáveis de ambiente)
 # ============================================================
 
 # Base local (JSON) para validação de CPF
-DATA_DIR = Path(__file__).resolve().parent / "data"
-DATA_DIR.mkdir(exist_ok=True)
+DATA_DIR = Path(__file__).resolve().parent / "data"  # criado só quando algo é gravado nele
 BASE_BENEF = DATA_DIR / "beneficiarios.json"
 
 # WhatsApp Cloud API
 WABA_ID = os.getenv("WABA_ID")                 # ex: "721620457574899"
 WHATSAPP_TOKEN = os.getenv("WHATSAPP_TOKEN")   # token do Meta/Graph
 PHONE_NUMBER_ID = os.getenv("PHONE_NUMBER_ID") # descobre via API se ainda não tem
-FB_GRAPH = "https://graph.facebook.com/v18.0"
+FB_GRAPH = os.getenv("FB_GRAPH", "https://graph.facebook.com/v18.0")  # sobrescrevível p/ stub local
 
-# Timeout padrão de requests (conexão, leitura)
-REQ_TIMEOUT = (5, 30)
+# Timeouts (conexão, leitura) por serviço ficam em config.HTTP_TIMEOUTS (ver app/http_client.py)
 
 # ============================================================
-# 1) PDF → Imagem (primeira página) + utilidades
+# 1) Decodificação da mídia (PDFs: app/pdf.py)
 # ============================================================
 
-def converter_pdf_para_imagem(caminho_arquivo: str) -> str | None:
-    """Verifica se um arquivo é PDF e o converte para uma imagem JPG."""
-    caminho_path = Path(caminho_arquivo)
-    if caminho_path.suffix.lower() != '.pdf':
-        print(f"ℹ️ Arquivo '{caminho_path.name}' não é PDF. Nenhuma conversão necessária.")
-        return caminho_arquivo
-    caminho_imagem_saida = caminho_path.with_suffix('.jpg')
-    print(f"⏳ Convertendo PDF '{caminho_path.name}' para imagem...")
-    try:
-        paginas = convert_from_path(caminho_arquivo, dpi=300, first_page=1, last_page=1)
-        if paginas:
-            paginas[0].save(caminho_imagem_saida, 'JPEG')
-            print(f"✅ PDF convertido com sucesso para '{caminho_imagem_saida.name}'")
-            return str(caminho_imagem_saida)
-        else:
-            raise PDFPageCountError("O arquivo PDF está vazio ou não contém páginas válidas.")
-    except Exception as e:
-        print(f"❌ Falha ao converter o PDF '{caminho_path.name}'. Erro: {e}")
-        return None
+def decodificar_midia(conteudo: bytes, extensao: str):
+    """Decodifica a imagem recebida direto para um array BGR, sem tocar no disco. PDFs vão por processar_pdf."""
+    import cv2
+    import numpy as np
+    with etapa("decodificacao"):
+        img = cv2.imdecode(np.frombuffer(conteudo, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if img is None:
+        contar_erro("decodificacao")
+        log.erro("imagem_invalida", extensao=extensao, bytes=len(conteudo))
+    return img
 
 # ============================================================
 # 2) Princípios ativos (CSV) + busca fallback
 # ============================================================
 
 def carregar_principios_ativos():
-    """Carrega a lista de princípios ativos a partir de um arquivo CSV."""
-    caminho = Path(__file__).resolve().parent / 'principios_ativos.csv'
-    principios = set()
+    """Carrega a lista de princípios ativos a partir de um arquivo CSV. Devolve (princípios, hash do arquivo)."""
     try:
-        with open(caminho, newline='', encoding='utf-8') as f:
-            for row in csv.reader(f):
-                if row and row[0]:
-                    principios.add(row[0].strip().lower())
+        return ler_csv(PRINCIPIOS_CSV)
     except Exception as e:
-        print(f"Erro ao carregar CSV 'principios_ativos.csv': {e}")
-    return principios
-
-PRINCIPIOS_ATIVOS = carregar_principios_ativos()
+        log.erro("principios_csv_falhou", arquivo=PRINCIPIOS_CSV, erro=str(e))
+        return set(), ""
+
+PRINCIPIOS_ATIVOS, _HASH_PRINCIPIOS = carregar_principios_ativos()
+# Índice (trie + regex combinado) para a busca no texto e corretor aproximado para nomes
+# truncados pelo OCR ("Atorvastatlna" → "Atorvastatina"), lidos do snapshot binário
+# (PRINCIPIOS_SNAPSHOT) em vez de montados a cada processo; ver app/principios.py
+INDICE_PRINCIPIOS, INDICE_FUZZY = carregar_indices(PRINCIPIOS_ATIVOS, _HASH_PRINCIPIOS, PRINCIPIOS_SNAPSHOT,
+                                                   FUZZY_MAX_DISTANCIA)
+
+def aquecer() -> None:
+    """Carrega já o que fica sob demanda: cv2/numpy/pdf2image e o regex combinado dos princípios."""
+    import cv2  # noqa: F401
+    import pdf2image  # noqa: F401
+    INDICE_PRINCIPIOS.compilar()
 
 def buscar_openfda(nome: str) -> str:
-    """Consulta a API do OpenFDA como um fallback para nomes de medicamentos."""
-    try:
-        q = nome.replace(" ", "+")
-        url = f"https://api.fda.gov/drug/label.json?search=generic_name:{q}&limit=1"
-        resp = requests.get(url, timeout=REQ_TIMEOUT)
-        if resp.status_code == 200:
-            res = resp.json().get("results", [])
-            if res:
-                return res[0].get("openfda", {}).get("brand_name", [None])[0] or res[0].get("generic_name")
-    except Exception:
-        pass
-    return None
+    """Consulta a API do OpenFDA como um fallback para nomes de medicamentos (com cache persistente)."""
+    return buscar_openfda_lote([nome]).get(nome)
+
+def enriquecer_com_openfda(medicamentos: list) -> None:
+    """Acrescenta "nome_openfda" a cada medicamento, resolvendo todos os nomes em um único lote."""
+    principios = {m["nome"]: re.sub(rf"\s+{PADRAO_NUMERO}\s?{UNIDADES}$", "", m["nome"], flags=re.IGNORECASE)
+                  for m in medicamentos}
+    resultados = buscar_openfda_lote(set(principios.values()))
+    for m in medicamentos:
+        m["nome_openfda"] = resultados.get(principios[m["nome"]])
 
 def _limpar_nomes_medicamentos(lista_bruta: list) -> list:
     medicamentos = list(set(m.strip() for m in lista_bruta))
@@ -96,18 +105,22 @@ def _limpar_nomes_medicamentos(lista_bruta: list) -> list:
     return [m for m in medicamentos if m not in a_remover]
 
 def encontrar_todos_os_medicamentos(texto: str) -> list:
+    # Nomes com erro de OCR antes de uma dose viram o nome canônico do CSV
+    return _medicamentos_no_texto(INDICE_FUZZY.corrigir_texto(texto))
+
+def _medicamentos_no_texto(texto: str) -> list:
+    """Busca dos medicamentos em um texto cujos nomes já passaram pelo INDICE_FUZZY."""
     medicamentos_encontrados = []
 
-    unidades = "(?:g/ml|g|mg|mcg|ml|ui|%)"
-    padrao_numero = r"\d+(?:[.,]\d+)?"
+    unidades = UNIDADES
+    padrao_numero = PADRAO_NUMERO
     blacklist = r"(?!Aplicar|Tomar|Usar|Dias|Iniciar|Término|Após|Mar|Das)"
 
-    for p in PRINCIPIOS_ATIVOS:
-        regex_principio = rf"({re.escape(p)}\s+{padrao_numero}\s?{unidades})\b"
-        matches = re.findall(regex_principio, texto, re.IGNORECASE)
-        medicamentos_encontrados.extend(matches)
+    # Uma única varredura do texto para todos os princípios do CSV
+    medicamentos_encontrados.extend(INDICE_PRINCIPIOS.encontrar(texto))
 
-    regex_fallback = rf"\b{blacklist}([A-Z][a-zçãõáéíúâê\-]+(?:\s+[A-Za-zçãõáéíúâê\-]+)?\s+{padrao_numero}\s?{unidades})\b"
+    # Nome e dose na mesma linha do OCR ([ \t], não \s): evita nomes como "Oral\nDipirona 500mg"
+    regex_fallback = rf"\b{blacklist}([A-Z][a-zçãõáéíúâê\-]+(?:[ \t]+[A-Za-zçãõáéíúâê\-]+)?[ \t]+{padrao_numero}\s?{unidades})\b"
     matches_fallback = re.findall(regex_fallback, texto, re.IGNORECASE)
     medicamentos_encontrados.extend(matches_fallback)
 
@@ -118,6 +131,7 @@ def encontrar_todos_os_medicamentos(texto: str) -> list:
     return [med.title() for med in medicamentos_limpos]
 
 def extrair_quantidade_total(nome_medicamento: str, texto_completo: str) -> str:
+    """Busca da posologia no texto inteiro, mantida por compatibilidade (o parser usa só as linhas próximas)."""
     try:
         texto_apos_medicamento_match = re.search(re.escape(nome_medicamento), texto_completo, re.IGNORECASE)
         if not texto_apos_medicamento_match:
@@ -147,193 +161,386 @@ def extrair_quantidade_total(nome_medicamento: str, texto_completo: str) -> str:
 # 3) Download do arquivo recebido (Twilio) + pré-processamento
 # ============================================================
 
-def salvar_arquivo(media_url: str, sender: str) -> str:
-    os.makedirs("receitas", exist_ok=True)
-    nome_base = sender.replace(":", "_")
+def baixar_midia(media_url: str):
+    """
+    Baixa a mídia do Twilio para a memória.
+    Retorna (conteudo, extensao) ou None se o tipo não for suportado / houver erro.
+    """
     try:
-        resp = requests.get(media_url, auth=HTTPBasicAuth(TWILIO_SID, TWILIO_AUTH), stream=True, timeout=REQ_TIMEOUT)
-        resp.raise_for_status()
+        with etapa("download"):
+            resp = http_get("twilio", media_url, auth=HTTPBasicAuth(TWILIO_SID, TWILIO_AUTH))
+            resp.raise_for_status()
+            conteudo = resp.content
         content_type = resp.headers.get("Content-Type", "")
-        print(f"💎 Tipo de mídia: {content_type}")
+        log.evento("midia_baixada", content_type=content_type, bytes=len(conteudo))
         if "image" in content_type:
             extensao = content_type.split("/")[-1]
         elif "pdf" in content_type:
             extensao = "pdf"
         else:
-            print("❌ Erro: conteúdo não suportado ou inválido.")
+            contar_erro("download")
+            log.aviso("midia_nao_suportada", content_type=content_type)
             return None
+        return conteudo, extensao
+    except Exception as e:
+        log.erro("midia_falha_download", erro=str(e))
+        return None
+
+def arquivar_midia(conteudo: bytes, sender: str, extensao: str) -> str | None:
+    """Grava uma cópia da mídia em receitas/ (arquivamento; não faz parte do pipeline de OCR)."""
+    try:
+        os.makedirs("receitas", exist_ok=True)
+        nome_base = sender.replace(":", "_")
         file_path = f"receitas/{nome_base}.{extensao}"
         with open(file_path, "wb") as f:
-            for chunk in resp.iter_content(1024):
-                f.write(chunk)
-        print(f"📂 Arquivo salvo em {file_path}")
+            f.write(conteudo)
+        log.evento("midia_arquivada", arquivo=file_path)
         return file_path
     except Exception as e:
-        print(f"❌ Erro ao salvar arquivo: {e}")
+        log.erro("midia_falha_arquivar", erro=str(e))
         return None
 
+def salvar_arquivo(media_url: str, sender: str) -> str:
+    """Baixa a mídia e grava em receitas/. Mantido para quem ainda trabalha com caminhos."""
+    midia = baixar_midia(media_url)
+    if not midia:
+        return None
+    conteudo, extensao = midia
+    return arquivar_midia(conteudo, sender, extensao)
+
+# Perfis de pré-processamento (qualidade × velocidade). PREPROC_PERFIL escolhe o padrão.
+# - max_megapixels: reduz a imagem (INTER_AREA) antes do filtro; None = resolução original
+# - filtro: "nlmeans" (fastNlMeansDenoising) ou "mediana" (medianBlur 3x3, bem mais barato)
+# - janela_busca: searchWindowSize do nlmeans (custo ~ janela²)
+# - ruido_minimo: abaixo deste ruído estimado (desvio padrão, 0-255) o filtro é pulado; None = sempre filtra
+PERFIS_PREPROCESSAMENTO = {
+    "rapido": {"max_megapixels": 2.0, "filtro": "mediana", "janela_busca": None, "ruido_minimo": 4.0},
+    "balanceado": {"max_megapixels": 4.0, "filtro": "nlmeans", "janela_busca": 15, "ruido_minimo": 3.0},
+    "maxima_qualidade": {"max_megapixels": None, "filtro": "nlmeans", "janela_busca": 21, "ruido_minimo": None},
+}
+
+if PREPROC_PERFIL not in PERFIS_PREPROCESSAMENTO:
+    raise ValueError(f"PREPROC_PERFIL inválido: {PREPROC_PERFIL!r} (use {', '.join(PERFIS_PREPROCESSAMENTO)})")
+
+def estimar_ruido(gray, lado_amostra: int = 512) -> float:
+    """
+    Estima o desvio padrão do ruído (escala 0-255) em poucos recortes da imagem.
+    Usa a mediana da resposta ao kernel de Immerkær, robusta às bordas do texto.
+    """
+    import cv2
+    import numpy as np
+    kernel = np.array([[1, -2, 1], [-2, 4, -2], [1, -2, 1]], dtype=np.float32)
+    h, w = gray.shape[:2]
+    estimativas = []
+    x = max(0, w // 2 - lado_amostra // 2)
+    for y in (h // 4, h // 2, 3 * h // 4):
+        y = max(0, y - lado_amostra // 2)
+        recorte = gray[y:y + lado_amostra, x:x + lado_amostra].astype(np.float32)
+        if recorte.shape[0] < 3 or recorte.shape[1] < 3:
+            continue
+        resposta = np.abs(cv2.filter2D(recorte, -1, kernel))[1:-1, 1:-1]
+        estimativas.append(float(np.median(resposta)) * 1.4826 / 6)
+    return float(np.median(estimativas)) if estimativas else 0.0
+
+def reduzir_resolucao(img, max_megapixels: float | None):
+    """Reduz a imagem para no máximo max_megapixels mantendo a proporção."""
+    if not max_megapixels:
+        return img
+    import cv2
+    h, w = img.shape[:2]
+    fator = (max_megapixels * 1_000_000 / (h * w)) ** 0.5
+    if fator >= 1:
+        return img
+    return cv2.resize(img, (max(1, int(w * fator)), max(1, int(h * fator))), interpolation=cv2.INTER_AREA)
+
+def preprocessar_array(img, perfil: str | None = None):
+    """
+    Pipeline de pré-processamento sobre um array BGR; devolve a imagem binarizada (tons de cinza).
+    perfil: "rapido" | "balanceado" | "maxima_qualidade" (padrão: PREPROC_PERFIL).
+    """
+    with etapa("preprocessamento"):
+        return _preprocessar_array(img, perfil)
+
+def _preprocessar_array(img, perfil: str | None):
+    import cv2
+    config = PERFIS_PREPROCESSAMENTO[perfil or PREPROC_PERFIL]
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    gray = reduzir_resolucao(gray, config["max_megapixels"])
+    if config["ruido_minimo"] is not None and estimar_ruido(gray) < config["ruido_minimo"]:
+        denoised = gray
+    elif config["filtro"] == "mediana":
+        denoised = cv2.medianBlur(gray, 3)
+    else:
+        denoised = cv2.fastNlMeansDenoising(gray, None, 30, 7, config["janela_busca"])
+    enhanced = cv2.convertScaleAbs(denoised, alpha=1.5, beta=0)
+    return cv2.adaptiveThreshold(enhanced, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 31, 2)
+
+def codificar_jpeg(img) -> bytes:
+    """Codifica o array em JPEG na memória (mesma qualidade padrão do cv2.imwrite)."""
+    import cv2
+    ok, buffer = cv2.imencode(".jpg", img)
+    if not ok:
+        raise Exception("Falha ao codificar a imagem em JPEG.")
+    return buffer.tobytes()
+
 def preprocessar_imagem(image_path: str) -> str:
+    import cv2
     try:
         img = cv2.imread(image_path)
         if img is None:
             raise Exception("Não foi possível carregar a imagem via OpenCV.")
-        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-        denoised = cv2.fastNlMeansDenoising(gray, None, 30, 7, 21)
-        enhanced = cv2.convertScaleAbs(denoised, alpha=1.5, beta=0)
-        thresh = cv2.adaptiveThreshold(enhanced, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 31, 2)
+        thresh = preprocessar_array(img)
         processed_path = image_path.rsplit(".", 1)[0] + "_processed.jpg"
         cv2.imwrite(processed_path, thresh)
-        print(f"✅ Imagem pré-processada salva em {processed_path}")
+        log.depuracao("imagem_preprocessada", arquivo=processed_path)
         return processed_path
     except Exception as e:
-        print(f"❌ Erro no pré-processamento de imagem: {e}")
+        log.erro("preprocessamento_falhou", arquivo=image_path, erro=str(e))
         return image_path
 
 # ============================================================
 # 4) Correções de OCR + parsing da receita em JSON
 # ============================================================
 
+# Versão das regras de parsing. Incremente ao alterar o parser (app/parser_receita.py)
+# ou funções auxiliares: invalida o cache de OCR. As correções têm versão própria no JSON.
+REGRAS_VERSAO = "3"
+
+# Regras de correção carregadas e compiladas uma vez (app/correcoes_ocr.json)
+MOTOR_CORRECOES = MotorCorrecoes.de_arquivo(CORRECOES_OCR_ARQUIVO)
+
 def corrigir_erros_ocr(texto: str) -> str:
-    correcoes = {
-        # Correções de palavras inteiras
-        r"\bDiplrona\b": "Dipirona", r"\bMana\b": "Maria", r"\bPAC[\'’`]ENTE\b": "PACIENTE",
-        r"\blx\b": "1x", r"\benas\b": "dias", r"\bAh[IÍ]il\b": "Abril",
-        r"\bcomprim[EI]do\b": "comprimido", r"\bcomprimldo\b": "comprimido",
-        r"\bAtorvastat[ji]na\b": "Atorvastatina",
-        r"\.\)\s*oãc": "João",
-        r"\bAtorvastatlna\b": "Atorvastatina",
-        # Correções de dosagens e unidades
-        r"(\d+)[CO]Dmg": r"\100mg",
-        r"@\s?mg": "300mg",
-        r"\bIg!ml\b": "1g/ml",
-        r"(\d+)\s+(\d+)%": r"\1.\2%",
-        # Números/tempo
-        r"\bIO\s+dias": "10 dias",
-        # Limpeza geral
-        r"[_—]+": "",
-        r"\s{2,}": " ",
-    }
-    for padrao, sub in correcoes.items():
-        texto = re.sub(padrao, sub, texto, flags=re.IGNORECASE)
-    return texto
+    return MOTOR_CORRECOES.aplicar(texto)
+
+# Parser em uma passada sobre as linhas do OCR (app/parser_receita.py)
+PARSER_RECEITA = ParserReceita(_medicamentos_no_texto, corrigir_nomes=INDICE_FUZZY.corrigir_texto)
+
+def extrair_dados_linhas(linhas: list) -> dict:
+    """Extrai os dados da receita das linhas do OCR (texto + região + caixa) e formata em JSON."""
+    with etapa("parsing"):
+        dados = PARSER_RECEITA.analisar(linhas)
+    if OPENFDA_ENRIQUECER and dados["medicamentos"]:
+        with etapa("openfda"):
+            enriquecer_com_openfda(dados["medicamentos"])
+    return dados
 
 def extrair_dados_json_azure(texto: str) -> dict:
-    """Orquestra a extração de todas as informações da receita e formata em JSON."""
-    nome = re.search(r"(?i)paciente[:\s\-]*([^\n]+)", texto)
-    cpf = re.search(r"\d{3}[\.\s_]?\d{3}[\.\s_]?\d{3}[-\s_]?\d{2}", texto)
-    crm = re.search(r"CRM[-\s:]*([A-Z]{2}-?\s*\d+)", texto, re.IGNORECASE)
-    data = re.search(r"\d{1,2}\s+de\s+\w+\s+de\s+\d{4}", texto)
-
-    nomes_medicamentos = encontrar_todos_os_medicamentos(texto)
-    medicamentos_finais = []
-
-    for nome_med in nomes_medicamentos:
-        quantidade = extrair_quantidade_total(nome_med, texto)
-        medicamentos_finais.append({
-            "nome": nome_med.title(),
-            "quantidade": quantidade
-        })
-
-    return {
-        "nome": nome.group(1).strip() if nome else "Não identificado",
-        "cpf": cpf.group(0).replace("_", ".") if cpf else None,
-        "medicamentos": medicamentos_finais,
-        "data_receita": data.group(0) if data else None,
-        "crm_medico": crm.group(1).replace("-", "").strip() if crm else None
-    }
+    """Orquestra a extração de todas as informações da receita (texto já corrigido, sem layout)."""
+    return extrair_dados_linhas(linhas_do_texto(texto))
+
+def versao_ocr_bruto() -> str:
+    """Versão das linhas do OCR em si: pré-processamento + PDF + motor. Não muda com as regras de parsing."""
+    versao_ocr = OCR_MOTOR if OCR_MOTOR != "camadas" else f"camadas{OCR_CONFIANCA_MIN:g}_{OCR_COMPLETUDE_MIN:g}e{VERSAO_ESCALADA}"
+    if OCR_MOTOR != "tesseract":
+        versao_ocr += f"_{AZURE_OCR_API}"
+    return f"{PREPROC_PERFIL}-p{PDF_MAX_PAGINAS}x{PDF_DPI}-{versao_ocr}"
+
+def versao_cache_ocr() -> str:
+    """Versão usada na chave do cache: regras de parsing e correção + OCR bruto + base de princípios ativos."""
+    h = hashlib.sha256("\n".join(sorted(PRINCIPIOS_ATIVOS)).encode("utf-8")).hexdigest()[:12]
+    return f"{REGRAS_VERSAO}-c{MOTOR_CORRECOES.versao}-{int(OPENFDA_ENRIQUECER)}-f{FUZZY_MAX_DISTANCIA}-{versao_ocr_bruto()}-{h}"
+
+CACHE_OCR = CacheOCR(
+    OCR_CACHE_DIR or None,
+    max_itens_memoria=OCR_CACHE_MEMORIA_ITENS,
+    max_bytes_disco=int(OCR_CACHE_DISCO_MB * 1024 * 1024),
+    ttl=OCR_CACHE_TTL,
+) if OCR_CACHE_ATIVO else None
+VERSAO_CACHE_OCR = versao_cache_ocr()
+VERSAO_OCR_BRUTO = versao_ocr_bruto()
+
+def linhas_ocr_em_cache(conteudo: bytes) -> list | None:
+    """
+    Linhas do OCR (antes das correções) guardadas para estes bytes. Sobrevivem a
+    mudanças nas regras de correção/parsing: só o parsing precisa ser refeito.
+    Consultada depois do resultado completo, na mesma requisição: não conta nos
+    hits/misses do CACHE_OCR (o nível das linhas vai em contar_cache("ocr_linhas")).
+    """
+    if CACHE_OCR is None:
+        return None
+    em_cache = CACHE_OCR.get(chave_conteudo(conteudo, "linhas-" + VERSAO_OCR_BRUTO), contar=False)
+    if em_cache is None:
+        return None
+    return [LinhaOCR(texto, regiao, tuple(caixa) if caixa else None) for texto, regiao, caixa in em_cache["linhas"]]
+
+def guardar_linhas_ocr(conteudo: bytes, linhas: list) -> None:
+    if CACHE_OCR is not None:
+        CACHE_OCR.set(chave_conteudo(conteudo, "linhas-" + VERSAO_OCR_BRUTO), {"linhas": [list(l) for l in linhas]})
 
 def extrair_texto_azure(file_path: str) -> str:
     """
-    Usa o endpoint OCR do Azure Vision (v3.2/ocr).
-    SUGESTÃO: migrar para Read API (analyze + poll), que tem melhor acurácia.
+    Usa o OCR configurado (OCR_MOTOR); com AZURE_OCR_API=read, a Read API
+    do Azure (analyze + poll assíncrono, app/azure_read.py).
+    Lê o arquivo uma única vez e segue pelo pipeline em memória (extrair_texto_midia).
     """
     try:
-        caminho_imagem = converter_pdf_para_imagem(file_path)
-        if not caminho_imagem:
-            return json.dumps({"erro": "Falha na conversão do PDF para imagem."}, indent=2, ensure_ascii=False)
-
-        processed_path = preprocessar_imagem(caminho_imagem)
-
-        with open(processed_path, "rb") as image_file:
-            image_data = image_file.read()
-
-        ocr_url = f"{AZURE_ENDPOINT}vision/v3.2/ocr?language=pt&detectOrientation=true"
-        headers = {
-            "Ocp-Apim-Subscription-Key": AZURE_KEY,
-            "Content-Type": "application/octet-stream"
-        }
-        response = requests.post(ocr_url, headers=headers, data=image_data, timeout=REQ_TIMEOUT)
-        response.raise_for_status()
-        result = response.json()
-
-        linhas = []
-        for region in result.get("regions", []):
-            for line in region.get("lines", []):
-                texto_linha = " ".join([word["text"] for word in line.get("words", [])])
-                linhas.append(texto_linha)
-
-        texto_extraido = "\n".join(linhas)
-        texto_corrigido = corrigir_erros_ocr(texto_extraido)
-        print("✅ Texto extraído e corrigido:")
-        print(texto_corrigido)
-
-        dados_json = extrair_dados_json_azure(texto_corrigido)
+        conteudo = Path(file_path).read_bytes()
+    except Exception as e:
+        log.erro("arquivo_falha_leitura", arquivo=file_path, erro=str(e))
+        return json.dumps({"erro": f"Falha ao ler o arquivo: {e}"}, indent=2, ensure_ascii=False)
+    return extrair_texto_midia(conteudo, Path(file_path).suffix.lstrip("."))
+
+def _preparar_para_ocr(img, original: bytes | None = None) -> bytes:
+    """Pré-processa e codifica em JPEG; se o pré-processamento falhar, envia a imagem original."""
+    try:
+        return codificar_jpeg(preprocessar_array(img))
+    except Exception as e:
+        log.erro("preprocessamento_falhou", erro=str(e))
+        return original if original is not None else codificar_jpeg(img)
+
+# Motor(es) de OCR configurados em OCR_MOTOR (app/ocr.py)
+OCR = criar_ocr()
+
+_RE_DOSE = re.compile(rf"(?<![\w.,]){PADRAO_NUMERO}\s?{UNIDADES}(?!\w)", re.IGNORECASE)
+
+def _completude_ocr(linhas: list) -> Avaliacao:
+    """Avaliação da extração para o OCR em camadas decidir se escala (sem contar correções nem OpenFDA)."""
+    textos = MOTOR_CORRECOES.aplicar_linhas([l.texto for l in linhas], contar=False)
+    dados = PARSER_RECEITA.analisar([l._replace(texto=t) for l, t in zip(linhas, textos)])
+    return Avaliacao(completude(dados), len(dados["medicamentos"]), sum(len(_RE_DOSE.findall(t)) for t in textos))
+
+def triagem_qualidade(img) -> tuple:
+    """
+    Motivos para recusar a foto antes do pré-processamento e do OCR (app/qualidade.py);
+    tupla vazia = segue. Páginas de PDF não passam por aqui (são renderizadas, não fotografadas).
+    """
+    if not QUALIDADE_ATIVO:
+        return ()
+    with etapa("qualidade"):
+        qualidade = avaliar_qualidade(img)
+    if not qualidade.aceita:
+        log.aviso("foto_recusada", motivos=list(qualidade.motivos), **qualidade.medidas)
+    return qualidade.motivos
+
+def preparar_pagina_pdf(pagina) -> bytes:
+    """Uma página rasterizada (PIL) do PDF → JPEG pré-processado."""
+    import cv2
+    import numpy as np
+    return _preparar_para_ocr(cv2.cvtColor(np.asarray(pagina.convert("RGB")), cv2.COLOR_RGB2BGR))
+
+def _ocr_pagina_pdf(pagina, numero: int) -> list:
+    """Página do PDF → pré-processamento → OCR (só a confiança decide a escalada)."""
+    imagem = preparar_pagina_pdf(pagina)
+    with etapa("ocr"):
+        return OCR.ler(imagem)
+
+def analisar_linhas_ocr(linhas: list) -> tuple:
+    """Linhas cruas do OCR → (texto corrigido, dados da receita)."""
+    # As correções preservam uma linha (e sua caixa) por linha do OCR
+    with etapa("correcao"):
+        textos = MOTOR_CORRECOES.aplicar_linhas([l.texto for l in linhas])
+    return "\n".join(textos), extrair_dados_linhas([l._replace(texto=t) for l, t in zip(linhas, textos)])
+
+def extrair_texto_midia(conteudo: bytes, extensao: str) -> str:
+    """
+    Pipeline em memória: bytes recebidos → array NumPy → triagem de qualidade →
+    pré-processamento → JPEG em buffer → Azure OCR → correção → JSON. Nenhum
+    arquivo intermediário. Fotos recusadas na triagem voltam com "qualidade"
+    (lista de motivos) junto do "erro", sem chamar o OCR.
+    PDFs passam por app/pdf.py: todas as páginas, em paralelo, usando a camada
+    de texto quando houver. Resultados ficam no CACHE_OCR, indexados pelo hash
+    dos bytes recebidos; as linhas cruas do OCR também, para que uma mudança
+    nas regras de parsing não exija chamar o OCR de novo.
+    """
+    try:
+        chave_cache = None
+        if CACHE_OCR is not None:
+            chave_cache = chave_conteudo(conteudo, VERSAO_CACHE_OCR)
+            em_cache = CACHE_OCR.get(chave_cache)
+            contar_cache("ocr_resultado", em_cache is not None)
+            if em_cache is not None:
+                log.evento("ocr_cache", resultado="acerto")
+                return json.dumps(em_cache["dados"], indent=2, ensure_ascii=False)
+
+        linhas = linhas_ocr_em_cache(conteudo)
+        if CACHE_OCR is not None:
+            contar_cache("ocr_linhas", linhas is not None)
+        if linhas is not None:
+            log.evento("ocr_cache", resultado="acerto_linhas")
+        elif extensao.lower() == "pdf":
+            try:
+                linhas = processar_pdf(conteudo, _ocr_pagina_pdf)
+            except ErroPDF as e:
+                contar_erro("conversao_pdf")
+                log.erro("pdf_falhou", erro=str(e))
+                return json.dumps({"erro": f"Falha na conversão do PDF: {e}"}, indent=2, ensure_ascii=False)
+            guardar_linhas_ocr(conteudo, linhas)
+        else:
+            img = decodificar_midia(conteudo, extensao)
+            if img is None:
+                return json.dumps({"erro": "Falha ao decodificar a imagem recebida."}, indent=2, ensure_ascii=False)
+            motivos = triagem_qualidade(img)
+            if motivos:
+                return json.dumps({"erro": "Foto recusada na triagem de qualidade.", "qualidade": list(motivos)},
+                                  indent=2, ensure_ascii=False)
+            imagem = _preparar_para_ocr(img, conteudo)
+            with etapa("ocr"):
+                linhas = OCR.ler(imagem, avaliar=_completude_ocr)
+            guardar_linhas_ocr(conteudo, linhas)
+
+        texto_corrigido, dados_json = analisar_linhas_ocr(linhas)
+        log.evento("receita_extraida", linhas=len(linhas), medicamentos=len(dados_json["medicamentos"]))
+        log.depuracao("texto_corrigido", texto=texto_corrigido)
+        if chave_cache is not None:
+            CACHE_OCR.set(chave_cache, {"texto": texto_corrigido, "dados": dados_json})
         return json.dumps(dados_json, indent=2, ensure_ascii=False)
 
     except Exception as e:
-        print(f"❌ Erro na extração com Azure: {e}")
+        contar_erro("extracao")
+        log.erro("extracao_falhou", erro=str(e), exc_info=e)
         return json.dumps({"erro": f"Falha ao processar com Azure: {e}"}, indent=2, ensure_ascii=False)
 
 # ============================================================
-# 5) Base local de beneficiários (JSON)
+# 5) Base local de beneficiários (SQLite indexado por CPF)
 # ============================================================
 
+_base_benef = None
+_base_benef_lock = threading.Lock()
+
+def obter_base_beneficiarios() -> BaseBeneficiarios:
+    """Abre a base SQLite no primeiro uso; se vazia, importa o beneficiarios.json legado (uma vez só)."""
+    global _base_benef
+    with _base_benef_lock:
+        if _base_benef is None:
+            base = BaseBeneficiarios(BENEF_DB)
+            if BASE_BENEF.exists() and base.contar() == 0:
+                n = base.importar_json(BASE_BENEF)
+                log.evento("beneficiarios_importados", total=n, origem=str(BASE_BENEF), destino=BENEF_DB)
+            _base_benef = base
+        return _base_benef
+
 def carregar_base_local() -> dict:
-    if not BASE_BENEF.exists():
-        BASE_BENEF.write_text(json.dumps({"beneficiarios": []}, ensure_ascii=False, indent=2), encoding="utf-8")
-    try:
-        return json.loads(BASE_BENEF.read_text(encoding="utf-8"))
-    except Exception:
-        return {"beneficiarios": []}
+    """Base inteira no formato JSON legado ({"beneficiarios": [...]}), lida do SQLite."""
+    return {"beneficiarios": obter_base_beneficiarios().listar()}
 
 def salvar_base_local(base: dict) -> None:
-    BASE_BENEF.write_text(json.dumps(base, ensure_ascii=False, indent=2), encoding="utf-8")
-
-def normalizar_cpf(cpf: str) -> str:
-    return "".join([c for c in cpf if c.isdigit()])
+    """Substitui a base SQLite pelo conteúdo de `base` (formato legado): registros fora dela são removidos."""
+    obter_base_beneficiarios().substituir(base.get("beneficiarios", []))
 
 def validar_cpf_local(cpf: str) -> dict:
     """
-    Procura CPF na base local JSON.
+    Procura CPF na base local (consulta indexada pelo CPF normalizado).
     Retorna: {"status": "ATIVO"|"INATIVO"|"NAO_ENCONTRADO", "registro": {...} | None}
     """
-    base = carregar_base_local()
-    cpf_n = normalizar_cpf(cpf)
-    for b in base.get("beneficiarios", []):
-        if normalizar_cpf(b.get("cpf", "")) == cpf_n:
-            st = (b.get("status_plano") or "INATIVO").upper()
-            return {"status": st if st in ("ATIVO", "INATIVO") else "INATIVO", "registro": b}
-    return {"status": "NAO_ENCONTRADO", "registro": None}
+    b = obter_base_beneficiarios().buscar(cpf)
+    if b is None:
+        return {"status": "NAO_ENCONTRADO", "registro": None}
+    st = (b.get("status_plano") or "INATIVO").upper()
+    return {"status": st if st in ("ATIVO", "INATIVO") else "INATIVO", "registro": b}
 
 def upsert_beneficiario_local(cpf: str, nome: str, status_plano: str, validade: str) -> None:
-    base = carregar_base_local()
-    cpf_n = normalizar_cpf(cpf)
-    found = False
-    for b in base["beneficiarios"]:
-        if normalizar_cpf(b.get("cpf", "")) == cpf_n:
-            b["nome_beneficiario"] = nome
-            b["status_plano"] = status_plano.upper()
-            b["validade"] = validade
-            found = True
-            break
-    if not found:
-        base["beneficiarios"].append({
-            "cpf": cpf_n,
-            "nome_beneficiario": nome,
-            "status_plano": status_plano.upper(),
-            "validade": validade
-        })
-    salvar_base_local(base)
+    upsert_beneficiarios_local([{
+        "cpf": cpf,
+        "nome_beneficiario": nome,
+        "status_plano": status_plano,
+        "validade": validade
+    }])
+
+def upsert_beneficiarios_local(registros: list) -> int:
+    """Upsert em lote (uma transação). Cada registro: cpf, nome_beneficiario, status_plano, validade."""
+    # Cópias com o status em maiúsculas: os dicts de quem chamou ficam como estavam
+    return obter_base_beneficiarios().upsert(
+        {**r, "status_plano": r["status_plano"].upper()} if r.get("status_plano") else r for r in registros)
 
 # ============================================================
 # 6) WhatsApp Cloud API (WABA)
@@ -348,19 +555,22 @@ def get_phone_numbers():
         raise RuntimeError("Defina WABA_ID e WHATSAPP_TOKEN nas variáveis de ambiente.")
     url = f"{FB_GRAPH}/{WABA_ID}/phone_numbers"
     headers = {"Authorization": f"Bearer {WHATSAPP_TOKEN}"}
-    r = requests.get(url, headers=headers, timeout=REQ_TIMEOUT)
+    r = http_get("graph", url, headers=headers)
     r.raise_for_status()
     return r.json()
 
-def enviar_texto_whatsapp(destino_e164: str, texto: str) -> dict:
+def enviar_texto_whatsapp(destino_e164: str, texto: str, phone_number_id: str | None = None) -> dict:
     """
-    Envia mensagem de texto via WhatsApp Cloud API.
+    Envia uma mensagem de texto via WhatsApp Cloud API (um POST, sem reenvio).
     destino_e164: "+5511999999999"
     Necessário: PHONE_NUMBER_ID e WHATSAPP_TOKEN definidos.
+    Para respostas ao usuário use app/envio.py (limite de taxa, divisão de textos
+    longos e fila de reenvio), que chama esta função para cada parte.
     """
-    if not PHONE_NUMBER_ID or not WHATSAPP_TOKEN:
+    phone_number_id = phone_number_id or PHONE_NUMBER_ID
+    if not phone_number_id or not WHATSAPP_TOKEN:
         raise RuntimeError("Defina PHONE_NUMBER_ID e WHATSAPP_TOKEN nas variáveis de ambiente.")
-    url = f"{FB_GRAPH}/{PHONE_NUMBER_ID}/messages"
+    url = f"{FB_GRAPH}/{phone_number_id}/messages"
     headers = {
         "Authorization": f"Bearer {WHATSAPP_TOKEN}",
         "Content-Type": "application/json"
@@ -371,8 +581,9 @@ def enviar_texto_whatsapp(destino_e164: str, texto: str) -> dict:
         "type": "text",
         "text": {"body": texto}
     }
-    r = requests.post(url, headers=headers, json=payload, timeout=REQ_TIMEOUT)
-    r.raise_for_status()
+    with etapa("envio_whatsapp"):
+        r = http_post("whatsapp", url, headers=headers, json=payload)
+        r.raise_for_status()
     return r.json()
 
 def registrar_webhook(app_id: str, callback_url: str, verify_token: str) -> dict:
@@ -390,17 +601,17 @@ def registrar_webhook(app_id: str, callback_url: str, verify_token: str) -> dict
         "verify_token": verify_token,
         "fields": "messages,message_template_status"
     }
-    r = requests.post(url, headers=headers, data=data, timeout=REQ_TIMEOUT)
+    r = http_post("graph", url, headers=headers, data=data)
     r.raise_for_status()
     return r.json()
 
 # ============================================================
-# 7) Utilitário para formatar princípios para WhatsApp (lista curta)
+# 7) Utilitário para formatar princípios para WhatsApp
 # ============================================================
 
 def formatar_principios_ativos_para_msg(principios: set[str]) -> str:
+    """Lista completa; acima de WHATSAPP_MSG_MAX o envio (app/envio.py) divide em várias mensagens."""
     if not principios:
         return "Ainda não há princípios ativos cadastrados."
-    lista = sorted(list(principios))[:100]  # evita mensagens muito longas
-    bullets = [f"• {p}" for p in lista]
+    bullets = [f"• {p}" for p in sorted(principios)]
     return "\n".join(bullets)
@@ -0,0 +1,215 @@
+"""
+Benchmark do cliente assíncrono da Read API (app/azure_read.py) contra um mock local.
+
+O mock implementa vision/v3.2/read/analyze (202 + Operation-Location) e
+analyzeResults/{id}, com:
+- tempo de análise sorteado por documento (--latencia-min/--latencia-max);
+- 429 + Retry-After quando uma chave passa de --limite-concorrente operações
+  abertas ou, aleatoriamente, em --taxa-429 das consultas;
+- resultado no formato readResults, gerado a partir das fixtures do parser.
+
+Compara um laço bloqueante ingênuo (threads + requests, consulta a cada 1 s)
+com o ClienteRead (um event loop, polling adaptativo, limite por chave), e
+confere que as linhas devolvidas produzem o JSON esperado de cada fixture.
+
+Uso:
+    python benchmarks/bench_azure_read.py [--documentos 60] [--chaves 2] [--max-em-voo 4]
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import requests
+
+RAIZ = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(RAIZ))
+
+from app import services  # noqa: E402
+from app.azure_read import ClienteRead  # noqa: E402
+from app.parser_receita import linhas_do_resultado_azure, linhas_do_resultado_read  # noqa: E402
+
+FIXTURES = Path(__file__).resolve().parent / "fixtures" / "receitas"
+
+
+def para_read(azure: dict) -> dict:
+    """Converte a resposta v3.2/ocr da fixture para o analyzeResult da Read API."""
+    def vertices(bbox: str) -> list:
+        x, y, w, h = (float(v) for v in bbox.split(","))
+        return [x, y, x + w, y, x + w, y + h, x, y + h]
+
+    linhas = []
+    for region in azure.get("regions", []):
+        for line in region.get("lines", []):
+            palavras = [{"boundingBox": vertices(w["boundingBox"]), "text": w["text"], "confidence": 0.98}
+                        for w in line.get("words", [])]
+            linhas.append({"boundingBox": vertices(line["boundingBox"]),
+                           "text": " ".join(w["text"] for w in palavras), "words": palavras})
+    return {"version": "3.2.0", "readResults": [{"page": 1, "angle": 0, "width": 2000, "height": 3000,
+                                                 "unit": "pixel", "lines": linhas}]}
+
+
+class MockRead(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, resultados: dict, args):
+        super().__init__(("127.0.0.1", 0), _Handler)
+        self.resultados = resultados  # corpo enviado -> analyzeResult
+        self.args = args
+        self.rnd = random.Random(15)
+        self.operacoes = {}  # id -> (chave, pronto_em, corpo)
+        self.abertas = {}  # chave -> operações ainda não entregues
+        self.max_abertas = {}
+        self.ids = itertools.count(1)
+        self.contagem = {"envios": 0, "consultas": 0, "429": 0}
+        self.lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args):
+        pass
+
+    def _responder(self, status: int, corpo=None, headers=None):
+        dados = json.dumps(corpo).encode() if corpo is not None else b""
+        self.send_response(status)
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(dados)))
+        self.end_headers()
+        self.wfile.write(dados)
+
+    def do_POST(self):
+        srv = self.server
+        corpo = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        chave = self.headers.get("Ocp-Apim-Subscription-Key")
+        with srv.lock:
+            if srv.abertas.get(chave, 0) >= srv.args.limite_concorrente:
+                srv.contagem["429"] += 1
+                return self._responder(429, {"error": {"code": "429"}}, {"Retry-After": "1"})
+            srv.contagem["envios"] += 1
+            op = next(srv.ids)
+            pronto = time.monotonic() + srv.rnd.uniform(srv.args.latencia_min, srv.args.latencia_max)
+            srv.operacoes[op] = (chave, pronto, corpo)
+            srv.abertas[chave] = srv.abertas.get(chave, 0) + 1
+            srv.max_abertas[chave] = max(srv.max_abertas.get(chave, 0), srv.abertas[chave])
+        self._responder(202, None, {"Operation-Location": f"{srv.url}vision/v3.2/read/analyzeResults/{op}"})
+
+    def do_GET(self):
+        srv = self.server
+        op = int(self.path.rsplit("/", 1)[-1])
+        with srv.lock:
+            srv.contagem["consultas"] += 1
+            if srv.rnd.random() < srv.args.taxa_429:
+                srv.contagem["429"] += 1
+                return self._responder(429, {"error": {"code": "429"}}, {"Retry-After": "1"})
+            chave, pronto, corpo = srv.operacoes[op]
+            if time.monotonic() < pronto:
+                return self._responder(200, {"status": "running"})
+            if srv.operacoes.pop(op, None):
+                srv.abertas[chave] -= 1
+        self._responder(200, {"status": "succeeded", "analyzeResult": srv.resultados[corpo]})
+
+
+def ingenuo(mock: MockRead, documentos: list, chaves: list, threads: int) -> float:
+    """Envia e consulta a cada 1 s, bloqueando uma thread por documento (como um laço simples faria)."""
+    def um(i_doc):
+        i, doc = i_doc
+        chave = chaves[i % len(chaves)]
+        while True:
+            resp = requests.post(f"{mock.url}vision/v3.2/read/analyze?language=pt", data=doc,
+                                 headers={"Ocp-Apim-Subscription-Key": chave})
+            if resp.status_code != 429:
+                break
+            time.sleep(float(resp.headers.get("Retry-After", 1)))
+        url = resp.headers["Operation-Location"]
+        while True:
+            time.sleep(1)
+            resp = requests.get(url, headers={"Ocp-Apim-Subscription-Key": chave})
+            if resp.status_code == 200 and resp.json()["status"] == "succeeded":
+                return resp.json()["analyzeResult"]
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(threads) as pool:
+        list(pool.map(um, enumerate(documentos)))
+    return time.perf_counter() - inicio
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--documentos", type=int, default=60)
+    parser.add_argument("--chaves", type=int, default=2)
+    parser.add_argument("--max-em-voo", type=int, default=4, help="limite do cliente por chave")
+    parser.add_argument("--limite-concorrente", type=int, default=5, help="limite do mock por chave (429 acima)")
+    parser.add_argument("--latencia-min", type=float, default=0.8)
+    parser.add_argument("--latencia-max", type=float, default=2.5)
+    parser.add_argument("--taxa-429", type=float, default=0.05)
+    parser.add_argument("--threads-ingenuo", type=int, default=4)
+    args = parser.parse_args()
+    services.OPENFDA_ENRIQUECER = False
+
+    fixtures = []
+    for caminho in sorted(FIXTURES.glob("*.json")):
+        dados = json.loads(caminho.read_text(encoding="utf-8"))
+        fixtures.append((caminho.stem.encode(), para_read(dados["azure"]), dados["esperado"],
+                         [l.texto for l in linhas_do_resultado_azure(dados["azure"])]))
+    mock = MockRead({nome: read for nome, read, _, _ in fixtures}, args)
+    threading.Thread(target=mock.serve_forever, daemon=True).start()
+    chaves = [f"chave-{i}" for i in range(args.chaves)]
+    documentos = [fixtures[i % len(fixtures)] for i in range(args.documentos)]
+
+    cliente = ClienteRead(endpoint=mock.url, chaves=chaves, max_em_voo=args.max_em_voo,
+                          intervalo_inicial=0.25, intervalo_max=2.0, timeout=60)
+
+    async def rodar():
+        try:
+            return await cliente.analisar_varios([d[0] for d in documentos])
+        finally:
+            await cliente.fechar()
+
+    inicio = time.perf_counter()
+    resultados = asyncio.run(rodar())
+    t_async = time.perf_counter() - inicio
+    c_async = dict(mock.contagem)
+
+    erros = [r for r in resultados if isinstance(r, Exception)]
+    divergentes = 0
+    for (nome, _, esperado, textos), r in zip(documentos, resultados):
+        if isinstance(r, Exception):
+            continue
+        linhas = linhas_do_resultado_read(r)
+        corrigidas = services.MOTOR_CORRECOES.aplicar_linhas([l.texto for l in linhas])
+        dados = services.PARSER_RECEITA.analisar([l._replace(texto=t) for l, t in zip(linhas, corrigidas)])
+        dados["medicamentos"].sort(key=lambda m: m["nome"])
+        divergentes += [l.texto for l in linhas] != textos or dados != esperado
+
+    print(f"async: {args.documentos} documentos em {t_async:.2f}s, {c_async['consultas'] / args.documentos:.1f} "
+          f"consultas/documento, {c_async['429']} respostas 429, erros {len(erros)}, divergências {divergentes}")
+    print(f"       máximo de operações abertas por chave no mock: {mock.max_abertas} (limite do cliente {args.max_em_voo})")
+    print(f"       {cliente.estatisticas()}")
+
+    mock.contagem = {"envios": 0, "consultas": 0, "429": 0}
+    t_ingenuo = ingenuo(mock, [d[0] for d in documentos], chaves, args.threads_ingenuo)
+    print(f"ingênuo ({args.threads_ingenuo} threads, polling de 1 s): {t_ingenuo:.2f}s, "
+          f"{mock.contagem['consultas'] / args.documentos:.1f} consultas/documento, {mock.contagem['429']} respostas 429")
+    if erros or divergentes:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
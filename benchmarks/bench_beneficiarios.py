@@ -0,0 +1,105 @@
+"""
+Benchmark da base de beneficiários: JSON + varredura linear (antigo) × SQLite indexado.
+
+Para cada tamanho gera uma base sintética, mede a latência de consulta
+(validar_cpf_local) e de upsert (unitário e em lote) nas duas implementações,
+além do tempo de importação do JSON para o SQLite.
+
+Uso:
+    python benchmarks/bench_beneficiarios.py [--tamanhos 10000,100000,1000000]
+"""
+
+import argparse
+import json
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+RAIZ = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(RAIZ))
+
+from app.beneficiarios import BaseBeneficiarios, normalizar_cpf  # noqa: E402
+
+
+# ---------- implementação antiga (JSON inteiro a cada chamada) ----------
+
+def validar_json(caminho: Path, cpf: str):
+    base = json.loads(caminho.read_text(encoding="utf-8"))
+    cpf_n = normalizar_cpf(cpf)
+    for b in base.get("beneficiarios", []):
+        if normalizar_cpf(b.get("cpf", "")) == cpf_n:
+            return b
+    return None
+
+
+def upsert_json(caminho: Path, registro: dict):
+    base = json.loads(caminho.read_text(encoding="utf-8"))
+    cpf_n = normalizar_cpf(registro["cpf"])
+    for b in base["beneficiarios"]:
+        if normalizar_cpf(b.get("cpf", "")) == cpf_n:
+            b.update(registro)
+            break
+    else:
+        base["beneficiarios"].append(registro)
+    caminho.write_text(json.dumps(base, ensure_ascii=False, indent=2), encoding="utf-8")
+
+
+# ---------- geração e medição ----------
+
+def gerar_registros(n: int, rnd: random.Random) -> list:
+    return [{
+        "cpf": f"{i:011d}"[:3] + "." + f"{i:011d}"[3:6] + "." + f"{i:011d}"[6:9] + "-" + f"{i:011d}"[9:],
+        "nome_beneficiario": f"Beneficiário {i}",
+        "status_plano": rnd.choice(["ATIVO", "INATIVO"]),
+        "validade": "2026-12-31",
+    } for i in range(n)]
+
+
+def media_ms(func, args_list) -> float:
+    inicio = time.perf_counter()
+    for args in args_list:
+        func(*args)
+    return (time.perf_counter() - inicio) / len(args_list) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--tamanhos", default="10000,100000,1000000")
+    parser.add_argument("--consultas", type=int, default=200)
+    args = parser.parse_args()
+
+    rnd = random.Random(7)
+    print(f"{'registros':>10} {'import(s)':>10} {'json get':>10} {'sql get':>9} "
+          f"{'json upsert':>12} {'sql upsert':>11} {'sql lote/reg':>13}  (ms)")
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in (int(t) for t in args.tamanhos.split(",")):
+            registros = gerar_registros(n, rnd)
+            caminho_json = Path(tmp) / f"benef_{n}.json"
+            caminho_json.write_text(json.dumps({"beneficiarios": registros}, ensure_ascii=False), encoding="utf-8")
+
+            base = BaseBeneficiarios(Path(tmp) / f"benef_{n}.sqlite3")
+            inicio = time.perf_counter()
+            base.importar_json(caminho_json)
+            t_import = time.perf_counter() - inicio
+
+            alvos = [(rnd.choice(registros)["cpf"],) for _ in range(args.consultas)]
+            # o JSON antigo custa segundos por chamada em 1M: poucas amostras bastam
+            amostras_json = max(1, min(args.consultas, 2_000_000 // n))
+            t_json_get = media_ms(lambda c: validar_json(caminho_json, c), alvos[:amostras_json])
+            t_sql_get = media_ms(base.buscar, alvos)
+
+            novo = lambda i: {"cpf": f"9{i:010d}", "nome_beneficiario": "Novo", "status_plano": "ATIVO", "validade": "2027-01-01"}
+            t_json_up = media_ms(lambda r: upsert_json(caminho_json, r), [(novo(i),) for i in range(max(1, amostras_json // 10))])
+            t_sql_up = media_ms(lambda r: base.upsert([r]), [(novo(i),) for i in range(args.consultas)])
+            lote = [novo(100_000 + i) for i in range(10_000)]
+            t_lote = media_ms(base.upsert, [(lote,)]) / len(lote)
+
+            print(f"{n:>10} {t_import:>10.2f} {t_json_get:>10.2f} {t_sql_get:>9.3f} "
+                  f"{t_json_up:>12.2f} {t_sql_up:>11.3f} {t_lote:>13.4f}")
+            base.fechar()
+
+
+if __name__ == "__main__":
+    main()
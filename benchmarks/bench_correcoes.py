@@ -0,0 +1,111 @@
+"""
+Benchmark do motor de correções de OCR (app/correcoes_ocr.json).
+
+Compara o corrigir_erros_ocr original (18 re.sub por chamada) com o
+MotorCorrecoes compilado: correções por segundo sobre um corpus de textos
+de OCR e verificação de que a saída é idêntica, texto a texto.
+
+Sem --corpus, usa textos sintéticos com os erros de OCR que as regras cobrem
+(e variações aleatórias). Com --corpus DIR, usa todos os .txt do diretório
+(ex.: textos do Azure gravados no cache de OCR).
+
+Uso:
+    python benchmarks/bench_correcoes.py [--corpus DIR] [--textos 2000]
+"""
+
+import argparse
+import random
+import re
+import sys
+import time
+from pathlib import Path
+
+RAIZ = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(RAIZ))
+
+from app.correcoes import MotorCorrecoes  # noqa: E402
+
+
+def corrigir_erros_ocr_original(texto: str) -> str:
+    """Cópia literal da implementação anterior ao motor de regras."""
+    correcoes = {
+        # Correções de palavras inteiras
+        r"\bDiplrona\b": "Dipirona", r"\bMana\b": "Maria", r"\bPAC[\'’`]ENTE\b": "PACIENTE",
+        r"\blx\b": "1x", r"\benas\b": "dias", r"\bAh[IÍ]il\b": "Abril",
+        r"\bcomprim[EI]do\b": "comprimido", r"\bcomprimldo\b": "comprimido",
+        r"\bAtorvastat[ji]na\b": "Atorvastatina",
+        r"\.\)\s*oãc": "João",
+        r"\bAtorvastatlna\b": "Atorvastatina",
+        # Correções de dosagens e unidades
+        r"(\d+)[CO]Dmg": r"\100mg",
+        r"@\s?mg": "300mg",
+        r"\bIg!ml\b": "1g/ml",
+        r"(\d+)\s+(\d+)%": r"\1.\2%",
+        # Números/tempo
+        r"\bIO\s+dias": "10 dias",
+        # Limpeza geral
+        r"[_—]+": "",
+        r"\s{2,}": " ",
+    }
+    for padrao, sub in correcoes.items():
+        texto = re.sub(padrao, sub, texto, flags=re.IGNORECASE)
+    return texto
+
+
+FRAGMENTOS = [
+    "PAC'ENTE: Mana da Silva", "PAC’ENTE: João", ".) oãc Pereira", "Diplrona 500mg", "DIPLRONA 1 Ig!ml",
+    "Atorvastatlna 20mg", "atorvastatjna 40 mg", "ATORVASTATINA 10mg", "Tomar lx ao dia por IO  dias",
+    "1 comprimIdo 2x ao dia por 30 enas", "1 comprimldo", "Comprimido", "5ODmg", "7CDmg", "@ mg", "@mg",
+    "2 5%", "Losartana 50mg", "08 de AhIil de 2020", "08 de AHÍIL de 2020", "CRM: RS 47384", "______",
+    "— assinatura —", "CPF: 123.456.789-01", "Paracetamol 750mg", "Manaus", "lxx", "enasal", "x.)oãc",
+]
+
+
+def gerar_corpus(n: int, rnd: random.Random) -> list:
+    corpus = []
+    for _ in range(n):
+        linhas = [" ".join(rnd.sample(FRAGMENTOS, rnd.randint(1, 3))) for _ in range(rnd.randint(8, 25))]
+        separador = rnd.choice(["\n", "\n", " \n", "  "])
+        corpus.append(separador.join(linhas))
+    return corpus
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--corpus", help="diretório com textos de OCR (.txt)")
+    parser.add_argument("--textos", type=int, default=2000)
+    parser.add_argument("--regras", default=str(RAIZ / "app" / "correcoes_ocr.json"))
+    args = parser.parse_args()
+
+    if args.corpus:
+        corpus = [p.read_text(encoding="utf-8") for p in sorted(Path(args.corpus).glob("*.txt"))]
+    else:
+        corpus = gerar_corpus(args.textos, random.Random(11))
+    motor = MotorCorrecoes.de_arquivo(args.regras)
+
+    divergencias = [t for t in corpus if motor.aplicar(t) != corrigir_erros_ocr_original(t)]
+    if divergencias:
+        print(f"❌ {len(divergencias)} textos com saída diferente da implementação original. Exemplo:")
+        print(repr(divergencias[0]))
+        sys.exit(1)
+
+    motor = MotorCorrecoes.de_arquivo(args.regras)  # zera os contadores
+    inicio = time.perf_counter()
+    for t in corpus:
+        corrigir_erros_ocr_original(t)
+    t_original = time.perf_counter() - inicio
+    inicio = time.perf_counter()
+    for t in corpus:
+        motor.aplicar(t)
+    t_motor = time.perf_counter() - inicio
+
+    print(f"✅ saída idêntica em {len(corpus)} textos")
+    print(f"original: {len(corpus) / t_original:>9.0f} textos/s  (18 passadas)")
+    print(f"motor:    {len(corpus) / t_motor:>9.0f} textos/s  ({motor.passadas} passadas)")
+    print("disparos por regra:")
+    for rid, n in motor.estatisticas().items():
+        print(f"  {rid:<28} {n:>7}{'  ← nunca disparou' if n == 0 else ''}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,272 @@
+"""
+Envio de respostas pela WhatsApp Cloud API (app/envio.py) contra um Graph local com limite de taxa.
+
+Sobe um stub do Graph (POST /<PHONE_NUMBER_ID>/messages) que aceita até
+--limite-stub mensagens/s, responde 429 (código 130429, com Retry-After) acima
+disso, devolve 503 em --falhas-5xx das requisições e recusa com 400 corpos
+acima de 4096 caracteres, como a Meta. Gera uma rajada de --n respostas para
+--destinos usuários (parte delas com receitas longas) e compara:
+- sem fila: um POST por resposta, como antes (retry do http_client em 429),
+  com --concorrencia threads;
+- despachante: fila persistente + balde de tokens, com o despachante parado
+  no meio (--parar-em) e um novo retomando a mesma fila, como num reinício;
+- dois workers: dois despachantes na mesma fila, cada um com WHATSAPP_TAXA
+  abaixo do stub, mas acima dele somados se o balde não fosse compartilhado.
+
+Reporta entregues/perdidas, 429 recebidos e a vazão, e confere se cada
+destino recebeu o texto completo, na ordem e em partes dentro do limite. Sai
+com código 1 se o despachante perder mensagens, a ordem/limite falhar ou os
+dois workers passarem de WHATSAPP_TAXA juntos.
+
+Uso:
+    python benchmarks/bench_envio_whatsapp.py [--n 200] [--limite-stub 40] [--taxa 60]
+"""
+
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+RAIZ = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(RAIZ))
+
+LIMITE_META = 4096
+
+
+class StubGraph:
+    """Graph API mínimo: balde de tokens próprio, 429/503 e registro do que foi aceito por destino."""
+
+    def __init__(self, limite: float, falhas_5xx: float, latencia: float, semente: int):
+        self.limite = limite
+        self.falhas_5xx = falhas_5xx
+        self.latencia = latencia
+        self.rnd = random.Random(semente)
+        self.lock = threading.Lock()
+        self.tokens = limite
+        self.instante = time.monotonic()
+        self.recebidas = defaultdict(list)  # destino -> corpos aceitos, na ordem
+        self.contagem = defaultdict(int)    # status HTTP -> respostas
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                corpo = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                time.sleep(stub.latencia)
+                status, resposta, extra = stub.responder(corpo)
+                dados = json.dumps(resposta).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(dados)))
+                for k, v in extra.items():
+                    self.send_header(k, v)
+                self.end_headers()
+                self.wfile.write(dados)
+
+            def log_message(self, *args):
+                pass
+
+        self.servidor = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.servidor.daemon_threads = True
+        threading.Thread(target=self.servidor.serve_forever, daemon=True).start()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.servidor.server_address[1]}"
+
+    def responder(self, corpo: dict) -> tuple:
+        with self.lock:
+            agora = time.monotonic()
+            self.tokens = min(self.limite, self.tokens + (agora - self.instante) * self.limite)
+            self.instante = agora
+            texto = corpo["text"]["body"]
+            if len(texto) > LIMITE_META:
+                status, resposta, extra = 400, {"error": {"code": 100, "message": "text too long"}}, {}
+            elif self.tokens < 1:
+                status, resposta, extra = 429, {"error": {"code": 130429, "message": "Rate limit hit"}}, \
+                    {"Retry-After": "1"}
+            elif self.rnd.random() < self.falhas_5xx:
+                status, resposta, extra = 503, {"error": {"code": 2, "message": "Service unavailable"}}, {}
+            else:
+                self.tokens -= 1
+                self.recebidas[corpo["to"]].append(texto)
+                status, resposta, extra = 200, {"messages": [{"id": f"wamid.{self.rnd.randrange(1 << 40)}"}]}, {}
+            self.contagem[status] += 1
+            return status, resposta, extra
+
+    def zerar(self) -> None:
+        with self.lock:
+            self.recebidas.clear()
+            self.contagem.clear()
+            self.tokens = self.limite
+
+
+def gerar_mensagens(n: int, destinos: int, fracao_longas: float, rnd: random.Random) -> list:
+    """[(destino, texto)] com respostas curtas e receitas longas (JSON de dezenas de medicamentos)."""
+    mensagens = []
+    for i in range(n):
+        destino = f"+55119{rnd.randrange(10 ** 8):08d}" if i < destinos else mensagens[rnd.randrange(destinos)][0]
+        if rnd.random() < fracao_longas:
+            medicamentos = [{"nome": f"Medicamento {i}-{k}", "dose": f"{rnd.randint(1, 500)} mg",
+                             "posologia": "Tomar 1 comprimido " + " ".join(["ao dia"] * rnd.randint(1, 20)),
+                             "quantidade": f"{rnd.randint(1, 90)} comprimidos"} for k in range(rnd.randint(30, 120))]
+            texto = f"✅ Receita recebida com sucesso:\n```json\n{json.dumps({'medicamentos': medicamentos}, indent=2, ensure_ascii=False)}\n```"
+        else:
+            texto = f"⚠️ Não identificamos a quantidade para o medicamento: *Medicamento {i}*. Por favor, informe a quantidade."
+        mensagens.append((destino, texto))
+    return mensagens
+
+
+def _normalizar(texto: str) -> str:
+    """Texto sem espaços nem cercas ```: a divisão só mexe nisso."""
+    return "".join(re.sub(r"```\w*", "", texto).split())
+
+
+def conferir(stub: StubGraph, mensagens: list) -> tuple:
+    """(destinos com texto completo e na ordem, total de destinos, maior parte recebida)."""
+    esperado = defaultdict(list)
+    for destino, texto in mensagens:
+        esperado[destino].append(texto)
+    ok = sum(_normalizar("".join(stub.recebidas.get(d, []))) == _normalizar("".join(textos))
+             for d, textos in esperado.items())
+    maior = max((len(t) for corpos in stub.recebidas.values() for t in corpos), default=0)
+    return ok, len(esperado), maior
+
+
+def sem_fila(stub: StubGraph, mensagens: list, concorrencia: int) -> dict:
+    """Comportamento anterior: um POST por resposta na thread do job, exceção = mensagem perdida."""
+    from app.http_client import http_post
+    from app.services import FB_GRAPH, PHONE_NUMBER_ID, WHATSAPP_TOKEN
+
+    def enviar(item):
+        destino, texto = item
+        r = http_post("graph", f"{FB_GRAPH}/{PHONE_NUMBER_ID}/messages",
+                      headers={"Authorization": f"Bearer {WHATSAPP_TOKEN}"},
+                      json={"messaging_product": "whatsapp", "to": destino, "type": "text", "text": {"body": texto}})
+        return r.ok
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(concorrencia) as pool:
+        entregues = sum(pool.map(enviar, mensagens))
+    return {"entregues": entregues, "segundos": time.perf_counter() - inicio}
+
+
+def com_despachante(stub: StubGraph, mensagens: list, args, caminho: str) -> dict:
+    from app.envio import Despachante, FilaEnvios
+
+    def novo():
+        return Despachante(FilaEnvios(caminho), concorrencia=args.concorrencia, taxa=args.taxa, rajada=args.taxa,
+                           backoff=0.2, backoff_max=2.0, tentativas=args.tentativas)
+
+    inicio = time.perf_counter()
+    despachante = novo()
+    for destino, texto in mensagens:
+        despachante.enviar(destino, texto)
+    enfileirar_ms = (time.perf_counter() - inicio) * 1000
+    time.sleep(args.parar_em)
+    despachante.encerrar()  # "reinício": o que estava em andamento volta para a fila
+    na_fila = despachante.fila.estatisticas()["pendentes"]
+    despachante = novo()
+    completo = despachante.aguardar(timeout=args.timeout)
+    segundos = time.perf_counter() - inicio
+    estatisticas = despachante.fila.estatisticas()
+    despachante.encerrar()
+    return {"entregues": estatisticas["enviadas_total"], "segundos": segundos, "completo": completo,
+            "enfileirar_ms": enfileirar_ms, "na_fila_no_reinicio": na_fila, **estatisticas}
+
+
+def dois_workers(stub: StubGraph, mensagens: list, args, caminho: str) -> dict:
+    """Dois despachantes (como dois workers do gunicorn) dividindo a fila e o balde do número."""
+    from app.envio import Despachante, FilaEnvios
+
+    taxa = args.limite_stub * 0.8
+    despachantes = [Despachante(FilaEnvios(caminho), concorrencia=args.concorrencia, taxa=taxa, rajada=taxa,
+                                backoff=0.2, backoff_max=2.0, tentativas=args.tentativas) for _ in range(2)]
+    inicio = time.perf_counter()
+    for i, (destino, texto) in enumerate(mensagens):
+        despachantes[i % 2].enviar(destino, texto)
+    completo = all(d.aguardar(timeout=args.timeout) for d in despachantes)
+    segundos = time.perf_counter() - inicio
+    for d in despachantes:
+        d.encerrar()
+    return {"taxa": taxa, "segundos": segundos, "completo": completo}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--n", type=int, default=200, help="respostas na rajada")
+    parser.add_argument("--destinos", type=int, default=40)
+    parser.add_argument("--longas", type=float, default=0.2, help="fração de receitas longas (várias partes)")
+    parser.add_argument("--limite-stub", type=float, default=40.0, help="mensagens/s aceitas pelo stub")
+    parser.add_argument("--falhas-5xx", type=float, default=0.03)
+    parser.add_argument("--latencia", type=float, default=0.02, help="s por requisição no stub")
+    parser.add_argument("--taxa", type=float, default=60.0, help="WHATSAPP_TAXA do despachante (acima do stub força 429)")
+    parser.add_argument("--concorrencia", type=int, default=8)
+    parser.add_argument("--tentativas", type=int, default=20)
+    parser.add_argument("--parar-em", type=float, default=1.0, help="s até o reinício do despachante")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--semente", type=int, default=21)
+    args = parser.parse_args()
+
+    stub = StubGraph(args.limite_stub, args.falhas_5xx, args.latencia, args.semente)
+    os.environ.update({"FB_GRAPH": stub.url, "PHONE_NUMBER_ID": "123456789", "WHATSAPP_TOKEN": "token-bench",
+                       "HTTP_RETRY_AFTER_MAX": "2", "LOG_NIVEL": "ERROR"})
+    mensagens = gerar_mensagens(args.n, args.destinos, args.longas, random.Random(args.semente))
+    longas = sum(len(t) > LIMITE_META for _, t in mensagens)
+    print(f"{args.n} respostas para {args.destinos} destinos ({longas} acima de {LIMITE_META} caracteres); "
+          f"stub aceita {args.limite_stub:g}/s, {args.falhas_5xx:.0%} de 503\n")
+
+    antes = sem_fila(stub, mensagens, args.concorrencia)
+    ok, total, _ = conferir(stub, mensagens)
+    print(f"sem fila:    {antes['entregues']}/{args.n} entregues, {args.n - antes['entregues']} perdidas, "
+          f"{stub.contagem[429]} respostas 429, {antes['segundos']:.1f} s; destinos completos {ok}/{total}")
+
+    stub.zerar()
+    with tempfile.TemporaryDirectory() as tmp:
+        depois = com_despachante(stub, mensagens, args, str(Path(tmp) / "envios.sqlite3"))
+    ok, total, maior = conferir(stub, mensagens)
+    partes = sum(len(c) for c in stub.recebidas.values())
+    print(f"despachante: {depois['entregues']}/{args.n} entregues ({partes} partes), {depois['falharam']} falharam, "
+          f"{stub.contagem[429]} respostas 429, {stub.contagem[503]} 503, {depois['reagendadas_total']} reagendadas, "
+          f"{depois['segundos']:.1f} s ({partes / depois['segundos']:.1f} partes/s)")
+    print(f"             enfileirar {args.n} respostas: {depois['enfileirar_ms']:.0f} ms; "
+          f"{depois['na_fila_no_reinicio']} na fila no reinício; destinos completos e em ordem {ok}/{total}; "
+          f"maior parte {maior} caracteres")
+
+    curtas = [(d, t) for d, t in mensagens if len(t) <= LIMITE_META]
+    stub.zerar()
+    with tempfile.TemporaryDirectory() as tmp:
+        dois = dois_workers(stub, curtas, args, str(Path(tmp) / "envios.sqlite3"))
+    partes = sum(len(c) for c in stub.recebidas.values())
+    vazao = (partes - dois["taxa"]) / dois["segundos"]  # sem a rajada inicial do balde cheio
+    print(f"dois workers: {partes}/{len(curtas)} entregues a {vazao:.1f}/s depois da rajada "
+          f"(WHATSAPP_TAXA {dois['taxa']:g}/s somando os dois), {stub.contagem[429]} respostas 429")
+
+    problemas = []
+    if not dois["completo"] or partes < len(curtas):
+        problemas.append(f"dois workers entregaram {partes}/{len(curtas)}")
+    if vazao > dois["taxa"] * 1.1 or stub.contagem[429]:
+        problemas.append(f"dois workers: {vazao:.1f}/s e {stub.contagem[429]} respostas 429 com "
+                         f"WHATSAPP_TAXA {dois['taxa']:g}/s (balde não compartilhado?)")
+    if not depois["completo"] or depois["entregues"] < args.n:
+        problemas.append(f"despachante entregou {depois['entregues']}/{args.n}")
+    if ok < total:
+        problemas.append(f"{total - ok} destinos com texto incompleto ou fora de ordem")
+    if maior > LIMITE_META:
+        problemas.append(f"parte com {maior} caracteres (limite {LIMITE_META})")
+    for problema in problemas:
+        print(f"❌ {problema}")
+    if problemas:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
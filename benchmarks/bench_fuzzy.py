@@ -0,0 +1,101 @@
+"""
+Benchmark do corretor aproximado (IndiceFuzzy) para dicionários de 1k a 50k palavras.
+
+Para cada tamanho: tempo de construção, número de chaves de deleção,
+latência média por palavra (palavras com 1-2 erros de OCR, palavras corretas
+e palavras sem correspondência) e a taxa de acerto da correção. Para tamanhos
+pequenos compara com a busca ingênua (distância contra todas as palavras).
+
+Uso:
+    python benchmarks/bench_fuzzy.py [--tamanhos 1000,5000,20000,50000]
+"""
+
+import argparse
+import csv
+import random
+import sys
+import time
+from pathlib import Path
+
+RAIZ = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(RAIZ))
+
+from app.principios import IndiceFuzzy, distancia_edicao, limite_por_tamanho, sem_acentos, _RE_PALAVRA  # noqa: E402
+
+# Trocas típicas do OCR
+CONFUSOES = {"i": "l", "l": "i", "o": "0", "e": "c", "c": "e", "n": "m", "m": "n", "u": "v", "rn": "m"}
+
+
+def vocabulario_real() -> list:
+    with open(RAIZ / "app" / "principios_ativos.csv", newline="", encoding="utf-8") as f:
+        palavras = {w for row in csv.reader(f) if row and row[0]
+                    for w in _RE_PALAVRA.findall(sem_acentos(row[0].lower()))}
+    return sorted(w for w in palavras if len(w) > 4)
+
+
+def gerar_dicionario(reais: list, tamanho: int, rnd: random.Random) -> list:
+    palavras = set(reais[:tamanho])
+    silabas = [c + v for c in "bcdfglmnprstvxz" for v in "aeiou"] + ["pro", "tri", "cla", "fen", "dol", "ina"]
+    while len(palavras) < tamanho:
+        palavras.add("".join(rnd.choice(silabas) for _ in range(rnd.randint(3, 6))))
+    return sorted(palavras)
+
+
+def estragar(palavra: str, rnd: random.Random, erros: int) -> str:
+    for _ in range(erros):
+        i = rnd.randrange(len(palavra))
+        c = palavra[i]
+        troca = CONFUSOES.get(c) or rnd.choice("abcdefghijklmnopqrstuvwxyz")
+        palavra = palavra[:i] + troca + palavra[i + 1:]
+    return palavra
+
+
+def ingenuo(dicionario: list, palavra: str, max_distancia: int):
+    limite = limite_por_tamanho(palavra, max_distancia)
+    melhores = [(distancia_edicao(palavra, w, limite), w) for w in dicionario]
+    dist, w = min(melhores)
+    return w if dist <= limite else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--tamanhos", default="1000,5000,20000,50000")
+    parser.add_argument("--consultas", type=int, default=500)
+    parser.add_argument("--max-distancia", type=int, default=2)
+    args = parser.parse_args()
+
+    rnd = random.Random(3)
+    reais = vocabulario_real()
+    print(f"{'palavras':>9} {'build(s)':>9} {'chaves':>9} {'µs/palavra':>11} {'acerto':>7} {'ingênuo µs':>11}")
+    for tamanho in (int(t) for t in args.tamanhos.split(",")):
+        dicionario = gerar_dicionario(reais, tamanho, rnd)
+        inicio = time.perf_counter()
+        indice = IndiceFuzzy(dicionario, max_distancia=args.max_distancia)
+        t_build = time.perf_counter() - inicio
+
+        alvos = [w for w in rnd.sample(dicionario, min(args.consultas, len(dicionario))) if len(w) >= 9]
+        consultas = [(estragar(w, rnd, rnd.choice([1, 2])), w) for w in alvos]
+        consultas += [(w, None) for w in alvos[:len(alvos) // 4]]  # já corretas
+        consultas += [("qwxzkjhv" + w[:3], None) for w in alvos[:len(alvos) // 4]]  # sem correspondência
+
+        inicio = time.perf_counter()
+        resultados = [indice.corrigir_palavra(q) for q, _ in consultas]
+        t_consulta = (time.perf_counter() - inicio) / len(consultas)
+        # acerto: o original volta (ou outra palavra à mesma distância, que o OCR não permite distinguir)
+        corretos = sum(1 for (q, esperado), r in zip(consultas, resultados)
+                       if r == esperado or (esperado and r and distancia_edicao(q, r, 2) <= distancia_edicao(q, esperado, 2)))
+
+        t_ingenuo = float("nan")
+        if tamanho <= 5000:
+            amostra = consultas[:50]
+            inicio = time.perf_counter()
+            for q, _ in amostra:
+                ingenuo(dicionario, q, args.max_distancia)
+            t_ingenuo = (time.perf_counter() - inicio) / len(amostra) * 1e6
+
+        print(f"{tamanho:>9} {t_build:>9.2f} {len(indice.deletes):>9} {t_consulta * 1e6:>11.1f} "
+              f"{corretos / len(consultas):>7.2%} {t_ingenuo:>11.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+Benchmark do cliente HTTP compartilhado (app/http_client.py).
+
+Sobe um servidor stub local que conta as conexões TCP aceitas e compara,
+sob carga contínua com várias threads:
+- requests.get "solto" (uma conexão nova por chamada, como antes);
+- http_get com sessão em pool e keep-alive.
+
+Também verifica o retry em 429 respeitando Retry-After.
+
+Uso:
+    python benchmarks/bench_http_client.py [--requisicoes 400] [--threads 8]
+"""
+
+import argparse
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import requests
+
+RAIZ = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(RAIZ))
+
+from app import http_client  # noqa: E402
+
+
+class ServidorStub(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), _Handler)
+        self.conexoes = 0
+        self.respostas_429 = 0
+        self._lock = threading.Lock()
+
+    def process_request(self, request, client_address):
+        with self._lock:
+            self.conexoes += 1
+        super().process_request(request, client_address)
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+    disable_nagle_algorithm = True  # cabeçalho e corpo saem em writes separados
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.startswith("/throttle"):
+            with self.server._lock:
+                self.server.respostas_429 += 1
+                primeira = self.server.respostas_429 == 1
+            if primeira:
+                self.send_response(429)
+                self.send_header("Retry-After", "1")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+        corpo = b'{"ok": true}'
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(corpo)))
+        self.end_headers()
+        self.wfile.write(corpo)
+
+
+def carga(servidor, func, requisicoes: int, threads: int) -> tuple:
+    servidor.conexoes = 0
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(threads) as pool:
+        list(pool.map(lambda _: func(f"{servidor.url}/ok").raise_for_status(), range(requisicoes)))
+    return time.perf_counter() - inicio, servidor.conexoes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requisicoes", type=int, default=400)
+    parser.add_argument("--threads", type=int, default=8)
+    args = parser.parse_args()
+
+    servidor = ServidorStub()
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+
+    t_solto, c_solto = carga(servidor, lambda u: requests.get(u, timeout=(5, 30)), args.requisicoes, args.threads)
+    t_pool, c_pool = carga(servidor, lambda u: http_client.http_get("bench", u), args.requisicoes, args.threads)
+    print(f"{'modo':>10} {'req/s':>8} {'conexões TCP':>13}")
+    print(f"{'solto':>10} {args.requisicoes / t_solto:>8.0f} {c_solto:>13}")
+    print(f"{'pool':>10} {args.requisicoes / t_pool:>8.0f} {c_pool:>13}")
+
+    inicio = time.perf_counter()
+    resp = http_client.http_get("bench", f"{servidor.url}/throttle")
+    espera = time.perf_counter() - inicio
+    print(f"429 + Retry-After: 1 → status final {resp.status_code} após {espera:.2f}s")
+    print(http_client.estatisticas())
+    servidor.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Micro-benchmark: busca de princípios ativos no texto do OCR.
+
+Compara o laço antigo (um re.findall por princípio) com o IndicePrincipios
+para bases de tamanhos crescentes e confere que os resultados são iguais.
+
+Uso:
+    python benchmarks/bench_indice_principios.py [--tamanhos 500,2000,8000] [--repeticoes 20]
+"""
+
+import argparse
+import csv
+import random
+import re
+import sys
+import time
+from pathlib import Path
+
+RAIZ = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(RAIZ))
+
+from app.principios import IndicePrincipios, UNIDADES, PADRAO_NUMERO  # noqa: E402
+
+CSV_PRINCIPIOS = RAIZ / "app" / "principios_ativos.csv"
+
+
+def buscar_laco_antigo(principios, texto: str) -> list:
+    """Implementação original de encontrar_todos_os_medicamentos (parte do CSV)."""
+    encontrados = []
+    for p in principios:
+        regex_principio = rf"({re.escape(p)}\s+{PADRAO_NUMERO}\s?{UNIDADES})\b"
+        encontrados.extend(re.findall(regex_principio, texto, re.IGNORECASE))
+    return encontrados
+
+
+def carregar_csv() -> list:
+    with open(CSV_PRINCIPIOS, newline="", encoding="utf-8") as f:
+        return sorted({row[0].strip().lower() for row in csv.reader(f) if row and row[0]})
+
+
+def gerar_base(reais: list, tamanho: int, rnd: random.Random) -> list:
+    """Completa a base real com nomes sintéticos até o tamanho pedido."""
+    base = set(reais[:tamanho])
+    silabas = ["ca", "li", "to", "me", "ri", "na", "zo", "xa", "pro", "ben", "fen", "dol"]
+    while len(base) < tamanho:
+        base.add("".join(rnd.choice(silabas) for _ in range(rnd.randint(3, 6))))
+    return sorted(base)
+
+
+def gerar_texto(base: list, rnd: random.Random, n_meds: int = 6) -> str:
+    linhas = ["PACIENTE: Maria Oliveira", "CPF: 123.456.789-01", "CRM: RS 47384"]
+    for p in rnd.sample(base, min(n_meds, len(base))):
+        dose = rnd.choice(["500mg", "50 mg", "1g/ml", "2,5mg", "10%", "200 mcg"])
+        linhas.append(f"{p.title()} {dose}")
+        linhas.append("Tomar 1 comprimido 2x ao dia por 10 dias")
+    linhas.append("Porto Alegre, 08 de Abril de 2020")
+    return "\n".join(linhas)
+
+
+def cronometrar(func, repeticoes: int) -> float:
+    inicio = time.perf_counter()
+    for _ in range(repeticoes):
+        func()
+    return (time.perf_counter() - inicio) / repeticoes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--tamanhos", default="250,1000,2000,8000")
+    parser.add_argument("--repeticoes", type=int, default=20)
+    args = parser.parse_args()
+
+    rnd = random.Random(42)
+    reais = carregar_csv()
+    print(f"{'princípios':>10} {'índice(ms)':>11} {'build(ms)':>10} {'laço(ms)':>10} {'ganho':>7}")
+    for tamanho in (int(t) for t in args.tamanhos.split(",")):
+        base = gerar_base(reais, tamanho, rnd)
+        textos = [gerar_texto(base, rnd) for _ in range(5)]
+
+        inicio = time.perf_counter()
+        indice = IndicePrincipios(base)
+        t_build = time.perf_counter() - inicio
+
+        for texto in textos:
+            assert sorted(indice.encontrar(texto)) == sorted(buscar_laco_antigo(base, texto)), texto
+
+        t_indice = cronometrar(lambda: [indice.encontrar(t) for t in textos], args.repeticoes) / len(textos)
+        t_laco = cronometrar(lambda: [buscar_laco_antigo(base, t) for t in textos], max(1, args.repeticoes // 5)) / len(textos)
+        print(f"{tamanho:>10} {t_indice * 1000:>11.3f} {t_build * 1000:>10.1f} {t_laco * 1000:>10.2f} {t_laco / t_indice:>6.0f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Modo job do webhook (JOBS_ATIVO=1) de ponta a ponta contra um Graph local.
+
+Sobe o stub do Graph de bench_envio_whatsapp.py, cria o app com um pool
+pequeno (--workers, --fila) e dispara uma rajada de --n mensagens com mídia
+no /webhook-whatsapp. O processamento (download + OCR) é um sleep de
+--processamento s que devolve um texto por remetente. Confere que:
+- as mensagens aceitas respondem ao Twilio na hora com TwiML vazio, e cada
+  remetente aceito recebe pelo Graph exatamente uma resposta, a da sua receita;
+- as recusadas com a fila cheia (FilaCheia) recebem o aviso no TwiML e nada
+  pelo Graph, e aparecem em receitas_jobs_rejeitados_total.
+Reporta a latência do webhook e sai com código 1 se algo não conferir.
+
+Uso:
+    python benchmarks/bench_jobs.py [--n 20] [--workers 2] [--fila 4] [--processamento 0.3]
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+RAIZ = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(RAIZ))
+
+from bench_envio_whatsapp import StubGraph  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--n", type=int, default=20, help="mensagens com mídia na rajada")
+    parser.add_argument("--workers", type=int, default=2, help="JOBS_WORKERS")
+    parser.add_argument("--fila", type=int, default=4, help="JOBS_FILA_MAX")
+    parser.add_argument("--processamento", type=float, default=0.3, help="s de download + OCR simulados")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    args = parser.parse_args()
+
+    stub = StubGraph(limite=1000, falhas_5xx=0.0, latencia=0.005, semente=2)
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ.update({
+            "JOBS_ATIVO": "1", "JOBS_WORKERS": str(args.workers), "JOBS_FILA_MAX": str(args.fila),
+            "JOBS_BACKPRESSURE": "rejeitar", "FB_GRAPH": stub.url, "PHONE_NUMBER_ID": "123456789",
+            "WHATSAPP_TOKEN": "token-bench", "WHATSAPP_ENVIO_DB": str(Path(tmp) / "envios.sqlite3"),
+            "DEDUP_DB": str(Path(tmp) / "dedup.sqlite3"), "ARQUIVAR_RECEITAS": "0", "LOG_NIVEL": "ERROR"})
+        from app import create_app, routes
+        from app.envio import obter_despachante
+        from app.jobs import obter_pool
+        from app.metricas import REGISTRO
+
+        def processar_simulado(sender, media_url):
+            time.sleep(args.processamento)
+            return f"✅ Receita de {sender} processada ({media_url})"
+
+        routes.processar_receita = processar_simulado
+        cliente = create_app().test_client()
+
+        def postar(i):
+            sender = f"whatsapp:+55119{i:08d}"
+            inicio = time.perf_counter()
+            resposta = cliente.post("/webhook-whatsapp", data={
+                "From": sender, "Body": "", "MessageSid": f"SM{i:032d}", "MediaUrl0": f"https://midia/{i}"})
+            corpo = resposta.get_data(as_text=True)
+            return sender, "muitas receitas" in corpo, "<Message" in corpo, (time.perf_counter() - inicio) * 1000
+
+        with ThreadPoolExecutor(args.n) as pool:
+            resultados = list(pool.map(postar, range(args.n)))
+        obter_pool().aguardar()
+        entregue = obter_despachante().aguardar(timeout=args.timeout)
+        metricas = REGISTRO.exportar()
+
+    aceitos = [s for s, recusado, _, _ in resultados if not recusado]
+    recusados = [s for s, recusado, _, _ in resultados if recusado]
+    latencias = sorted(ms for *_, ms in resultados)
+    print(f"{args.n} mensagens, {args.workers} workers, fila de {args.fila}: "
+          f"{len(aceitos)} aceitas, {len(recusados)} recusadas com a fila cheia")
+    print(f"webhook: p50 {statistics.median(latencias):.1f} ms, máx {latencias[-1]:.1f} ms "
+          f"(processamento de {args.processamento * 1000:.0f} ms fora da requisição)")
+    print(f"Graph: {sum(len(c) for c in stub.recebidas.values())} mensagens para {len(stub.recebidas)} destinos")
+
+    problemas = []
+    if not entregue:
+        problemas.append("fila de envio não esvaziou")
+    if not recusados:
+        problemas.append("nenhuma recusa: aumente --n ou diminua --fila para exercitar a FilaCheia")
+    if any(vazio for s, recusado, vazio, _ in resultados if not recusado):
+        problemas.append("mensagem aceita respondeu com texto no TwiML")
+    for sender in aceitos:
+        destino = routes.destino_e164(sender)
+        if stub.recebidas.get(destino) != [f"✅ Receita de {sender} processada (https://midia/{int(sender[-8:])})"]:
+            problemas.append(f"{destino}: Graph recebeu {stub.recebidas.get(destino)}")
+    for sender in recusados:
+        if routes.destino_e164(sender) in stub.recebidas:
+            problemas.append(f"{sender}: recusado, mas recebeu resposta pelo Graph")
+    if f"receitas_jobs_rejeitados_total {len(recusados)}" not in metricas:
+        problemas.append("receitas_jobs_rejeitados_total não confere com as recusas")
+    for problema in problemas:
+        print(f"❌ {problema}")
+    if problemas:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
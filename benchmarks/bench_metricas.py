@@ -0,0 +1,93 @@
+"""
+Custo da instrumentação (app/metricas.py e app/log.py) por receita.
+
+Mede, na thread que atende a requisição:
+- um span (with etapa(...)) com a observação no histograma;
+- um contador (contar_cache);
+- um evento de log estruturado (só o enfileiramento; a formatação e a escrita
+  ficam na thread escritora), comparado com o print() que ele substituiu,
+  escrevendo em um pipe lido por outro processo;
+- a exportação do /metrics.
+
+Com a quantidade de spans, contadores e eventos de uma receita (padrões abaixo,
+contados no caminho imagem → OCR → parsing → resposta), calcula o custo por
+receita e sai com código 1 se passar de --orcamento-us.
+
+Uso:
+    python benchmarks/bench_metricas.py [--orcamento-us 100] [--spans 10] [--eventos 4] [--contadores 2]
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+RAIZ = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(RAIZ))
+
+from app import log, metricas  # noqa: E402
+
+
+def por_chamada_us(func, n: int) -> float:
+    inicio = time.perf_counter()
+    for _ in range(n):
+        func()
+    return (time.perf_counter() - inicio) / n * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--n", type=int, default=100_000)
+    parser.add_argument("--spans", type=int, default=10, help="etapas medidas por receita")
+    parser.add_argument("--eventos", type=int, default=4, help="eventos de log por receita")
+    parser.add_argument("--contadores", type=int, default=2, help="contadores por receita")
+    parser.add_argument("--orcamento-us", type=float, default=100.0, help="custo máximo por receita (µs)")
+    args = parser.parse_args()
+
+    # Logs e prints vão para um pipe lido por outro processo, como um terminal/coletor de logs
+    leitor = subprocess.Popen(["cat"], stdin=subprocess.PIPE, stdout=subprocess.DEVNULL)
+    saida = os.fdopen(leitor.stdin.fileno(), "w", buffering=1, closefd=False)
+    sys.stdout, original = saida, sys.stdout
+    log.LOG_FILA_MAX = args.n * 2  # sem descartes durante a medição
+
+    vazio = por_chamada_us(lambda: None, args.n)
+
+    def span():
+        with metricas.etapa("bench"):
+            pass
+
+    t_span = por_chamada_us(span, args.n) - vazio
+    t_contador = por_chamada_us(lambda: metricas.contar_cache("bench", True), args.n) - vazio
+    t_evento = por_chamada_us(lambda: log.evento("bench", etapa="ocr", bytes=12345), args.n) - vazio
+    t_print = por_chamada_us(lambda: print("✅ bench etapa=ocr bytes=12345"), args.n) - vazio
+    t_depuracao = por_chamada_us(lambda: log.depuracao("bench", texto="..."), args.n) - vazio
+    log.parar()  # escreve o que ficou na fila antes de devolver o stdout
+    sys.stdout = original
+
+    for i in range(30):  # ~30 etapas × 16 buckets, como um processo em produção
+        metricas.DURACAO_ETAPAS.observar(0.01, etapa=f"etapa{i}")
+    inicio = time.perf_counter()
+    texto = metricas.REGISTRO.exportar()
+    t_exportar = (time.perf_counter() - inicio) * 1000
+
+    por_receita = args.spans * t_span + args.eventos * t_evento + args.contadores * t_contador
+    print(f"span (etapa):          {t_span:7.2f} µs")
+    print(f"contador:              {t_contador:7.2f} µs")
+    print(f"evento de log:         {t_evento:7.2f} µs  (print() equivalente: {t_print:.2f} µs)")
+    print(f"evento abaixo do nível:{t_depuracao:7.2f} µs")
+    print(f"/metrics:              {t_exportar:7.2f} ms  ({len(texto.splitlines())} linhas)")
+    print(f"por receita ({args.spans} spans, {args.eventos} eventos, {args.contadores} contadores): "
+          f"{por_receita:.1f} µs (orçamento {args.orcamento_us:g} µs)")
+
+    saida.close()
+    leitor.stdin.close()
+    leitor.wait()
+    if por_receita > args.orcamento_us:
+        print("❌ acima do orçamento")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
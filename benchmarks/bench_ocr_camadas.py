@@ -0,0 +1,173 @@
+"""
+Benchmark do OCR em camadas (app/ocr.py), sem rede: o Azure é um stub local.
+
+Cada receita do corpus de fixtures (benchmarks/fixtures/receitas) vira uma
+imagem; o stub do Azure devolve a resposta gravada na fixture (com latência
+configurável). O motor local é:
+- "simulado" (padrão): devolve as linhas da fixture com confiança sorteada e,
+  em parte dos casos, linhas perdidas — exercita as duas regras de escalada;
+- "tesseract": o MotorTesseract de verdade (exige o binário tesseract + "por").
+
+Compara "só Azure" com "camadas": chamadas ao Azure, tempo total, taxa e
+motivos de escalada, latência por motor e acerto em relação ao esperado. Sai
+com código 1 se o acerto das camadas ficar abaixo do "só Azure" (menos
+--tolerancia): economizar chamadas devolvendo extrações erradas não conta.
+
+Uso:
+    python benchmarks/bench_ocr_camadas.py [--local simulado|tesseract] [--leituras 200]
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+RAIZ = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(RAIZ))
+os.environ.setdefault("LOG_NIVEL", "WARNING")  # um "ocr_escalado" por leitura esconderia a tabela
+
+from app import services  # noqa: E402
+from app.ocr import MotorAzure, MotorTesseract, OCRCamadas, ResultadoOCR  # noqa: E402
+from app.parser_receita import linhas_do_resultado_azure  # noqa: E402
+
+FIXTURES = Path(__file__).resolve().parent / "fixtures" / "receitas"
+
+
+class AzureStub(ThreadingHTTPServer):
+    """Responde ao POST do vision/v3.2/ocr com a fixture correspondente ao hash da imagem."""
+
+    daemon_threads = True
+
+    def __init__(self, respostas: dict, latencia: float):
+        super().__init__(("127.0.0.1", 0), _Handler)
+        self.respostas = respostas
+        self.latencia = latencia
+        self.chamadas = 0
+        self._lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        corpo = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        with self.server._lock:
+            self.server.chamadas += 1
+        time.sleep(self.server.latencia)
+        resposta = self.server.respostas.get(hashlib.sha256(corpo).hexdigest())
+        dados = json.dumps(resposta or {"regions": []}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(dados)))
+        self.end_headers()
+        self.wfile.write(dados)
+
+
+class MotorLocalSimulado:
+    """Stand-in do Tesseract: linhas da fixture, confiança sorteada, às vezes linhas perdidas."""
+
+    nome = "tesseract"
+
+    def __init__(self, linhas_por_imagem: dict, latencia: float, rnd: random.Random):
+        self.linhas_por_imagem = linhas_por_imagem
+        self.latencia = latencia
+        self.rnd = rnd
+
+    def ler(self, image_data: bytes) -> ResultadoOCR:
+        time.sleep(self.latencia)
+        linhas = self.linhas_por_imagem[hashlib.sha256(image_data).hexdigest()]
+        sorteio = self.rnd.random()
+        if sorteio < 0.15:  # foto ruim: confiança baixa
+            return ResultadoOCR(linhas, self.rnd.uniform(0.4, 0.75))
+        if sorteio < 0.30:  # metade das linhas perdida, confiança boa
+            return ResultadoOCR(linhas[::2], self.rnd.uniform(0.85, 0.95))
+        return ResultadoOCR(linhas, self.rnd.uniform(0.85, 0.98))
+
+
+def renderizar(linhas: list):
+    """Imagem simples (texto preto sobre branco) com as linhas da fixture, para o Tesseract."""
+    img = np.full((80 + 60 * len(linhas), 1800, 3), 255, dtype=np.uint8)
+    for i, linha in enumerate(linhas):
+        cv2.putText(img, linha.texto, (40, 60 + 60 * i), cv2.FONT_HERSHEY_SIMPLEX, 1.0, (0, 0, 0), 2, cv2.LINE_AA)
+    return services.codificar_jpeg(img)
+
+
+def normalizar(dados: dict) -> dict:
+    return {**dados, "medicamentos": sorted(dados["medicamentos"], key=lambda m: m["nome"])}
+
+
+def extrair(ocr: OCRCamadas, imagem: bytes) -> dict:
+    linhas = ocr.ler(imagem, avaliar=services._completude_ocr)
+    textos = services.MOTOR_CORRECOES.aplicar_linhas([l.texto for l in linhas])
+    return normalizar(services.PARSER_RECEITA.analisar([l._replace(texto=t) for l, t in zip(linhas, textos)]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--local", choices=("simulado", "tesseract"), default="simulado")
+    parser.add_argument("--leituras", type=int, default=200)
+    parser.add_argument("--latencia-azure", type=float, default=0.05, help="segundos por chamada ao stub")
+    parser.add_argument("--latencia-local", type=float, default=0.01, help="segundos por leitura simulada")
+    parser.add_argument("--tolerancia", type=float, default=0.0, help="perda de acerto aceita nas camadas (0-1)")
+    args = parser.parse_args()
+    rnd = random.Random(14)
+
+    corpus = []  # (imagem, esperado)
+    respostas, linhas_por_imagem = {}, {}
+    for caminho in sorted(FIXTURES.glob("*.json")):
+        dados = json.loads(caminho.read_text(encoding="utf-8"))
+        linhas = linhas_do_resultado_azure(dados["azure"])
+        imagem = renderizar(linhas) if args.local == "tesseract" else caminho.stem.encode()
+        chave = hashlib.sha256(imagem).hexdigest()
+        respostas[chave] = dados["azure"]
+        linhas_por_imagem[chave] = linhas
+        corpus.append((imagem, dados["esperado"]))
+
+    stub = AzureStub(respostas, args.latencia_azure)
+    threading.Thread(target=stub.serve_forever, daemon=True).start()
+    azure = MotorAzure(endpoint=stub.url, chave="stub")
+    local = (MotorTesseract() if args.local == "tesseract"
+             else MotorLocalSimulado(linhas_por_imagem, args.latencia_local, rnd))
+    leituras = [corpus[i % len(corpus)] for i in range(args.leituras)]
+
+    print(f"{'modo':<12} {'tempo (s)':>10} {'chamadas Azure':>15} {'acerto':>8}")
+    acerto = {}
+    for nome, ocr in (("só azure", OCRCamadas([azure])),
+                      ("camadas", OCRCamadas([local, azure], confianca_min=services.OCR_CONFIANCA_MIN,
+                                             completude_min=services.OCR_COMPLETUDE_MIN))):
+        stub.chamadas = 0
+        inicio = time.perf_counter()
+        acertos = sum(extrair(ocr, imagem) == esperado for imagem, esperado in leituras)
+        tempo = time.perf_counter() - inicio
+        acerto[nome] = acertos / len(leituras)
+        print(f"{nome:<12} {tempo:>10.2f} {stub.chamadas:>15} {acertos / len(leituras):>8.1%}")
+        if nome == "camadas":
+            print(json.dumps(ocr.metricas.estatisticas(), indent=2, ensure_ascii=False))
+    if isinstance(local, MotorTesseract):
+        local.fechar()
+    stub.shutdown()
+    if acerto["camadas"] < acerto["só azure"] - args.tolerancia:
+        print(f"❌ camadas acertam {acerto['camadas']:.1%}, abaixo do só Azure ({acerto['só azure']:.1%}): "
+              f"aumente OCR_COMPLETUDE_MIN/OCR_CONFIANCA_MIN")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
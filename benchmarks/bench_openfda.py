@@ -0,0 +1,201 @@
+"""
+Cache do OpenFDA (app/openfda.py) contra um OpenFDA local.
+
+Sobe um stub de /drug/label.json (search=generic_name:<nome>) que responde
+200 para os nomes conhecidos, 404 ("sem resultados") para os demais e 500
+para os que começam com "falha", com --latencia s por consulta, contando as
+consultas por nome e o pico de consultas simultâneas. Confere:
+- lote frio: cada nome distinto (após normalizar) consultado uma vez, em
+  paralelo até OPENFDA_CONCORRENCIA, e as falhas fora do cache;
+- lote quente: nenhuma consulta além das falhas, hits e hits negativos contados;
+- TTL: o "não encontrado" expira em --ttl-negativo s e o encontrado em --ttl s;
+- aquecimento: nomes carregados de um dump drug-label (.json.zip) não geram consultas;
+- contadores: hits somados sem perdas com --threads chamando buscar_openfda_lote.
+Sai com código 1 se algo não conferir.
+
+Uso:
+    python benchmarks/bench_openfda.py [--nomes 40] [--concorrencia 4] [--latencia 0.05]
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import zipfile
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+
+RAIZ = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(RAIZ))
+
+
+class StubOpenFDA:
+    """OpenFDA mínimo: {generic_name: brand_name} conhecidos, consultas por nome e pico de simultâneas."""
+
+    def __init__(self, conhecidos: dict, latencia: float):
+        self.conhecidos = conhecidos
+        self.latencia = latencia
+        self.lock = threading.Lock()
+        self.consultas = Counter()
+        self.em_andamento = 0
+        self.pico = 0
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                busca = parse_qs(urlparse(self.path).query)["search"][0]
+                nome = busca.split(":", 1)[1]
+                with stub.lock:
+                    stub.consultas[nome] += 1
+                    stub.em_andamento += 1
+                    stub.pico = max(stub.pico, stub.em_andamento)
+                time.sleep(stub.latencia)
+                with stub.lock:
+                    stub.em_andamento -= 1
+                if nome.startswith("falha"):
+                    status, corpo = 500, {"error": {"code": "SERVER_ERROR"}}
+                elif nome in stub.conhecidos:
+                    status, corpo = 200, {"results": [{"openfda": {"brand_name": [stub.conhecidos[nome]],
+                                                                   "generic_name": [nome.upper()]}}]}
+                else:
+                    status, corpo = 404, {"error": {"code": "NOT_FOUND", "message": "No matches found!"}}
+                dados = json.dumps(corpo).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(dados)))
+                self.end_headers()
+                self.wfile.write(dados)
+
+            def log_message(self, *args):
+                pass
+
+        self.servidor = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.servidor.daemon_threads = True
+        threading.Thread(target=self.servidor.serve_forever, daemon=True).start()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.servidor.server_address[1]}/drug/label.json"
+
+    def zerar(self) -> None:
+        with self.lock:
+            self.consultas.clear()
+            self.pico = 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--nomes", type=int, default=40, help="nomes distintos no lote (3/4 conhecidos)")
+    parser.add_argument("--falhas", type=int, default=4, help="nomes que o stub responde com 500")
+    parser.add_argument("--concorrencia", type=int, default=4, help="OPENFDA_CONCORRENCIA")
+    parser.add_argument("--latencia", type=float, default=0.05, help="s por consulta no stub")
+    parser.add_argument("--ttl", type=float, default=1.0)
+    parser.add_argument("--ttl-negativo", type=float, default=0.4, help="menor que --ttl / 2")
+    parser.add_argument("--threads", type=int, default=16, help="threads no teste dos contadores")
+    parser.add_argument("--lotes", type=int, default=200, help="lotes por thread no teste dos contadores")
+    args = parser.parse_args()
+
+    conhecidos = {f"principio {i}": f"Marca {i}" for i in range(args.nomes * 3 // 4)}
+    desconhecidos = [f"inexistente {i}" for i in range(args.nomes - len(conhecidos))]
+    falhas = [f"falha {i}" for i in range(args.falhas)]
+    dump = {f"generico {i}": f"Marca Dump {i}" for i in range(20)}
+    stub = StubOpenFDA(conhecidos, args.latencia)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ.update({"OPENFDA_URL": stub.url, "OPENFDA_DB": str(Path(tmp) / "openfda.sqlite3"),
+                           "OPENFDA_CONCORRENCIA": str(args.concorrencia), "HTTP_RETRIES": "0",
+                           "LOG_NIVEL": "ERROR"})
+        from app import openfda
+
+        problemas = []
+        distintos = [*conhecidos, *desconhecidos, *falhas]
+        # variações de caixa e espaços de parte dos nomes: mesma chave, nenhuma consulta extra
+        lote = distintos + [f"  {n.upper()} " for n in list(conhecidos)[:5]] \
+            + [n.replace(" ", "  ") for n in desconhecidos[:3]]
+        esperado = {n: conhecidos.get(openfda.normalizar_nome(n)) for n in lote}
+
+        cache = openfda.obter_cache()
+        inicio = time.perf_counter()
+        resultado = openfda.buscar_openfda_lote(lote)
+        frio = time.perf_counter() - inicio
+        print(f"lote frio: {len(lote)} nomes, {sum(stub.consultas.values())} consultas em {frio * 1000:.0f} ms "
+              f"(sequencial ~{len(distintos) * args.latencia * 1000:.0f} ms), pico de {stub.pico} simultâneas")
+        if resultado != esperado:
+            problemas.append("lote frio: resultados diferentes do stub")
+        if set(stub.consultas) != set(distintos) or max(stub.consultas.values()) > 1:
+            problemas.append(f"lote frio: consultas por nome {dict(stub.consultas.most_common(3))}")
+        if not 1 < stub.pico <= args.concorrencia:
+            problemas.append(f"lote frio: pico de {stub.pico} consultas simultâneas (limite {args.concorrencia})")
+        frio_stats = cache.estatisticas()
+        if (frio_stats["misses"], frio_stats["falhas"]) != (len(distintos), len(falhas)):
+            problemas.append(f"lote frio: {frio_stats}")
+
+        stub.zerar()
+        inicio = time.perf_counter()
+        resultado = openfda.buscar_openfda_lote(lote)
+        quente = time.perf_counter() - inicio
+        estatisticas = cache.estatisticas()
+        print(f"lote quente: {sum(stub.consultas.values())} consultas em {quente * 1000:.0f} ms; {estatisticas}")
+        if resultado != esperado or set(stub.consultas) != set(falhas):
+            problemas.append(f"lote quente: consultas {sorted(stub.consultas)} (só as falhas deviam repetir)")
+        if (estatisticas["hits"] - frio_stats["hits"], estatisticas["hits_negativos"] - frio_stats["hits_negativos"]) \
+                != (len(conhecidos), len(desconhecidos)):
+            problemas.append("lote quente: hits/hits_negativos não conferem")
+
+        # TTL: cache próprio com validade curta
+        openfda._cache = openfda.CacheOpenFDA(Path(tmp) / "ttl.sqlite3", ttl=args.ttl, ttl_negativo=args.ttl_negativo)
+        amostra = list(conhecidos)[:5] + desconhecidos[:5]
+        openfda.buscar_openfda_lote(amostra)
+        rodadas = []
+        # 1ª rodada depois do TTL negativo; 2ª depois do TTL, antes de o negativo renovado expirar de novo
+        for espera in (args.ttl - args.ttl_negativo / 2, args.ttl + args.ttl_negativo / 4):
+            time.sleep(espera - (rodadas[-1][0] if rodadas else 0))
+            stub.zerar()
+            openfda.buscar_openfda_lote(amostra)
+            rodadas.append((espera, set(stub.consultas)))
+        print(f"TTL: após {rodadas[0][0]:.2f} s {len(rodadas[0][1])} consultas, "
+              f"após {rodadas[1][0]:.2f} s {len(rodadas[1][1])} consultas")
+        if rodadas[0][1] != set(desconhecidos[:5]):
+            problemas.append(f"TTL: após {rodadas[0][0]:.2f} s só o cache negativo devia expirar")
+        if rodadas[1][1] != set(list(conhecidos)[:5]):
+            problemas.append(f"TTL: após {rodadas[1][0]:.2f} s só os encontrados (TTL {args.ttl:g} s) deviam expirar")
+
+        # Aquecimento a partir de um dump drug-label zipado
+        arquivo = Path(tmp) / "drug-label-0001-of-0001.json.zip"
+        with zipfile.ZipFile(arquivo, "w") as z:
+            z.writestr("drug-label-0001-of-0001.json", json.dumps({"results": [
+                {"openfda": {"generic_name": [g.upper()], "brand_name": [m]}} for g, m in dump.items()]}))
+        openfda._cache = openfda.CacheOpenFDA(Path(tmp) / "dump.sqlite3")
+        carregados = openfda.aquecer_cache_de_dump(arquivo)
+        stub.zerar()
+        resultado = openfda.buscar_openfda_lote(list(dump))
+        print(f"aquecimento: {carregados} nomes do dump, {sum(stub.consultas.values())} consultas depois")
+        if carregados != len(dump) or resultado != dump or stub.consultas:
+            problemas.append("aquecimento: nomes do dump não vieram do cache")
+
+        # Contadores com várias threads (jobs) no mesmo cache
+        cache = openfda.obter_cache()
+        antes = cache.estatisticas()["hits"]
+        nomes = list(dump)[:5]
+        with ThreadPoolExecutor(args.threads) as pool:
+            list(pool.map(lambda _: [openfda.buscar_openfda_lote(nomes) for _ in range(args.lotes)],
+                          range(args.threads)))
+        hits = cache.estatisticas()["hits"] - antes
+        print(f"contadores: {hits} hits de {args.threads * args.lotes * len(nomes)} esperados")
+        if hits != args.threads * args.lotes * len(nomes):
+            problemas.append("contadores: hits perdidos entre threads")
+
+    for problema in problemas:
+        print(f"❌ {problema}")
+    if problemas:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
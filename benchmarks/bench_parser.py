@@ -0,0 +1,129 @@
+"""
+Benchmark do parser da receita (app/parser_receita.py).
+
+1. Confere o parser contra o corpus de fixtures (benchmarks/fixtures/receitas/*.json:
+   resposta do Azure + JSON esperado) e mostra onde a implementação anterior
+   (regex por campo + busca da posologia no texto inteiro) divergia.
+2. Mede a vazão (receitas/s) das duas implementações no corpus de fixtures e em
+   receitas sintéticas longas, com 10 a 200 medicamentos, onde o custo
+   O(medicamentos × texto) da versão anterior aparece.
+
+O OpenFDA fica desligado: só o parsing é medido.
+
+Uso:
+    python benchmarks/bench_parser.py [--repeticoes 200] [--medicamentos 10,50,200]
+"""
+
+import argparse
+import json
+import random
+import re
+import sys
+import time
+from pathlib import Path
+
+RAIZ = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(RAIZ))
+
+from app import services  # noqa: E402
+from app.parser_receita import linhas_do_resultado_azure, linhas_do_texto  # noqa: E402
+
+FIXTURES = Path(__file__).resolve().parent / "fixtures" / "receitas"
+
+
+def extrair_dados_original(texto: str) -> dict:
+    """Implementação anterior de extrair_dados_json_azure (sem o OpenFDA)."""
+    texto = services.INDICE_FUZZY.corrigir_texto(texto)
+    nome = re.search(r"(?i)paciente[:\s\-]*([^\n]+)", texto)
+    cpf = re.search(r"\d{3}[\.\s_]?\d{3}[\.\s_]?\d{3}[-\s_]?\d{2}", texto)
+    crm = re.search(r"CRM[-\s:]*([A-Z]{2}-?\s*\d+)", texto, re.IGNORECASE)
+    data = re.search(r"\d{1,2}\s+de\s+\w+\s+de\s+\d{4}", texto)
+    medicamentos = [{"nome": n.title(), "quantidade": services.extrair_quantidade_total(n, texto)}
+                    for n in services.encontrar_todos_os_medicamentos(texto)]
+    return {
+        "nome": nome.group(1).strip() if nome else "Não identificado",
+        "cpf": cpf.group(0).replace("_", ".") if cpf else None,
+        "medicamentos": medicamentos,
+        "data_receita": data.group(0) if data else None,
+        "crm_medico": crm.group(1).replace("-", "").strip() if crm else None,
+    }
+
+
+def carregar_fixtures() -> list:
+    fixtures = []
+    for caminho in sorted(FIXTURES.glob("*.json")):
+        dados = json.loads(caminho.read_text(encoding="utf-8"))
+        linhas = linhas_do_resultado_azure(dados["azure"])
+        textos = services.MOTOR_CORRECOES.aplicar_linhas([l.texto for l in linhas])
+        linhas = [l._replace(texto=t) for l, t in zip(linhas, textos)]
+        fixtures.append((caminho.stem, dados["descricao"], linhas, dados["esperado"]))
+    return fixtures
+
+
+def normalizar(dados: dict) -> dict:
+    return {**dados, "medicamentos": sorted(dados["medicamentos"], key=lambda m: m["nome"])}
+
+
+def receita_longa(n_medicamentos: int, rnd: random.Random) -> list:
+    principios = sorted(p for p in services.PRINCIPIOS_ATIVOS if p.isalpha() and len(p) > 5)
+    linhas = ["PACIENTE: Maria da Silva", "CPF: 123.456.789-01"]
+    for i, p in enumerate(rnd.sample(principios, n_medicamentos), 1):
+        linhas.append(f"{i}) {p.title()} {rnd.choice([5, 10, 20, 50, 500])}mg")
+        if rnd.random() < 0.7:
+            linhas.append(f"Tomar {rnd.randint(1, 2)} comprimido {rnd.randint(1, 4)}x ao dia por {rnd.randint(3, 30)} dias")
+        else:
+            linhas.append("Uso contínuo, 1 comprimido ao deitar, conforme orientação médica")
+    linhas += ["São Paulo, 08 de Abril de 2024", "Dr. Carlos Souza CRM: SP 123456"]
+    return linhas_do_texto("\n".join(linhas))
+
+
+def vazao(func, entradas: list, repeticoes: int) -> float:
+    inicio = time.perf_counter()
+    for _ in range(repeticoes):
+        for e in entradas:
+            func(e)
+    return repeticoes * len(entradas) / (time.perf_counter() - inicio)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--repeticoes", type=int, default=200)
+    parser.add_argument("--medicamentos", default="10,50,200")
+    args = parser.parse_args()
+    services.OPENFDA_ENRIQUECER = False
+
+    fixtures = carregar_fixtures()
+    falhas = 0
+    for nome, descricao, linhas, esperado in fixtures:
+        obtido = normalizar(services.extrair_dados_linhas(linhas))
+        anterior = normalizar(extrair_dados_original("\n".join(l.texto for l in linhas)))
+        ok = obtido == esperado
+        falhas += not ok
+        nota = "" if anterior == esperado else "  (versão anterior divergia)"
+        print(f"{'✅' if ok else '❌'} {nome:<28} {descricao}{nota}")
+        if not ok:
+            print(f"   esperado: {json.dumps(esperado, ensure_ascii=False)}")
+            print(f"   obtido:   {json.dumps(obtido, ensure_ascii=False)}")
+    if falhas:
+        sys.exit(1)
+
+    textos = ["\n".join(l.texto for l in linhas) for _, _, linhas, _ in fixtures]
+    todas_linhas = [linhas for _, _, linhas, _ in fixtures]
+    print(f"\ncorpus de fixtures ({len(fixtures)} receitas × {args.repeticoes}):")
+    print(f"  anterior: {vazao(extrair_dados_original, textos, args.repeticoes):>9.0f} receitas/s")
+    print(f"  parser:   {vazao(services.extrair_dados_linhas, todas_linhas, args.repeticoes):>9.0f} receitas/s")
+
+    rnd = random.Random(12)
+    print("\nreceitas longas:")
+    for n in (int(x) for x in args.medicamentos.split(",")):
+        linhas = receita_longa(n, rnd)
+        texto = "\n".join(l.texto for l in linhas)
+        repeticoes = max(1, args.repeticoes // n)
+        r_anterior = vazao(extrair_dados_original, [texto], repeticoes)
+        r_parser = vazao(services.extrair_dados_linhas, [linhas], repeticoes)
+        print(f"  {n:>4} medicamentos ({len(texto):>6} caracteres): anterior {1000 / r_anterior:>8.2f} ms"
+              f"  parser {1000 / r_parser:>8.2f} ms  ({r_parser / r_anterior:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,331 @@
+"""
+Suíte de benchmark ponta a ponta com um corpus sintético de receitas.
+
+Gera receitas com gabarito (paciente, CPF, CRM, data, medicamentos e
+quantidades) controlando o tamanho da foto (--megapixels), o ruído da foto
+(--ruido), o ruído de OCR no texto (--ruido-texto: trocas de letras como as de
+app/correcoes_ocr.json e nos nomes dos medicamentos) e o número de
+medicamentos por receita (--medicamentos). Cada etapa é medida isoladamente:
+
+- conversao_pdf: PDF de --paginas-pdf páginas (fotos de tamanhos diferentes, sem camada de
+  texto) → pdf.processar_pdf, com renderização e pré-processamento de cada página e sem o
+  OCR (exige o poppler);
+- preprocessamento: preprocessar_array, por tamanho e ruído da foto;
+- correcao: correções de OCR (MOTOR_CORRECOES.aplicar_linhas) no texto ruidoso;
+- medicamentos: encontrar_todos_os_medicamentos (busca aproximada + índice);
+- quantidade: PARSER_RECEITA.quantidades, a janela de posologia de cada medicamento
+  sobre as linhas já corrigidas e com os nomes já encontrados;
+- parsing: PARSER_RECEITA.analisar (campos, medicamentos e quantidades);
+- beneficiario: busca do CPF na base SQLite com --beneficiarios registros.
+
+A acurácia (campos, precisão/revocação dos medicamentos, quantidades) é medida
+no mesmo corpus, para que um ganho de velocidade não esconda uma perda na
+extração. O OpenFDA fica desligado e o OCR não é chamado.
+
+O relatório (--relatorio, JSON) traz p50/p95 por etapa e a acurácia. Os
+limites de benchmarks/limites_ponta_a_ponta.json são conferidos sempre (tetos
+absolutos do p50, acurácia mínima) e, com --base (relatório anterior da mesma
+máquina), também a piora relativa do tempo mínimo de cada etapa e a queda de
+acurácia. Sai com código 1 se houver regressão.
+
+Uso:
+    python benchmarks/bench_ponta_a_ponta.py [--relatorio rel.json] [--base rel_anterior.json]
+    python benchmarks/bench_ponta_a_ponta.py --gravar-corpus /tmp/corpus   # imagens, textos e gabaritos
+"""
+
+import argparse
+import io
+import json
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+from PIL import Image
+
+RAIZ = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(RAIZ))
+
+from app import pdf, services  # noqa: E402
+from app.beneficiarios import BaseBeneficiarios  # noqa: E402
+from app.parser_receita import NAO_IDENTIFICADO, linhas_do_texto  # noqa: E402
+
+LIMITES = Path(__file__).resolve().parent / "limites_ponta_a_ponta.json"
+PACIENTES = ["Maria da Silva", "João Pereira", "Ana Souza", "Carlos Oliveira", "Fernanda Lima", "Pedro Santos"]
+MEDICOS = ["Dr. Carlos Souza", "Dra. Helena Costa", "Dr. Marcos Ribeiro"]
+MESES = ["Janeiro", "Fevereiro", "Março", "Abril", "Maio", "Junho", "Julho", "Agosto",
+         "Setembro", "Outubro", "Novembro", "Dezembro"]
+CAMPOS = ("nome", "cpf", "crm_medico", "data_receita")
+
+
+# ---------- corpus sintético ----------
+
+def trocas_ocr() -> dict:
+    """Palavra correta → erros de OCR conhecidos, invertendo as regras "palavra" de app/correcoes_ocr.json."""
+    regras = json.loads(Path(services.CORRECOES_OCR_ARQUIVO).read_text(encoding="utf-8"))["regras"]
+    trocas = {}
+    for regra in regras:
+        if regra["tipo"] == "palavra":
+            trocas.setdefault(regra["para"].lower(), []).extend(d for d in regra["de"] if d.lower() != regra["para"].lower())
+    return trocas
+
+
+def gerar_receita(n_medicamentos: int, principios: list, rnd: random.Random) -> tuple:
+    """(linhas de texto limpas, gabarito no formato de extrair_dados_linhas)."""
+    nome = rnd.choice(PACIENTES)
+    cpf = "{}{}{}.{}{}{}.{}{}{}-{}{}".format(*(rnd.randint(0, 9) for _ in range(11)))
+    crm = f"{rnd.choice(['SP', 'RS', 'RJ', 'MG'])} {rnd.randint(1000, 999999)}"
+    data = f"{rnd.randint(10, 28):02d} de {rnd.choice(MESES)} de {rnd.randint(2019, 2025)}"
+    linhas = ["CLÍNICA SAÚDE TOTAL", f"PACIENTE: {nome}", f"CPF: {cpf}", "Uso oral"]
+    medicamentos = []
+    for i, principio in enumerate(rnd.sample(principios, n_medicamentos), 1):
+        nome_med = f"{principio.title()} {rnd.choice([5, 10, 20, 50, 250, 500, 850])}mg"
+        linhas.append(f"{i}) {nome_med}")
+        if rnd.random() < 0.8:
+            q, v, d = rnd.randint(1, 2), rnd.randint(1, 4), rnd.randint(3, 30)
+            linhas.append(f"Tomar {q} comprimido {v}x ao dia por {d} dias")
+            quantidade = f"{q * v * d} comprimidos"
+        else:
+            linhas.append("Uso contínuo, conforme orientação médica")
+            quantidade = NAO_IDENTIFICADO
+        medicamentos.append({"nome": nome_med.title(), "quantidade": quantidade})
+    linhas += [f"São Paulo, {data}", f"{rnd.choice(MEDICOS)} CRM: {crm}"]
+    gabarito = {"nome": nome, "cpf": cpf, "medicamentos": sorted(medicamentos, key=lambda m: m["nome"]),
+                "data_receita": data, "crm_medico": crm}
+    return linhas, gabarito
+
+
+def com_ruido_ocr(linhas: list, taxa: float, trocas: dict, rnd: random.Random) -> list:
+    """Cada palavra, com probabilidade `taxa`, vira um erro de OCR conhecido ou troca um "i" por "l"."""
+    if not taxa:
+        return list(linhas)
+    saida = []
+    for linha in linhas:
+        palavras = linha.split(" ")
+        for i, palavra in enumerate(palavras):
+            if rnd.random() >= taxa:
+                continue
+            if palavra.lower() in trocas:
+                palavras[i] = rnd.choice(trocas[palavra.lower()])
+            elif palavra.isalpha() and len(palavra) > 6 and "i" in palavra[1:]:
+                posicao = palavra.index("i", 1)
+                palavras[i] = palavra[:posicao] + "l" + palavra[posicao + 1:]
+        saida.append(" ".join(palavras))
+    return saida
+
+
+def gerar_foto(linhas: list, megapixels: float, ruido: float, seed: int):
+    """Foto sintética (texto escuro em fundo claro, leve desfoque e ruído gaussiano), como em bench_preprocessamento."""
+    rnd = np.random.default_rng(seed)
+    w = int((megapixels * 1_000_000 * 3 / 4) ** 0.5)
+    h = int(w * 4 / 3)
+    img = np.full((h, w, 3), 235, dtype=np.uint8)
+    escala = w / 1200
+    for i, linha in enumerate(linhas):
+        y = int((80 + i * 55) * escala)
+        if y > h - 20:
+            break
+        cv2.putText(img, linha, (int(50 * escala), y), cv2.FONT_HERSHEY_SIMPLEX, 0.9 * escala, (30, 30, 30),
+                    max(1, int(2 * escala)), cv2.LINE_AA)
+    img = cv2.GaussianBlur(img, (3, 3), 0)
+    if ruido:
+        img = np.clip(img + rnd.normal(0, ruido, img.shape), 0, 255).astype(np.uint8)
+    return img
+
+
+def para_pdf(imgs: list) -> bytes:
+    """PDF só de imagens (sem camada de texto), uma por página."""
+    paginas = [Image.fromarray(cv2.cvtColor(img, cv2.COLOR_BGR2RGB)) for img in imgs]
+    buffer = io.BytesIO()
+    paginas[0].save(buffer, "PDF", resolution=150, save_all=True, append_images=paginas[1:])
+    return buffer.getvalue()
+
+
+def processar_pdf_sem_ocr(conteudo: bytes) -> list:
+    """pdf.processar_pdf com cada página renderizada e pré-processada, parando antes do OCR."""
+    def preparar(pagina, numero):
+        services.preparar_pagina_pdf(pagina)
+        return []
+
+    return pdf.processar_pdf(conteudo, preparar)
+
+
+# ---------- medição ----------
+
+def medir(func, entradas: list, repeticoes: int) -> dict:
+    tempos = []
+    for _ in range(repeticoes):
+        for e in entradas:
+            inicio = time.perf_counter()
+            func(e)
+            tempos.append(time.perf_counter() - inicio)
+    tempos.sort()
+    return {
+        "n": len(tempos),
+        "min_ms": round(tempos[0] * 1000, 3),
+        "p50_ms": round(tempos[len(tempos) // 2] * 1000, 3),
+        "p95_ms": round(tempos[min(len(tempos) - 1, int(len(tempos) * 0.95))] * 1000, 3),
+        "media_ms": round(sum(tempos) / len(tempos) * 1000, 3),
+    }
+
+
+def acuracia(obtidos: list, gabaritos: list) -> dict:
+    acertos = {c: 0 for c in CAMPOS}
+    vp = fp = fn = quantidades_ok = 0
+    for obtido, gabarito in zip(obtidos, gabaritos):
+        for campo in CAMPOS:
+            acertos[campo] += obtido.get(campo) == gabarito[campo]
+        esperados = {m["nome"]: m["quantidade"] for m in gabarito["medicamentos"]}
+        encontrados = {m["nome"]: m["quantidade"] for m in obtido["medicamentos"]}
+        comuns = esperados.keys() & encontrados.keys()
+        vp += len(comuns)
+        fp += len(encontrados.keys() - comuns)
+        fn += len(esperados.keys() - comuns)
+        quantidades_ok += sum(esperados[n] == encontrados[n] for n in comuns)
+    precisao = vp / (vp + fp) if vp + fp else 1.0
+    revocacao = vp / (vp + fn) if vp + fn else 1.0
+    return {
+        **{c: round(acertos[c] / len(gabaritos), 4) for c in CAMPOS},
+        "medicamentos_precisao": round(precisao, 4),
+        "medicamentos_revocacao": round(revocacao, 4),
+        "medicamentos_f1": round(2 * precisao * revocacao / (precisao + revocacao), 4) if precisao + revocacao else 0.0,
+        "quantidades": round(quantidades_ok / vp, 4) if vp else 0.0,
+    }
+
+
+def regressoes(relatorio: dict, base: dict | None, limites: dict) -> list:
+    problemas = []
+    for etapa, atual in relatorio["etapas"].items():
+        if "pulada" in atual:
+            continue
+        teto = limites["tempo_max_ms"].get(etapa.split("[")[0])
+        if teto is not None and atual["p50_ms"] > teto:
+            problemas.append(f"{etapa}: p50 {atual['p50_ms']} ms acima do teto de {teto} ms")
+        # Contra a base vale o mínimo, o valor mais estável entre execuções na mesma máquina
+        anterior = (base or {}).get("etapas", {}).get(etapa, {}).get("min_ms")
+        if anterior and atual["min_ms"] > anterior * limites["tempo_max_relativo"] + limites["tempo_folga_ms"]:
+            problemas.append(f"{etapa}: mínimo {atual['min_ms']} ms contra {anterior} ms na base "
+                             f"(limite {limites['tempo_max_relativo']:g}x)")
+    for chave, valor in relatorio["acuracia"].items():
+        minimo = limites["acuracia_min"].get(chave)
+        if minimo is not None and valor < minimo:
+            problemas.append(f"acurácia {chave}: {valor} abaixo do mínimo {minimo}")
+        anterior = (base or {}).get("acuracia", {}).get(chave)
+        if anterior is not None and valor < anterior - limites["acuracia_queda_max"]:
+            problemas.append(f"acurácia {chave}: {valor} contra {anterior} na base")
+    return problemas
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--receitas", type=int, default=100)
+    parser.add_argument("--medicamentos", default="1,4,12", help="medicamentos por receita (sorteado entre os valores)")
+    parser.add_argument("--ruido-texto", type=float, default=0.1, help="fração das palavras com erro de OCR")
+    parser.add_argument("--megapixels", default="2,12")
+    parser.add_argument("--ruido", default="0,15", help="desvio do ruído gaussiano da foto")
+    parser.add_argument("--beneficiarios", type=int, default=100_000)
+    parser.add_argument("--repeticoes", type=int, default=5, help="repetições das etapas de texto")
+    parser.add_argument("--repeticoes-imagem", type=int, default=3)
+    parser.add_argument("--paginas-pdf", type=int, default=3, help="páginas do PDF em conversao_pdf")
+    parser.add_argument("--semente", type=int, default=17)
+    parser.add_argument("--relatorio", type=Path, help="grava o relatório JSON")
+    parser.add_argument("--base", type=Path, help="relatório anterior para comparar")
+    parser.add_argument("--limites", type=Path, default=LIMITES)
+    parser.add_argument("--gravar-corpus", type=Path, help="grava imagens, textos e gabaritos e sai")
+    args = parser.parse_args()
+    services.OPENFDA_ENRIQUECER = False
+    rnd = random.Random(args.semente)
+
+    principios = sorted(p for p in services.PRINCIPIOS_ATIVOS if p.isalpha() and len(p) > 5)
+    trocas = trocas_ocr()
+    tamanhos = [int(n) for n in args.medicamentos.split(",")]
+    corpus = []  # (linhas limpas, linhas com ruído de OCR, gabarito)
+    for _ in range(args.receitas):
+        limpas, gabarito = gerar_receita(rnd.choice(tamanhos), principios, rnd)
+        corpus.append((limpas, com_ruido_ocr(limpas, args.ruido_texto, trocas, rnd), gabarito))
+    fotos = [(mp, ruido, gerar_foto(corpus[0][0], mp, ruido, args.semente))
+             for mp in (float(m) for m in args.megapixels.split(","))
+             for ruido in (float(r) for r in args.ruido.split(","))]
+
+    if args.gravar_corpus:
+        args.gravar_corpus.mkdir(parents=True, exist_ok=True)
+        for i, (limpas, ruidosas, gabarito) in enumerate(corpus):
+            (args.gravar_corpus / f"receita_{i:04d}.txt").write_text("\n".join(ruidosas), encoding="utf-8")
+            (args.gravar_corpus / f"receita_{i:04d}.json").write_text(
+                json.dumps(gabarito, ensure_ascii=False, indent=2), encoding="utf-8")
+            cv2.imwrite(str(args.gravar_corpus / f"receita_{i:04d}.jpg"), gerar_foto(limpas, 2, 8, i))
+        print(f"✅ {len(corpus)} receitas gravadas em {args.gravar_corpus}")
+        return
+
+    etapas = {}
+    paginas_pdf = [fotos[i % len(fotos)][2] for i in range(args.paginas_pdf)]
+    if shutil.which("pdftoppm"):
+        etapas["conversao_pdf"] = medir(processar_pdf_sem_ocr, [para_pdf(paginas_pdf)], args.repeticoes_imagem)
+    else:
+        etapas["conversao_pdf"] = {"pulada": "poppler (pdftoppm) indisponível"}
+    for mp, ruido, foto in fotos:
+        etapas[f"preprocessamento[{mp:g}mp,ruido{ruido:g}]"] = medir(services.preprocessar_array, [foto],
+                                                                     args.repeticoes_imagem)
+
+    ruidosas = [r for _, r, _ in corpus]
+    etapas["correcao"] = medir(lambda linhas: services.MOTOR_CORRECOES.aplicar_linhas(linhas, contar=False),
+                               ruidosas, args.repeticoes)
+    corrigidas = [services.MOTOR_CORRECOES.aplicar_linhas(r, contar=False) for r in ruidosas]
+    textos = ["\n".join(c) for c in corrigidas]
+    etapas["medicamentos"] = medir(services.encontrar_todos_os_medicamentos, textos, args.repeticoes)
+    linhas_ocr = [linhas_do_texto(t) for t in textos]
+    janelas = []
+    for linhas in linhas_ocr:
+        texto = services.PARSER_RECEITA.corrigir_nomes("\n".join(l.texto for l in linhas))
+        janelas.append((linhas, texto, services.PARSER_RECEITA.encontrar_medicamentos(texto)))
+    etapas["quantidade"] = medir(lambda j: services.PARSER_RECEITA.quantidades(*j), janelas, args.repeticoes)
+    etapas["parsing"] = medir(services.PARSER_RECEITA.analisar, linhas_ocr, args.repeticoes)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        base_benef = BaseBeneficiarios(Path(tmp) / "benef.sqlite3")
+        base_benef.upsert({"cpf": f"{i:011d}", "nome_beneficiario": f"Beneficiário {i}", "status_plano": "ATIVO",
+                           "validade": "2026-12-31"} for i in range(args.beneficiarios))
+        base_benef.upsert({"cpf": g["cpf"], "nome_beneficiario": g["nome"], "status_plano": "ATIVO",
+                           "validade": "2026-12-31"} for _, _, g in corpus)
+        etapas["beneficiario"] = medir(base_benef.buscar, [g["cpf"] for _, _, g in corpus], args.repeticoes)
+        base_benef.fechar()
+
+    obtidos = [services.PARSER_RECEITA.analisar(linhas) for linhas in linhas_ocr]
+    relatorio = {
+        "versao": 1,
+        "gerado_em": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "ambiente": {"python": platform.python_version(), "plataforma": platform.platform(),
+                     "versao_cache_ocr": services.VERSAO_CACHE_OCR},
+        "parametros": {k: v for k, v in vars(args).items() if k not in ("relatorio", "base", "limites", "gravar_corpus")},
+        "etapas": etapas,
+        "acuracia": acuracia(obtidos, [g for _, _, g in corpus]),
+    }
+    limites = json.loads(args.limites.read_text(encoding="utf-8"))
+    base = json.loads(args.base.read_text(encoding="utf-8")) if args.base else None
+    if base and base.get("parametros") != relatorio["parametros"]:
+        print("⚠️ Parâmetros diferentes dos da base: a comparação de tempos pode não fazer sentido.")
+    relatorio["regressoes"] = regressoes(relatorio, base, limites)
+
+    print(f"{'etapa':<36} {'p50 (ms)':>10} {'p95 (ms)':>10} {'n':>6}")
+    for etapa, r in etapas.items():
+        if "pulada" in r:
+            print(f"{etapa:<36} {'pulada: ' + r['pulada']}")
+        else:
+            print(f"{etapa:<36} {r['p50_ms']:>10.3f} {r['p95_ms']:>10.3f} {r['n']:>6}")
+    print("acurácia:", json.dumps(relatorio["acuracia"], ensure_ascii=False))
+    if args.relatorio:
+        args.relatorio.write_text(json.dumps(relatorio, indent=2, ensure_ascii=False), encoding="utf-8")
+        print(f"relatório gravado em {args.relatorio}")
+    for problema in relatorio["regressoes"]:
+        print(f"❌ {problema}")
+    if relatorio["regressoes"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
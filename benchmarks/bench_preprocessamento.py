@@ -0,0 +1,119 @@
+"""
+Benchmark dos perfis de pré-processamento (preprocessar_array).
+
+Gera fotos sintéticas de receita em várias resoluções e níveis de ruído e,
+para cada perfil, reporta:
+- tempo por megapixel;
+- concordância da binarização com o perfil "maxima_qualidade" (IoU da tinta);
+- com --ocr, acerto dos medicamentos em relação ao gabarito: a saída de cada
+  perfil vai direto para o motor de OCR configurado (OCR_MOTOR; o Azure exige
+  AZURE_ENDPOINT/AZURE_KEY, o Tesseract o binário com o idioma "por") e para o
+  parsing, sem passar de novo pela triagem nem pelo pré-processamento padrão.
+  Sai com código 1 se o perfil padrão ("balanceado") acertar menos que
+  "maxima_qualidade" menos --tolerancia em alguma combinação.
+
+Uso:
+    python benchmarks/bench_preprocessamento.py [--megapixels 2,12] [--ruido 0,15] [--ocr [--tolerancia 0]]
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+RAIZ = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(RAIZ))
+
+from app import services  # noqa: E402
+
+MEDICAMENTOS = [
+    ("Paracetamol 750mg", "Tomar 1 comprimido 3x ao dia por 5 dias"),
+    ("Losartana 50mg", "Tomar 1 comprimido 1x ao dia por 30 dias"),
+    ("Metformina 850mg", "Tomar 1 comprimido 2x ao dia por 30 dias"),
+    ("Amoxicilina 500mg", "Tomar 1 cápsula 3x ao dia por 7 dias"),
+]
+
+
+def gerar_foto(megapixels: float, ruido: float, seed: int = 0):
+    """Página A4 (proporção 4:3 de celular) com texto, leve desfoque e ruído gaussiano."""
+    rnd = np.random.default_rng(seed)
+    w = int((megapixels * 1_000_000 * 4 / 3) ** 0.5)
+    h = int(w * 3 / 4)
+    img = np.full((h, w, 3), 235, dtype=np.uint8)
+    escala = w / 1600
+    linhas = ["PACIENTE: Maria Oliveira", "CPF: 123.456.789-01", "CRM: RS 47384"]
+    for nome, posologia in MEDICAMENTOS:
+        linhas += [nome, posologia]
+    linhas.append("Porto Alegre, 08 de Abril de 2020")
+    for i, linha in enumerate(linhas):
+        y = int((80 + i * 60) * escala)
+        cv2.putText(img, linha, (int(60 * escala), y), cv2.FONT_HERSHEY_SIMPLEX, 1.1 * escala, (30, 30, 30),
+                    max(1, int(2 * escala)), cv2.LINE_AA)
+    img = cv2.GaussianBlur(img, (3, 3), 0)
+    if ruido:
+        img = np.clip(img + rnd.normal(0, ruido, img.shape), 0, 255).astype(np.uint8)
+    return img
+
+
+def iou_tinta(a, b) -> float:
+    if a.shape != b.shape:
+        b = cv2.resize(b, (a.shape[1], a.shape[0]), interpolation=cv2.INTER_NEAREST)
+    ta, tb = a < 128, b < 128
+    uniao = np.logical_or(ta, tb).sum()
+    return float(np.logical_and(ta, tb).sum() / uniao) if uniao else 1.0
+
+
+def acerto_ocr(binarizada) -> float:
+    """Fração dos medicamentos do gabarito encontrados lendo exatamente a saída do perfil."""
+    _, dados = services.analisar_linhas_ocr(services.OCR.ler(services.codificar_jpeg(binarizada)))
+    nomes = {m["nome"].lower().replace(" ", "") for m in dados.get("medicamentos", [])}
+    esperados = {n.lower().replace(" ", "") for n, _ in MEDICAMENTOS}
+    return len(nomes & esperados) / len(esperados)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--megapixels", default="2,12")
+    parser.add_argument("--ruido", default="0,15")
+    parser.add_argument("--repeticoes", type=int, default=1)
+    parser.add_argument("--ocr", "--azure", action="store_true",
+                        help="mede o acerto de extração com o motor de OCR configurado")
+    parser.add_argument("--tolerancia", type=float, default=0.0,
+                        help="perda de acerto aceita no perfil padrão em relação a maxima_qualidade")
+    args = parser.parse_args()
+
+    perfis = list(services.PERFIS_PREPROCESSAMENTO)
+    print(f"{'MP':>5} {'ruído':>6} {'perfil':>17} {'ms/MP':>9} {'IoU':>6}" + (f" {'acerto':>7}" if args.ocr else ""))
+    problemas = []
+    for mp in (float(m) for m in args.megapixels.split(",")):
+        for ruido in (float(r) for r in args.ruido.split(",")):
+            img = gerar_foto(mp, ruido)
+            referencia, acertos = None, {}
+            for perfil in reversed(perfis):  # maxima_qualidade primeiro, vira a referência
+                inicio = time.perf_counter()
+                for _ in range(args.repeticoes):
+                    saida = services.preprocessar_array(img, perfil)
+                ms_mp = (time.perf_counter() - inicio) / args.repeticoes * 1000 / mp
+                if referencia is None:
+                    referencia = saida
+                linha = f"{mp:>5.1f} {ruido:>6.0f} {perfil:>17} {ms_mp:>9.1f} {iou_tinta(referencia, saida):>6.3f}"
+                if args.ocr:
+                    acertos[perfil] = acerto_ocr(saida)
+                    linha += f" {acertos[perfil]:>7.2f}"
+                print(linha)
+            padrao = services.PREPROC_PERFIL
+            if args.ocr and padrao != "maxima_qualidade" and \
+                    acertos[padrao] < acertos["maxima_qualidade"] - args.tolerancia:
+                problemas.append(f"{mp:g} MP, ruído {ruido:g}: {padrao} acertou {acertos[padrao]:.2f}, "
+                                 f"maxima_qualidade {acertos['maxima_qualidade']:.2f}")
+    for problema in problemas:
+        print(f"❌ {problema}")
+    if problemas:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""
+Triagem de qualidade da foto (app/qualidade.py): tempo, recusas indevidas e economia.
+
+Gera um corpus sintético de receitas (mesmo gerador de bench_ponta_a_ponta.py)
+em duas partes:
+- boas: fotos que o OCR lê, variando resolução, ruído, desfoque leve,
+  subexposição e foto lavada dentro do aceitável;
+- ruins, por defeito: desfocada, escura, lavada, pequena e sem texto (papel
+  em branco com sombra e ruído).
+
+Reporta o tempo da triagem (p50/p95), a taxa de recusa indevida nas boas, a
+detecção em cada categoria ruim, o tempo de pré-processamento
+(preprocessar_array) que deixou de ser gasto nas recusadas e as chamadas de
+OCR evitadas (com o tempo estimado por --latencia-ocr). Sai com código 1 se a
+recusa indevida passar de --max-recusa-indevida, a detecção ficar abaixo de
+--min-deteccao ou o p95 da triagem passar de --orcamento-ms.
+
+Uso:
+    python benchmarks/bench_qualidade.py [--n 20] [--latencia-ocr 1.5] [--orcamento-ms 50]
+"""
+
+import argparse
+import random
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+RAIZ = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(RAIZ))
+
+from app import services, qualidade  # noqa: E402
+from bench_ponta_a_ponta import gerar_receita, gerar_foto  # noqa: E402
+
+
+def desfocar(img, sigma_relativo: float):
+    """Desfoque gaussiano com sigma em px de uma foto de 1500 px de largura (escala com a foto)."""
+    return cv2.GaussianBlur(img, (0, 0), sigma_relativo * img.shape[1] / 1500) if sigma_relativo else img
+
+
+def exposicao(img, fator: float, lavada: float = 0.0):
+    """fator < 1 escurece; lavada > 0 mistura com branco (reflexo, flash estourado)."""
+    saida = img.astype(np.float32) * fator
+    if lavada:
+        saida = saida * (1 - lavada) + 255 * lavada
+    return np.clip(saida, 0, 255).astype(np.uint8)
+
+
+def papel_em_branco(megapixels: float, rnd: random.Random):
+    w = int((megapixels * 1_000_000 * 3 / 4) ** 0.5)
+    h = int(w * 4 / 3)
+    sombra = np.linspace(rnd.uniform(150, 200), rnd.uniform(220, 245), w, dtype=np.float32)
+    img = np.repeat(np.tile(sombra, (h, 1))[:, :, None], 3, axis=2)
+    img += np.random.default_rng(rnd.randrange(1 << 30)).normal(0, rnd.uniform(0, 8), img.shape)
+    return np.clip(img, 0, 255).astype(np.uint8)
+
+
+def gerar_corpus(n: int, principios: list, rnd: random.Random) -> dict:
+    def receita(mp, ruido):
+        linhas, _ = gerar_receita(rnd.choice([1, 2, 4, 8]), principios, rnd)
+        return gerar_foto(linhas, mp, ruido, rnd.randrange(1 << 30))
+
+    corpus = {"boas": [], "desfocada": [], "escura": [], "lavada": [], "pequena": [], "sem_texto": []}
+    for _ in range(n):
+        foto = receita(rnd.choice([0.5, 1, 2, 3, 8, 12]), rnd.choice([0, 5, 10, 15]))
+        foto = desfocar(foto, rnd.uniform(0, 2))
+        if rnd.random() < 0.5:
+            foto = exposicao(foto, rnd.uniform(0.45, 1.0))
+        else:
+            foto = exposicao(foto, 1.0, rnd.uniform(0, 0.5))
+        corpus["boas"].append(foto)
+        corpus["desfocada"].append(desfocar(receita(3, rnd.choice([0, 8])), rnd.uniform(5, 9)))
+        corpus["escura"].append(exposicao(receita(3, 5), rnd.uniform(0.05, 0.15)))
+        corpus["lavada"].append(exposicao(receita(3, 5), 1.0, rnd.uniform(0.82, 0.95)))
+        corpus["pequena"].append(receita(rnd.uniform(0.03, 0.1), 5))
+        corpus["sem_texto"].append(papel_em_branco(3, rnd))
+    return corpus
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--n", type=int, default=20, help="fotos por categoria")
+    parser.add_argument("--semente", type=int, default=19)
+    parser.add_argument("--latencia-ocr", type=float, default=1.5, help="segundos estimados por chamada de OCR")
+    parser.add_argument("--max-recusa-indevida", type=float, default=0.02)
+    parser.add_argument("--min-deteccao", type=float, default=0.9, help="fração mínima recusada em cada categoria ruim")
+    parser.add_argument("--orcamento-ms", type=float, default=50.0, help="p95 máximo da triagem")
+    args = parser.parse_args()
+    rnd = random.Random(args.semente)
+
+    principios = sorted(p for p in services.PRINCIPIOS_ATIVOS if p.isalpha() and len(p) > 5)
+    print(f"Gerando {args.n} fotos por categoria...")
+    corpus = gerar_corpus(args.n, principios, rnd)
+
+    tempos, recusadas, motivos, economia_ms = [], {}, {}, 0.0
+    for categoria, fotos in corpus.items():
+        recusadas[categoria], motivos[categoria] = 0, Counter()
+        for foto in fotos:
+            qualidade.avaliar(foto)  # aquece caches do OpenCV para esta resolução
+            inicio = time.perf_counter()
+            resultado = qualidade.avaliar(foto)
+            tempos.append((time.perf_counter() - inicio) * 1000)
+            if resultado.aceita:
+                continue
+            recusadas[categoria] += 1
+            motivos[categoria].update(resultado.motivos)
+            inicio = time.perf_counter()
+            services.preprocessar_array(foto)
+            economia_ms += (time.perf_counter() - inicio) * 1000
+
+    tempos.sort()
+    p50, p95 = tempos[len(tempos) // 2], tempos[min(len(tempos) - 1, int(len(tempos) * 0.95))]
+    print(f"\n{'categoria':<11} {'fotos':>6} {'recusadas':>10} {'taxa':>7}  motivos")
+    for categoria, fotos in corpus.items():
+        taxa = recusadas[categoria] / len(fotos)
+        print(f"{categoria:<11} {len(fotos):>6} {recusadas[categoria]:>10} {taxa:>7.1%}  {dict(motivos[categoria])}")
+
+    ruins = [c for c in corpus if c != "boas"]
+    evitadas = sum(recusadas[c] for c in ruins)
+    indevida = recusadas["boas"] / len(corpus["boas"])
+    print(f"\ntriagem: p50 {p50:.1f} ms, p95 {p95:.1f} ms por foto")
+    print(f"recusa indevida (boas): {indevida:.1%}")
+    print(f"pré-processamento evitado: {economia_ms:.0f} ms em {sum(recusadas.values())} fotos recusadas "
+          f"({economia_ms / max(1, sum(recusadas.values())):.0f} ms/foto)")
+    print(f"chamadas de OCR evitadas: {evitadas} (~{evitadas * args.latencia_ocr:.0f} s a {args.latencia_ocr:g} s/chamada)")
+
+    problemas = []
+    if indevida > args.max_recusa_indevida:
+        problemas.append(f"recusa indevida {indevida:.1%} acima de {args.max_recusa_indevida:.1%}")
+    for categoria in ruins:
+        if recusadas[categoria] / len(corpus[categoria]) < args.min_deteccao:
+            problemas.append(f"{categoria}: só {recusadas[categoria]}/{len(corpus[categoria])} recusadas")
+    if p95 > args.orcamento_ms:
+        problemas.append(f"p95 da triagem {p95:.1f} ms acima de {args.orcamento_ms:g} ms")
+    for problema in problemas:
+        print(f"❌ {problema}")
+    if problemas:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""
+Subida de um worker: tempo de import do app e memória residente por processo.
+
+Cada cenário sobe processos novos (como o gunicorn ao criar um worker ou um
+cold start depois de um autoscaling), importa o app, chama create_app() e
+reporta a mediana de:
+- import_ms: do início do processo até o create_app() devolver;
+- primeira_busca_ms: primeira busca de medicamentos (inclui o que ficou sob demanda);
+- rss_mb e privada_mb: memória residente e memória só do processo (smaps_rollup);
+- quais dependências pesadas (cv2, numpy, pdf2image, PIL, aiohttp) já foram carregadas.
+
+Cenários: sem snapshot dos princípios (PRINCIPIOS_SNAPSHOT vazio: monta os
+índices do CSV), com snapshot, com AQUECER_NA_SUBIDA=1 e, por fim, workers
+criados por fork de um mestre já aquecido (gunicorn --preload), em que a
+memória privada mostra o quanto é compartilhado após o fork.
+
+Uso:
+    python benchmarks/bench_subida.py [--repeticoes 5] [--workers 4]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+RAIZ = Path(__file__).resolve().parent.parent
+PESADAS = ("cv2", "numpy", "pdf2image", "PIL", "aiohttp")
+
+
+def memoria_mb() -> tuple:
+    """(RSS, memória privada) do processo atual em MB, de /proc (Linux); (None, None) fora dele."""
+    try:
+        campos = dict(linha.split(":", 1) for linha in Path("/proc/self/smaps_rollup").read_text().splitlines()[1:])
+    except OSError:
+        return None, None
+    kb = {k: int(v.split()[0]) for k, v in campos.items()}
+    return kb["Rss"] / 1024, (kb["Private_Clean"] + kb["Private_Dirty"]) / 1024
+
+
+def medir_processo(inicio: float) -> dict:
+    """Executado no processo filho, já com o app importado."""
+    from app import services
+
+    import_ms = (time.perf_counter() - inicio) * 1000
+    t = time.perf_counter()
+    services.encontrar_todos_os_medicamentos("Losartana 50mg\nTomar 1 comprimido ao dia")
+    primeira_busca_ms = (time.perf_counter() - t) * 1000
+    rss, privada = memoria_mb()
+    return {"import_ms": import_ms, "primeira_busca_ms": primeira_busca_ms, "rss_mb": rss, "privada_mb": privada,
+            "pesadas": [m for m in PESADAS if m in sys.modules]}
+
+
+def filho() -> None:
+    inicio = time.perf_counter()
+    from app import create_app
+
+    create_app()
+    print(json.dumps(medir_processo(inicio)))
+
+
+def subir(env_extra: dict, repeticoes: int) -> list:
+    env = {**os.environ, **env_extra}
+    resultados = []
+    for _ in range(repeticoes):
+        saida = subprocess.run([sys.executable, __file__, "--filho"], env=env, cwd=RAIZ, check=True,
+                               capture_output=True, text=True).stdout
+        resultados.append(json.loads(saida.strip().splitlines()[-1]))
+    return resultados
+
+
+def workers_por_fork(env_extra: dict, workers: int) -> list:
+    """Mestre aquecido que cria `workers` processos por fork, como o gunicorn --preload."""
+    codigo = (
+        "import json, os, sys, time\n"
+        f"sys.path.insert(0, {str(RAIZ / 'benchmarks')!r})\n"
+        "import bench_subida\n"
+        "from app import create_app\n"
+        "create_app()\n"
+        "leituras = []\n"
+        f"for _ in range({workers}):\n"
+        "    r, w = os.pipe()\n"
+        "    inicio = time.perf_counter()\n"
+        "    if os.fork() == 0:\n"
+        "        os.write(w, json.dumps(bench_subida.medir_processo(inicio)).encode())\n"
+        "        os._exit(0)\n"
+        "    os.close(w)\n"
+        "    leituras.append(os.read(r, 1 << 16))\n"
+        "    os.wait()\n"
+        "print(json.dumps([json.loads(x) for x in leituras]))\n"
+    )
+    env = {**os.environ, **env_extra, "AQUECER_NA_SUBIDA": "1"}
+    saida = subprocess.run([sys.executable, "-c", codigo], env=env, cwd=RAIZ, check=True,
+                           capture_output=True, text=True).stdout
+    return json.loads(saida.strip().splitlines()[-1])
+
+
+def resumo(nome: str, resultados: list) -> None:
+    def mediana(campo):
+        valores = [r[campo] for r in resultados if r[campo] is not None]
+        return statistics.median(valores) if valores else float("nan")
+
+    print(f"{nome:<26} {mediana('import_ms'):>10.0f} {mediana('primeira_busca_ms'):>12.1f} "
+          f"{mediana('rss_mb'):>8.1f} {mediana('privada_mb'):>11.1f}  {','.join(resultados[0]['pesadas']) or '-'}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--repeticoes", type=int, default=5)
+    parser.add_argument("--workers", type=int, default=4, help="workers no cenário com fork")
+    parser.add_argument("--filho", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.filho:
+        sys.path.insert(0, str(RAIZ))
+        filho()
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        snapshot = str(Path(tmp) / "principios.snapshot")
+        inicio = time.perf_counter()
+        subprocess.run([sys.executable, "-m", "app.principios", "--saida", snapshot], cwd=RAIZ, check=True,
+                       capture_output=True)
+        print(f"snapshot gerado em {time.perf_counter() - inicio:.2f} s "
+              f"(processo inteiro; {Path(snapshot).stat().st_size // 1024} KB)\n")
+
+        print(f"{'cenário':<26} {'import_ms':>10} {'1ª busca ms':>12} {'rss_mb':>8} {'privada_mb':>11}  carregadas")
+        resumo("sem snapshot", subir({"PRINCIPIOS_SNAPSHOT": ""}, args.repeticoes))
+        resumo("snapshot", subir({"PRINCIPIOS_SNAPSHOT": snapshot}, args.repeticoes))
+        resumo("snapshot + aquecer", subir({"PRINCIPIOS_SNAPSHOT": snapshot, "AQUECER_NA_SUBIDA": "1"},
+                                           args.repeticoes))
+        if hasattr(os, "fork"):
+            resumo(f"fork do mestre (x{args.workers})", workers_por_fork({"PRINCIPIOS_SNAPSHOT": snapshot},
+                                                                         args.workers))
+    print("\nimport_ms no fork: do fork até o worker estar pronto (o mestre já importou tudo).")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""
+Repetições do Twilio no /webhook-whatsapp: deduplicação pelo MessageSid (app/idempotencia.py).
+
+Simula o Twilio reenviando cada mensagem com mídia --repeticoes vezes, a cada
+--atraso segundos, enquanto o processamento (download + OCR, aqui um sleep de
+--processamento s) ainda roda. As entregas passam pela rota Flask de verdade
+(test_client) e são divididas entre --processos workers criados por fork, que
+compartilham o SQLite da deduplicação como os workers do gunicorn.
+
+Compara sem e com deduplicação: quantas vezes a receita foi processada,
+quantas entregas receberam a resposta completa e a latência das repetições.
+Mede também o custo da deduplicação por requisição. Sai com código 1 se, com
+deduplicação, alguma receita for processada mais de uma vez.
+
+Uso:
+    python benchmarks/bench_webhook_dedup.py [--mensagens 30] [--repeticoes 3] [--processos 2]
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+RAIZ = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(RAIZ))
+
+
+def worker(indice: int, app, entregas: list, inicio: float, processamento: float, registro: str, saida,
+           deduplicar: bool) -> None:
+    """Processo filho: atende as entregas que lhe couberam, cada uma no seu horário."""
+    from app import routes
+
+    if not deduplicar:
+        routes.deduplicador = None
+
+    def processar_simulado(sender, media_url):
+        with open(registro, "a") as f:
+            f.write(media_url + "\n")
+        time.sleep(processamento)
+        return f"✅ Receita {media_url} processada"
+
+    routes.processar_receita = processar_simulado
+    cliente = app.test_client()
+
+    def entregar(entrega):
+        sid, repeticao, instante = entrega
+        time.sleep(max(0.0, inicio + instante - time.time()))
+        t = time.perf_counter()
+        resposta = cliente.post("/webhook-whatsapp", data={
+            "From": f"whatsapp:+5511{sid[-8:]}", "Body": "", "MessageSid": sid, "MediaUrl0": f"https://midia/{sid}"})
+        completa = f"Receita https://midia/{sid}" in resposta.get_data(as_text=True)
+        return {"repeticao": repeticao, "completa": completa, "ms": (time.perf_counter() - t) * 1000}
+
+    with ThreadPoolExecutor(max(1, len(entregas))) as pool:
+        resultados = list(pool.map(entregar, entregas))
+    saida.put((indice, resultados))
+
+
+def cenario(app, args, deduplicar: bool, tmp: str) -> dict:
+    from app import routes
+    from app.idempotencia import Deduplicador
+
+    registro = str(Path(tmp) / f"processadas_{int(deduplicar)}.txt")
+    routes.deduplicador = Deduplicador(Path(tmp) / f"dedup_{int(deduplicar)}.sqlite3")
+    entregas = [(f"SM{i:032d}", r, i * args.intervalo + r * args.atraso)
+                for i in range(args.mensagens) for r in range(args.repeticoes)]
+    inicio = time.time() + 0.5
+    contexto = multiprocessing.get_context("fork")
+    saida = contexto.Queue()
+    processos = [contexto.Process(target=worker, args=(p, app, entregas[p::args.processos], inicio, args.processamento,
+                                                       registro, saida, deduplicar))
+                 for p in range(args.processos)]
+    for processo in processos:
+        processo.start()
+    resultados = [r for _ in processos for r in saida.get()[1]]
+    for processo in processos:
+        processo.join()
+
+    processadas = Path(registro).read_text().split() if Path(registro).exists() else []
+    repeticoes_ms = [r["ms"] for r in resultados if r["repeticao"] > 0]
+    return {
+        "processadas": len(processadas),
+        "distintas": len(set(processadas)),
+        "completas": sum(r["completa"] for r in resultados),
+        "entregas": len(resultados),
+        "repeticao_p50_ms": statistics.median(repeticoes_ms) if repeticoes_ms else 0.0,
+        "dedup": routes.deduplicador.estatisticas() if deduplicar else None,
+    }
+
+
+def custo_por_requisicao(tmp: str, n: int) -> tuple:
+    """(ms por sid novo, ms por repetição já concluída) chamando o Deduplicador direto."""
+    from app.idempotencia import Deduplicador
+
+    dedup = Deduplicador(Path(tmp) / "custo.sqlite3")
+    inicio = time.perf_counter()
+    for i in range(n):
+        dedup.executar(f"SMnovo{i}", lambda: "<Response/>")
+    novo = (time.perf_counter() - inicio) / n * 1000
+    inicio = time.perf_counter()
+    for i in range(n):
+        dedup.executar(f"SMnovo{i}", lambda: "<Response/>")
+    repetida = (time.perf_counter() - inicio) / n * 1000
+    return novo, repetida
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--mensagens", type=int, default=30, help="mensagens com mídia (MessageSids distintos)")
+    parser.add_argument("--repeticoes", type=int, default=3, help="entregas de cada MessageSid (1 + reenvios)")
+    parser.add_argument("--atraso", type=float, default=0.3, help="s entre entregas do mesmo MessageSid")
+    parser.add_argument("--intervalo", type=float, default=0.05, help="s entre mensagens distintas")
+    parser.add_argument("--processamento", type=float, default=1.0, help="s de download + OCR simulados")
+    parser.add_argument("--processos", type=int, default=2, help="workers (fork) compartilhando o SQLite")
+    parser.add_argument("--n-custo", type=int, default=500)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ.update({"JOBS_ATIVO": "0", "ARQUIVAR_RECEITAS": "0", "LOG_NIVEL": "ERROR",
+                           "DEDUP_DB": str(Path(tmp) / "dedup.sqlite3")})
+        from app import create_app
+
+        app = create_app()
+        total = args.mensagens * args.repeticoes
+        print(f"{args.mensagens} mensagens x {args.repeticoes} entregas = {total} POSTs, "
+              f"{args.processos} workers, processamento de {args.processamento:g} s\n")
+        print(f"{'cenário':<16} {'processadas':>11} {'respostas completas':>20} {'repetição p50':>14}")
+        resultados = {}
+        for nome, deduplicar in (("sem dedup", False), ("com dedup", True)):
+            r = resultados[nome] = cenario(app, args, deduplicar, tmp)
+            print(f"{nome:<16} {r['processadas']:>11} {r['completas']:>11}/{r['entregas']:<8} "
+                  f"{r['repeticao_p50_ms']:>11.0f} ms")
+        print(f"\nduplicadas absorvidas: {json.dumps(resultados['com dedup']['dedup']['duplicadas'])}")
+        novo, repetida = custo_por_requisicao(tmp, args.n_custo)
+        print(f"custo da deduplicação: {novo:.2f} ms por MessageSid novo, {repetida:.2f} ms por repetição")
+
+    com = resultados["com dedup"]
+    if com["processadas"] != com["distintas"] or com["distintas"] != args.mensagens:
+        print(f"❌ com deduplicação: {com['processadas']} processamentos para {args.mensagens} mensagens")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()